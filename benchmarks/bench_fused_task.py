@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Benchmark the flatness and absolute height analyses of a synthetic OGP
+scan, run as flatnessTask and absoluteHeightTask in two interpreters,
+as the producers do, against flatnessAbsHeightTask in one.  The
+numbers-only mode is used, so the times are dominated by startup and
+parsing.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+import numpy as np
+
+_separate = ('from flatnessTask import flatnessTask; '
+             'flatnessTask("sensor", %(infile)r, pickle_file="flatness.npz", '
+             'make_plots=False)',
+             'from absoluteHeightTask import absoluteHeightTask; '
+             'absoluteHeightTask("sensor", %(infile)r, '
+             'pickle_file="abs_height.npz", make_plots=False)')
+_fused = ('from flatnessAbsHeightTask import flatnessAbsHeightTask; '
+          'flatnessAbsHeightTask("sensor", %(infile)r, '
+          'flatness_pickle_file="flatness.npz", '
+          'abs_height_pickle_file="abs_height.npz", make_plots=False)',)
+
+def write_ogp_scan(outfile, npts):
+    "Write a synthetic OGP scan with npts sensor points."
+    output = open(outfile, 'w')
+    output.write('OGP scan header\n\n')
+    for contour_id, ylims, zvalue, size in ((1, (-10, -9), -2., npts//10),
+                                            (2, (1, 41), -1., npts),
+                                            (3, (50, 51), -2., npts//10)):
+        values = np.column_stack((np.random.uniform(0, 40, size),
+                                  np.random.uniform(ylims[0], ylims[1], size),
+                                  np.random.normal(zvalue, 0.005, size)))
+        output.write('Contour %i\n' % contour_id)
+        np.savetxt(output, values, fmt='%.6f  %.6f  %.6f mm')
+        output.write('\n')
+    output.close()
+
+def run(statements, infile, workdir):
+    "Run each statement in a fresh interpreter and return the total time."
+    tstart = time.time()
+    for statement in statements:
+        subprocess.check_call([sys.executable, '-c',
+                               statement % dict(infile=infile)], cwd=workdir)
+    return time.time() - tstart
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(10000, 100000, 1000000))
+    args = parser.parse_args()
+
+    print('    npts   separate (s)   fused (s)')
+    for npts in args.npts:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            infile = os.path.join(tmpdir, 'scan.DAT')
+            write_ogp_scan(infile, npts)
+            dts = [min(run(statements, infile, tmpdir) for i in range(3))
+                   for statements in (_separate, _fused)]
+            print('%8i   %12.2f   %9.2f' % ((npts,) + tuple(dts)))
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Benchmark the sort-based grid matching of two TS5 scans against the
+original point-by-point search.
+"""
+from __future__ import print_function
+import time
+import argparse
+import numpy as np
+from ts5Utils import match_grid_points
+
+def legacy_match(x, y, x2, y2):
+    "The original O(N*M) matching loop from Ts5Data."
+    index1, index2 = [], []
+    for i in np.arange(len(x)):
+        loc = np.where((x2 == x[i]) & (y2 == y[i]))[0]
+        if len(loc):
+            index1.append(i)
+            index2.append(loc[0])
+    return np.array(index1), np.array(index2)
+
+def raft_grids(npts, missing=0.01):
+    """
+    Grid positions for two scans of about npts points each on a 0.5 mm
+    grid, with the second scan in a different order and missing a
+    fraction of the points.
+    """
+    nside = int(np.sqrt(npts))
+    xx, yy = np.meshgrid(0.5*np.arange(nside), 0.5*np.arange(nside))
+    x, y = xx.ravel(), yy.ravel()
+    keep = np.random.permutation(len(x))[:int(len(x)*(1 - missing))]
+    return x, y, x[keep], y[keep]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(2500, 10000, 40000, 160000),
+                        help='Numbers of points per scan')
+    parser.add_argument('--max_legacy', type=int, default=40000,
+                        help='Largest scan size for the original loop')
+    args = parser.parse_args()
+
+    np.random.seed(5509)
+    print('   npts   legacy (s)   sorted (s)')
+    for npts in args.npts:
+        x, y, x2, y2 = raft_grids(npts)
+        tstart = time.time()
+        index1, index2 = match_grid_points(x, y, x2, y2)
+        dt_sorted = time.time() - tstart
+        if npts <= args.max_legacy:
+            tstart = time.time()
+            legacy1, legacy2 = legacy_match(x, y, x2, y2)
+            dt_legacy = '%10.3f' % (time.time() - tstart)
+            assert np.array_equal(index1, legacy1)
+            assert np.array_equal(index2, legacy2)
+        else:
+            dt_legacy = '%10s' % '-'
+        print('%7i  %s   %10.3f' % (len(x), dt_legacy, dt_sorted))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark the gridded view of TS5 scans against the point-wise paths
+for synthetic raster scans of n x n grid points: the difference of two
+scans (match_grid_points against GriddedScan subtraction) and the mean
+heights of a set of rectangular regions (boolean masks over the points
+against region slices of the grid).
+"""
+from __future__ import print_function
+import time
+import argparse
+import numpy as np
+from ts5Utils import match_grid_points, GriddedScan
+
+def raster_scan(n, step=0.5, missing=0.01):
+    "x, y, z of an n x n raster scan with a fraction of missing points."
+    x, y = [values.ravel() for values in
+            np.meshgrid(step*np.arange(n), step*np.arange(n))]
+    keep = np.random.uniform(size=len(x)) > missing
+    z = np.random.normal(size=len(x))
+    return x[keep], y[keep], z[keep]
+
+def timeit(func, *args):
+    "Return the best time of three calls and the result."
+    dts = []
+    for i in range(3):
+        tstart = time.time()
+        result = func(*args)
+        dts.append(time.time() - tstart)
+    return min(dts), result
+
+def pointwise_delta(scan1, scan2):
+    "Difference of two scans by matching the grid points."
+    index1, index2 = match_grid_points(scan1[0], scan1[1],
+                                       scan2[0], scan2[1])
+    return scan1[2][index1] - scan2[2][index2]
+
+def gridded_delta(scan1, scan2):
+    "Difference of two scans by building and subtracting their grids."
+    return GriddedScan.from_points(*scan1) - GriddedScan.from_points(*scan2)
+
+def pointwise_regions(scan, regions):
+    "Mean heights of the regions selected with boolean masks."
+    x, y, z = scan
+    return [np.mean(z[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)])
+            for x0, x1, y0, y1 in regions]
+
+def gridded_regions(grid, regions):
+    "Mean heights of the regions as slices of the grid."
+    return [grid.region(*region).image.mean() for region in regions]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--n', type=int, nargs='+', default=(300, 1000))
+    parser.add_argument('--nregions', type=int, default=100)
+    args = parser.parse_args()
+
+    print('       npts  operation        point-wise (s)   gridded (s)')
+    for n in args.n:
+        scans = raster_scan(n), raster_scan(n)
+        npts = len(scans[0][0])
+        dt_points, dz = timeit(pointwise_delta, *scans)
+        dt_grid, delta = timeit(gridded_delta, *scans)
+        assert delta.image.count() == len(dz)
+        print('%11i  %-15s  %14.3f   %11.3f'
+              % (npts, 'delta', dt_points, dt_grid))
+        grids = [GriddedScan.from_points(*scan) for scan in scans]
+        dt_sub, _ = timeit(grids[0].__sub__, grids[1])
+        dt_build, _ = timeit(GriddedScan.from_points, *scans[0])
+        print('%11i  %-15s  %14s   %11.3f'
+              % (npts, 'grid build', '', dt_build))
+        print('%11i  %-15s  %14s   %11.3f' % (npts, 'grid subtract', '',
+                                               dt_sub))
+        corners = np.random.uniform(0, 0.5*n*0.5, size=(args.nregions, 2))
+        regions = [(x0, x0 + 0.25*n*0.5, y0, y0 + 0.25*n*0.5)
+                   for x0, y0 in corners]
+        dt_points, means = timeit(pointwise_regions, scans[0], regions)
+        dt_grid, grid_means = timeit(gridded_regions, grids[0], regions)
+        assert np.allclose(means, grid_means)
+        print('%11i  %-15s  %14.3f   %11.3f'
+              % (npts, '%i regions' % args.nregions, dt_points, dt_grid))
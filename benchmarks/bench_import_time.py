@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Benchmark the time to import MetrologyData in a fresh interpreter, with
+the plotting code loaded lazily, against importing MetrologyData and
+metPlots together, i.e., the cost of the original module-level imports
+of matplotlib, scipy and the eotest plotter.  For Python 3.7 and later,
+the cumulative times reported by -X importtime are also listed.
+"""
+from __future__ import print_function
+import sys
+import time
+import argparse
+import subprocess
+
+def run(statement, options=()):
+    "Run statement in a fresh interpreter and return the wall time."
+    command = [sys.executable] + list(options) + ['-c', statement]
+    tstart = time.time()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    dt = time.time() - tstart
+    if process.returncode != 0:
+        raise RuntimeError("Import failed: %s\n%s"
+                           % (statement, stderr.decode()))
+    return dt, stderr.decode()
+
+def best_time(statement, nrun):
+    "Return the best wall time of nrun fresh interpreters."
+    return min(run(statement)[0] for i in range(nrun))
+
+def importtime(statement, modules):
+    """
+    Return the cumulative import times in seconds of modules from the
+    -X importtime output for statement.
+    """
+    cumulative = dict()
+    _, stderr = run(statement, options=('-X', 'importtime'))
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            name = fields[2].strip()
+            cumulative[name] = int(fields[1])*1e-6
+        except (IndexError, ValueError):
+            continue
+    return [cumulative.get(module) for module in modules]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--nrun', type=int, default=5,
+                        help='number of interpreters per measurement')
+    args = parser.parse_args()
+
+    statements = (('interpreter', 'pass'),
+                  ('MetrologyData', 'import MetrologyData'),
+                  ('MetrologyData + metPlots',
+                   'import MetrologyData, metPlots'))
+    print('statement                   wall time (s)')
+    for label, statement in statements:
+        print('%-26s  %13.3f' % (label, best_time(statement, args.nrun)))
+
+    if sys.version_info >= (3, 7):
+        modules = ('MetrologyData', 'metPlots')
+        print()
+        print('-X importtime, cumulative (s)  MetrologyData   metPlots')
+        for label, statement in statements[1:]:
+            times = importtime(statement, modules)
+            print('%-28s  %13s  %9s'
+                  % ((label,) + tuple('-' if dt is None else '%.3f' % dt
+                                      for dt in times)))
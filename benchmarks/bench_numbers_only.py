@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Benchmark the end-to-end time of flatnessTask and absoluteHeightTask,
+including the imports, for the ITL and WFS test files, making all of
+the plots against the numbers-only mode.  Each run is a fresh
+interpreter in an empty working directory.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+_statements = dict(
+    flatness='from flatnessTask import flatnessTask; '
+    'flatnessTask("sensor", %(infile)r, dtype="ITL", '
+    'pickle_file="flatness.npz", make_plots=%(make_plots)s)',
+    absolute_height='from absoluteHeightTask import absoluteHeightTask; '
+    'absoluteHeightTask("sensor", %(infile)r, dtype="ITL", '
+    'pickle_file="abs_height.npz", make_plots=%(make_plots)s)')
+
+def run_task(task, infile, make_plots):
+    "Run the task in a fresh interpreter and return the wall time."
+    tmpdir = tempfile.mkdtemp()
+    try:
+        statement = _statements[task] % dict(infile=infile,
+                                              make_plots=make_plots)
+        tstart = time.time()
+        subprocess.check_call([sys.executable, '-c', statement], cwd=tmpdir,
+                              stdout=open(os.devnull, 'w'))
+        return time.time() - tstart
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--nrun', type=int, default=3)
+    args = parser.parse_args()
+
+    test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir, 'tests')
+    print('task             file    full (s)   numbers only (s)')
+    for task in ('flatness', 'absolute_height'):
+        for label in ('ITL', 'WFS'):
+            infile = os.path.abspath(
+                os.path.join(test_dir, '%s_vendor_metrology_data.txt' % label))
+            dts = [min(run_task(task, infile, make_plots)
+                       for i in range(args.nrun))
+                   for make_plots in (True, False)]
+            print('%-15s  %-5s  %9.2f   %16.2f' % ((task, label) + tuple(dts)))
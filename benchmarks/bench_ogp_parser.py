@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark the OgpData Contour block parser against the original
+line-by-line parser on synthetic OGP scans.
+"""
+from __future__ import print_function
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+from MetrologyData import OgpData, PointCloud
+
+def legacy_contours(infile):
+    "The original line-by-line Contour parser."
+    data = dict()
+    key = None
+    for line in open(infile):
+        if line.startswith('Contour'):
+            key = line.strip()
+            data[key] = []
+        if line.strip() and key is not None:
+            try:
+                tokens = [float(x) for x in line.split()[:3]]
+                data[key].append((tokens[0], tokens[1], 1e3*tokens[2]))
+            except ValueError:
+                pass
+        else:
+            key = None
+    for key in data:
+        data[key] = PointCloud(*zip(*tuple(data[key])))
+    return data
+
+def write_ogp_file(outfile, scale=1, nsensor=2500, nref=100):
+    """
+    Write a synthetic OGP scan with one sensor Contour and four gauge
+    block Contours, with the number of points scaled by scale.
+    """
+    output = open(outfile, 'w')
+    yranges = ((1, 41), (-12, -8), (-12, -8), (50, 54), (50, 54))
+    npts = [nsensor*scale] + 4*[nref*scale]
+    for contour_id, (yrange, npt) in enumerate(zip(yranges, npts)):
+        output.write('Contour %i\n' % (contour_id + 1))
+        x = np.random.uniform(0, 42, size=npt)
+        y = np.random.uniform(yrange[0], yrange[1], size=npt)
+        z = np.random.normal(loc=-1, scale=0.005, size=npt)
+        for xyz in zip(x, y, z):
+            output.write('%.6f  %.6f  %.6f mm\n' % xyz)
+        output.write('\n')
+    output.close()
+
+def timeit(func, *args):
+    tstart = time.time()
+    result = func(*args)
+    return time.time() - tstart, result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--scales', type=int, nargs='+', default=(1, 10, 100),
+                        help='Scale factors for the number of scan points')
+    args = parser.parse_args()
+
+    np.random.seed(1029)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print('scale    npts    legacy (s)   block (s)   speedup')
+        for scale in args.scales:
+            infile = os.path.join(tmpdir, 'scan_%i.DAT' % scale)
+            write_ogp_file(infile, scale=scale)
+            dt_legacy, contours = timeit(legacy_contours, infile)
+            dt_block, ogp_data = timeit(OgpData, infile)
+            sensor = [cloud for cloud in contours.values()
+                      if 0 <= np.mean(cloud.y) <= 42][0]
+            assert np.array_equal(sensor.z, ogp_data.sensor.z)
+            npts = sum(len(cloud.x) for cloud in contours.values())
+            print('%5i  %8i  %10.3f  %10.3f  %8.1f'
+                  % (scale, npts, dt_legacy, dt_block, dt_legacy/dt_block))
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Benchmark the chunk-parallel passes over a large synthetic point cloud
+against the serial code, for increasing numbers of threads: the
+clipped plane fit (PointCloud.xyzPlane_fit), the residuals and clipping
+of set_ref_plane, and the histogram of plot_statistics.  The deviations
+of the parallel results from the serial ones are also given: the
+largest relative difference of the fit parameters, and the numbers of
+differing mask entries, residuals and histogram counts.
+
+The speedups need as many CPUs as threads: with fewer CPUs, the larger
+thread counts only measure the overhead of the chunking, and a note is
+printed.
+"""
+from __future__ import print_function
+import time
+import argparse
+import multiprocessing
+import numpy as np
+from MetrologyData import MetrologyData, PointCloud
+from parallelUtils import chunk_histogram
+
+def make_cloud(npts):
+    "A tilted sensor surface (micron) with 0.1% outliers."
+    x = np.random.uniform(0, 40, size=npts)
+    y = np.random.uniform(0, 40, size=npts)
+    z = 1.3e4 + 0.2*x - 0.1*y + np.random.normal(scale=2, size=npts)
+    outliers = np.random.uniform(size=npts) < 1e-3
+    z[outliers] += np.random.uniform(20, 50, size=np.count_nonzero(outliers))
+    return PointCloud(x, y, z)
+
+def timeit(func, *args, **kwds):
+    "Return the best time of three calls and the result."
+    dts = []
+    for i in range(3):
+        tstart = time.time()
+        result = func(*args, **kwds)
+        dts.append(time.time() - tstart)
+    return min(dts), result
+
+def analysis(xyz, threads, plane=None):
+    """
+    The fit, residuals and histogram for the points xyz, as
+    (fit time, set_ref_plane time, histogram time, MetrologyData,
+    histogram counts).  The residuals are evaluated with respect to
+    plane, if given, e.g., the serial fit, rather than the fit.
+    """
+    md = MetrologyData.__new__(MetrologyData)
+    md.sensor = PointCloud.from_xyz(xyz)
+    dt_fit, fit = timeit(md.sensor.xyzPlane_fit, threads=threads)
+    md.pars = fit.pars
+    dt_resids, _ = timeit(md.set_ref_plane, plane or fit, threads=threads)
+    dt_hist, (counts, _) = timeit(chunk_histogram, md.resids_filt, 60,
+                                  threads=threads)
+    return dt_fit, dt_resids, dt_hist, md, counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(10**6, 10**7))
+    parser.add_argument('--threads', type=int, nargs='+', default=None)
+    args = parser.parse_args()
+    ncpu = multiprocessing.cpu_count()
+    threads_list = args.threads
+    if threads_list is None:
+        threads_list = sorted(set([1, 2, 4, ncpu]))
+
+    print('CPUs: %i' % ncpu)
+    if max(threads_list) > ncpu:
+        print('Note: more threads than CPUs; the speedups for more than %i '
+              'thread(s) are not scalings.' % ncpu)
+    print('      npts  threads   fit (s)  resids (s)  hist (s)  speedup'
+          '   max |dpars/pars|  mask  resids  counts')
+    for npts in args.npts:
+        xyz = make_cloud(npts).xyz
+        serial = analysis(xyz, None)
+        total = sum(serial[:3])
+        expected = serial[3]
+        for threads in threads_list:
+            dts = serial if threads == 1 else analysis(
+                xyz, threads, plane=expected.plane_functor)
+            md, counts = dts[3], dts[4]
+            dpars = np.max(np.abs(np.subtract(md.pars, expected.pars))
+                           /np.abs(expected.pars))
+            print('%10i  %7i  %8.3f  %10.3f  %8.3f  %7.2f   %16.1e  %4i'
+                  '  %6i  %6i'
+                  % (npts, threads, dts[0], dts[1], dts[2],
+                     total/sum(dts[:3]), dpars,
+                     np.count_nonzero(md.sensor.mask != expected.sensor.mask),
+                     np.count_nonzero(md.resids != expected.resids),
+                     np.count_nonzero(counts != serial[4])))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Benchmark the size and load time of persisted MetrologyData objects for
+a synthetic TS5 raft scan after the flatness analysis: the original
+pickle (protocol 0) against the array-based results format, read
+fully, memory-mapped, or only for its header.
+"""
+from __future__ import print_function
+import os
+import time
+import pickle
+import tempfile
+import argparse
+import numpy as np
+from MetrologyData import md_factory
+from persistUtils import read_header
+
+def write_raft_scan(outfile, npts):
+    "Write a synthetic TS5 scan with npts points and 15 columns."
+    values = np.random.uniform(0, 100, size=(npts, 15))
+    values[:, 2] = 0.01*values[:, 0] - 0.02*values[:, 1] + 3
+    values[:, 14] = 1.5e12 + 1e3*np.arange(npts)
+    output = open(outfile, 'w')
+    output.write('# start time = 1500000000000.0 end time = 1500001000000.0\n')
+    np.savetxt(output, values, fmt='%.6f', delimiter=',')
+    output.close()
+
+def timeit(func, *args, **kwds):
+    "Return the best time of three calls."
+    dts = []
+    for i in range(3):
+        tstart = time.time()
+        func(*args, **kwds)
+        dts.append(time.time() - tstart)
+    return min(dts)
+
+def legacy_persist(md, outfile):
+    "The original persist method."
+    output = open(outfile, 'w')
+    pickle.dump(md, output)
+    output.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(100000, 1000000))
+    args = parser.parse_args()
+
+    print('    npts  format       size (MB)   write (s)   load (s)')
+    for npts in args.npts:
+        tmpfiles = []
+        for i in range(3):
+            fd, tmpfile = tempfile.mkstemp()
+            os.close(fd)
+            tmpfiles.append(tmpfile)
+        infile, pickle_file, results_file = tmpfiles
+        try:
+            write_raft_scan(infile, npts)
+            raftData = md_factory.create(infile, dtype='TS5')
+            raftData.set_ref_plane(raftData.sensor.xyzPlane_fit())
+            raftData.quantile_table(outfile=os.devnull)
+
+            dt_write = timeit(legacy_persist, raftData, pickle_file)
+            dt_load = timeit(md_factory.load, pickle_file)
+            print('%8i  %-10s  %10.1f  %10.3f  %9.4f'
+                  % (npts, 'pickle', os.path.getsize(pickle_file)/2.**20,
+                     dt_write, dt_load))
+            dt_write = timeit(raftData.persist, results_file)
+            size = os.path.getsize(results_file)/2.**20
+            for label, func, kwds in (('npz', md_factory.load, {}),
+                                      ('npz, mmap', md_factory.load,
+                                       dict(mmap_mode='r')),
+                                      ('header', read_header, {})):
+                dt_load = timeit(func, results_file, **kwds)
+                print('%8i  %-10s  %10.1f  %10.3f  %9.4f'
+                      % (npts, label, size, dt_write, dt_load))
+        finally:
+            for item in tmpfiles:
+                os.remove(item)
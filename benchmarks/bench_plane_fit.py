@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark PointCloud.xyzPlane_fit with the direct least-squares solution
+against the scipy.optimize.curve_fit path, and against the original
+curve_fit implementation with the per-point XyzPlane evaluation.
+"""
+from __future__ import print_function
+import time
+import argparse
+import numpy as np
+import scipy.optimize
+from MetrologyData import PointCloud, XyzPlane
+
+def legacy_xyz_plane(positions, a, b, c):
+    "The original per-point plane evaluation."
+    return np.array([a*x + b*y + c for x, y in positions])
+
+def legacy_fit(pc, nsigma=4, p0=(0, 0, 0)):
+    "The original sigma-clipped curve_fit loop."
+    positions = np.array(list(zip(pc.x, pc.y)))
+    pars, _ = scipy.optimize.curve_fit(legacy_xyz_plane, positions, pc.z,
+                                       p0=p0)
+    dz = legacy_xyz_plane(positions, *pars) - pc.z
+    mean, stdev = np.mean(dz), np.std(dz)
+    stdev_last = -1
+    stdev_new = stdev
+    index = np.where((dz > mean-nsigma*stdev) & (dz < mean+nsigma*stdev))
+    while stdev_new != stdev_last:
+        stdev_last = stdev_new
+        pars, _ = scipy.optimize.curve_fit(legacy_xyz_plane, positions[index],
+                                           pc.z[index], p0=pars)
+        dz = legacy_xyz_plane(positions, *pars) - pc.z
+        mean, stdev_new = np.mean(dz[index]), np.std(dz[index])
+        index = np.where((dz > mean-nsigma*stdev_new) &
+                         (dz < mean+nsigma*stdev_new))
+    return pars, mean, stdev_new
+
+def point_cloud(npts):
+    "A tilted plane with Gaussian noise and 1% outliers."
+    x = np.random.uniform(0, 40, size=npts)
+    y = np.random.uniform(0, 40, size=npts)
+    z = (XyzPlane(0.5, -0.2, 13000.)(np.column_stack((x, y)))
+         + np.random.normal(scale=2, size=npts))
+    outliers = np.random.permutation(npts)[:npts//100]
+    z[outliers] += np.random.uniform(20, 50, size=len(outliers))
+    return PointCloud(x, y, z)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(10**4, 10**5, 10**6, 10**7),
+                        help='Numbers of points in the point clouds')
+    parser.add_argument('--max_legacy', type=int, default=10**5,
+                        help='Largest point cloud for the original fit')
+    args = parser.parse_args()
+
+    np.random.seed(7741)
+    print('    npts   legacy (s)  curve_fit (s)   lstsq (s)   max |dpar|')
+    for npts in args.npts:
+        pc = point_cloud(npts)
+        tstart = time.time()
+        plane_lstsq = pc.xyzPlane_fit(method='lstsq')
+        dt_lstsq = time.time() - tstart
+        tstart = time.time()
+        plane_curve_fit = pc.xyzPlane_fit(method='curve_fit')
+        dt_curve_fit = time.time() - tstart
+        dpars = np.max(np.abs(np.array(plane_lstsq.pars)
+                              - np.array(plane_curve_fit.pars)))
+        if npts <= args.max_legacy:
+            tstart = time.time()
+            legacy_fit(pc)
+            dt_legacy = '%10.3f' % (time.time() - tstart)
+        else:
+            dt_legacy = '%10s' % '-'
+        print('%8i  %s  %12.3f  %10.3f  %11.2e'
+              % (npts, dt_legacy, dt_curve_fit, dt_lstsq, dpars))
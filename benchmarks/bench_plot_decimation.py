@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Benchmark the render time and output size of flatness_plot for a
+synthetic TS5 raft scan, scattering every point against scattering a
+spatially stratified subset of max_points points plus the outliers.
+"""
+from __future__ import print_function
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+import matplotlib
+import MetrologyData as metData
+from MetrologyData import md_factory
+
+def write_raft_scan(outfile, npts):
+    "Write a synthetic TS5 scan with npts points and 15 columns."
+    values = np.random.uniform(0, 100, size=(npts, 15))
+    values[:, 2] = (0.01*values[:, 0] - 0.02*values[:, 1] + 3
+                    + np.random.normal(scale=0.002, size=npts))
+    # A few outliers.
+    values[:npts//1000, 2] += 0.1
+    values[:, 14] = 1.5e12 + 1e3*np.arange(npts)
+    output = open(outfile, 'w')
+    output.write('# start time = 1500000000000.0 end time = 1500001000000.0\n')
+    np.savetxt(output, values, fmt='%.6f', delimiter=',')
+    output.close()
+
+def render(md, outfile, max_points):
+    "Make and save the surface plot, returning the elapsed time."
+    tstart = time.time()
+    md.flatness_plot(azim=10, max_points=max_points)
+    metData.plot.save(outfile)
+    dt = time.time() - tstart
+    metData.plot.pylab.close('all')
+    return dt
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(10000, 100000))
+    parser.add_argument('--max_points', type=int, default=5000)
+    parser.add_argument('--format', default='pdf',
+                        help='output format, e.g., png, pdf or svg')
+    args = parser.parse_args()
+
+    print('backend: %s' % matplotlib.get_backend())
+    print('    npts  mode         points   render (s)   size (kB)')
+    for npts in args.npts:
+        fd, infile = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        fd, outfile = tempfile.mkstemp(suffix='.' + args.format)
+        os.close(fd)
+        try:
+            write_raft_scan(infile, npts)
+            raftData = md_factory.create(infile, dtype='TS5')
+            raftData.set_ref_plane(raftData.sensor.xyzPlane_fit())
+            for label, max_points in (('full', None),
+                                      ('decimated', args.max_points)):
+                dt = render(raftData, outfile, max_points)
+                nplotted = npts if max_points is None else len(
+                    metData._plots()._sensor_points(raftData, max_points, 3))
+                print('%8i  %-10s  %8i   %10.2f  %10.1f'
+                      % (npts, label, nplotted, dt,
+                         os.path.getsize(outfile)/1024.))
+        finally:
+            os.remove(infile)
+            os.remove(outfile)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Benchmark flatnessTask for a synthetic TS5 raft scan, rendering the
+plots in this process against rendering them in a process pool, and
+report the time until the numerical products are written.
+"""
+from __future__ import print_function
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import multiprocessing
+import numpy as np
+from flatnessTask import flatnessTask
+
+def write_raft_scan(outfile, npts):
+    "Write a synthetic TS5 scan with npts points and 15 columns."
+    values = np.random.uniform(0, 100, size=(npts, 15))
+    values[:, 2] = (0.01*values[:, 0] - 0.02*values[:, 1] + 3
+                    + np.random.normal(scale=0.002, size=npts))
+    values[:, 14] = 1.5e12 + 1e3*np.arange(npts)
+    output = open(outfile, 'w')
+    output.write('# start time = 1500000000000.0 end time = 1500001000000.0\n')
+    np.savetxt(output, values, fmt='%.6f', delimiter=',')
+    output.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, default=20000)
+    parser.add_argument('--processes', type=int, nargs='+', default=(1, 4))
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        infile = os.path.join(tmpdir, 'scan.csv')
+        write_raft_scan(infile, args.npts)
+        os.chdir(tmpdir)
+        for processes in args.processes:
+            print('processes = %i' % processes)
+            tstart = time.time()
+            flatnessTask('raft', infile, dtype='TS5',
+                         pickle_file='flatness.npz',
+                         summary_file='flatness_summary.json',
+                         processes=processes)
+            dt_total = time.time() - tstart
+            dt_numbers = os.path.getmtime('flatness_summary.json') - tstart
+            print('numbers written: %.2f s, total: %.2f s, CPUs: %i\n'
+                  % (dt_numbers, dt_total, multiprocessing.cpu_count()))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
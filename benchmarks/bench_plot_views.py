@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Benchmark saving several (elev, azim) views of the flatness_plot of a
+synthetic TS5 raft scan, rebuilding the plot for each view against
+building it once with flatness_plot_views.
+"""
+from __future__ import print_function
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+import MetrologyData as metData
+from MetrologyData import md_factory
+
+def write_raft_scan(outfile, npts):
+    "Write a synthetic TS5 scan with npts points and 15 columns."
+    values = np.random.uniform(0, 100, size=(npts, 15))
+    values[:, 2] = (0.01*values[:, 0] - 0.02*values[:, 1] + 3
+                    + np.random.normal(scale=0.002, size=npts))
+    values[:, 14] = 1.5e12 + 1e3*np.arange(npts)
+    output = open(outfile, 'w')
+    output.write('# start time = 1500000000000.0 end time = 1500001000000.0\n')
+    np.savetxt(output, values, fmt='%.6f', delimiter=',')
+    output.close()
+
+def rebuild(md, views, outfiles):
+    "The original approach: one flatness_plot per view."
+    for (elev, azim), outfile in zip(views, outfiles):
+        md.flatness_plot(elev=elev, azim=azim)
+        metData.plot.save(outfile)
+        metData.plot.pylab.close('all')
+
+def build_once(md, views, outfiles):
+    "Build the plot once with flatness_plot_views."
+    md.flatness_plot_views(views, outfiles)
+    metData.plot.pylab.close('all')
+
+def timeit(func, *args):
+    "Return the time of one call."
+    tstart = time.time()
+    func(*args)
+    return time.time() - tstart
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, default=20000)
+    parser.add_argument('--nviews', type=int, nargs='+', default=(1, 2, 4))
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        infile = os.path.join(tmpdir, 'scan.csv')
+        write_raft_scan(infile, args.npts)
+        raftData = md_factory.create(infile, dtype='TS5')
+        raftData.set_ref_plane(raftData.sensor.xyzPlane_fit())
+        dt_build = timeit(raftData.flatness_plot)
+        metData.plot.pylab.close('all')
+        print('build only: %.2f s' % dt_build)
+        print('nviews   rebuild (s)   build once (s)')
+        for nviews in args.nviews:
+            views = [(10, azim) for azim in np.linspace(10, 80, nviews)]
+            outfiles = [os.path.join(tmpdir, 'view_%i.png' % i)
+                        for i in range(nviews)]
+            print('%6i   %11.2f   %14.2f'
+                  % (nviews, timeit(rebuild, raftData, views, outfiles),
+                     timeit(build_once, raftData, views, outfiles)))
+    finally:
+        shutil.rmtree(tmpdir)
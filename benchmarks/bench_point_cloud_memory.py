@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Measure the peak memory of fitting the reference plane and computing
+the residuals of a synthetic TS5 raft scan, with PointCloud backed by a
+single (N, 3) array against the original PointCloud with separate x, y,
+z arrays, both for the point cloud stage alone and including reading
+the scan file in blocks rather than all at once.  Each case runs in its own process, and the increase in
+the peak resident set size over the size before each stage is
+reported.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import resource
+import tempfile
+import argparse
+import functools
+import subprocess
+import numpy as np
+
+def max_rss_mb():
+    "Peak resident set size of this process in MB."
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.
+
+def write_raft_scan(outfile, npts):
+    "Write a synthetic TS5 scan with npts points and 15 columns."
+    values = np.random.uniform(0, 100, size=(npts, 15))
+    values[:, 2] = 0.01*values[:, 0] - 0.02*values[:, 1] + 3
+    values[:, 14] = 1.5e12 + 1e3*np.arange(npts)
+    output = open(outfile, 'w')
+    output.write('# start time = 1500000000000.0 end time = 1500001000000.0\n')
+    np.savetxt(output, values, fmt='%.6f', delimiter=',')
+    output.close()
+
+def run_case(infile, legacy, stage):
+    "Run one stage for one scan and print the peak memory and time."
+    import MetrologyData
+    from MetrologyData import md_factory, PointCloud
+
+    class LegacyPointCloud(PointCloud):
+        "The original PointCloud, with separate copies of x, y and z."
+        x = y = z = None
+        def __init__(self, x, y, z):
+            self.x = np.array(x)
+            self.y = np.array(y)
+            self.z = np.array(z)
+            self.stdev_filt = None
+            self.mean_filt = None
+        def __len__(self):
+            return len(self.x)
+        @property
+        def positions(self):
+            return np.column_stack((self.x, self.y))
+        def data(self):
+            return np.array(list(zip(self.x, self.y))), self.z
+
+    if legacy:
+        # Also read the scan file all at once, as before.
+        MetrologyData.PointCloud = LegacyPointCloud
+        MetrologyData.read_ts5_scan = functools.partial(
+            MetrologyData.read_ts5_scan, chunk_size=-1)
+    if stage == 'cloud':
+        npts = int(infile)
+        x = np.random.uniform(0, 100, size=npts)
+        y = np.random.uniform(0, 100, size=npts)
+        z = 10*x - 20*y + np.random.normal(size=npts)
+    rss0 = max_rss_mb()
+    tstart = time.time()
+    if stage == 'cloud':
+        sensor = MetrologyData.PointCloud(x, y, z)
+    else:
+        sensor = md_factory.create(infile, dtype='TS5').sensor
+    plane = sensor.xyzPlane_fit()
+    pos, z = sensor.data()
+    resids = z - plane(pos)
+    print(max_rss_mb() - rss0, time.time() - tstart)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(100000, 500000))
+    parser.add_argument('--case', type=str, default=None,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        infile, mode, stage = args.case.split(':')
+        run_case(infile, mode == 'legacy', stage)
+        sys.exit(0)
+
+    print('Peak memory increase (MB) and time (s) for the point cloud stage')
+    print('(PointCloud, plane fit and residuals) and for the full scan')
+    print('(also reading the file):')
+    print('    npts  stage      legacy (MB)   current (MB)   legacy (s)'
+          '   current (s)')
+    for npts in args.npts:
+        fd, infile = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        try:
+            write_raft_scan(infile, npts)
+            for stage in ('cloud', 'scan'):
+                results = []
+                for mode in ('legacy', 'current'):
+                    case = infile if stage == 'scan' else str(npts)
+                    output = subprocess.check_output(
+                        [sys.executable, __file__, '--case',
+                         ':'.join((case, mode, stage))])
+                    results.extend(float(x) for x in output.split()[-2:])
+                print('%8i  %-5s  %11.1f   %12.1f   %10.3f   %11.3f'
+                      % ((npts, stage) + tuple(results[::2])
+                         + tuple(results[1::2])))
+        finally:
+            os.remove(infile)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Benchmark md_factory.create for a synthetic TS5 raft scan, parsing the
+file against loading the parsed scan from a ScanCache with content-hash
+and size+mtime keys.
+"""
+from __future__ import print_function
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+from MetrologyData import md_factory
+from scanCache import ScanCache
+
+def write_raft_scan(outfile, npts):
+    "Write a synthetic TS5 scan with npts points and 15 columns."
+    values = np.random.uniform(0, 100, size=(npts, 15))
+    values[:, 14] = 1.5e12 + 1e3*np.arange(npts)
+    output = open(outfile, 'w')
+    output.write('# start time = 1500000000000.0 end time = 1500001000000.0\n')
+    np.savetxt(output, values, fmt='%.6f', delimiter=',')
+    output.close()
+
+def timeit(func, *args, **kwds):
+    "Return the best time of three calls."
+    dts = []
+    for i in range(3):
+        tstart = time.time()
+        func(*args, **kwds)
+        dts.append(time.time() - tstart)
+    return min(dts)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(100000, 1000000))
+    args = parser.parse_args()
+
+    print('    npts   parse (s)   content key (s)   stat key (s)')
+    for npts in args.npts:
+        fd, infile = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        cache_dir = tempfile.mkdtemp()
+        try:
+            write_raft_scan(infile, npts)
+            dt_parse = timeit(md_factory.create, infile, dtype='TS5')
+            dts = []
+            for key in ('content', 'stat'):
+                cache = ScanCache(os.path.join(cache_dir, key), key=key)
+                md_factory.create(infile, dtype='TS5', cache=cache)
+                dts.append(timeit(md_factory.create, infile, dtype='TS5',
+                                  cache=cache))
+            print('%8i   %9.3f   %15.3f   %12.4f'
+                  % ((npts, dt_parse) + tuple(dts)))
+        finally:
+            os.remove(infile)
+            shutil.rmtree(cache_dir)
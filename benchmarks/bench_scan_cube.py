@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark the delta flatness of all pairs of the five TS5 scans of a
+synthetic run of n x n grid points: a differential Ts5Data object per
+pair, each reading and matching its two files, with a plane fit and
+quantile table, against a ScanCube, reading each file once, with all of
+the pairwise fits and quantiles evaluated together.
+"""
+from __future__ import print_function
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+from MetrologyData import md_factory
+from ts5Utils import ScanCube
+
+def write_run(outdir, n, nscans=5, step=0.5, missing=0.01):
+    """
+    Write nscans TS5 scans of an n x n grid, each with a fraction of
+    missing points, and return the file names.
+    """
+    x, y = [values.ravel() for values in
+            np.meshgrid(step*np.arange(n), step*np.arange(n))]
+    infiles = []
+    for k in range(nscans):
+        keep = np.random.uniform(size=len(x)) > missing
+        values = np.zeros((np.count_nonzero(keep), 15))
+        values[:, 0], values[:, 1] = x[keep], y[keep]
+        values[:, 2] = (12.9 + 1e-5*k*x[keep]
+                        + np.random.normal(scale=0.005, size=len(values)))
+        values[:, 14] = 1.5e12 + 1e3*np.arange(len(values))
+        infile = os.path.join(outdir, 'scan_%i.csv' % k)
+        with open(infile, 'w') as output:
+            output.write('# start time = 1500000000000.0 ms, '
+                         'end time = 1500001000000.0 ms\n')
+            np.savetxt(output, values, fmt='%.6f', delimiter=',')
+        infiles.append(infile)
+    return infiles
+
+def timeit(func, *args):
+    "Return the best time of three calls and the result."
+    dts = []
+    for i in range(3):
+        tstart = time.time()
+        result = func(*args)
+        dts.append(time.time() - tstart)
+    return min(dts), result
+
+def pairwise_ts5data(infiles):
+    "Delta flatness quantiles of each pair with differential Ts5Data."
+    results = dict()
+    for i in range(len(infiles)):
+        for j in range(i + 1, len(infiles)):
+            md = md_factory.create([infiles[i], infiles[j]], dtype='TS5')
+            md.set_ref_plane(md.sensor.xyzPlane_fit())
+            md.quantile_table(outfile=os.devnull)
+            results[(i, j)] = md.quantiles
+    return results
+
+def scan_cube(infiles):
+    "Delta flatness quantiles of all pairs from a ScanCube."
+    cube = ScanCube.from_files(infiles, labels=range(len(infiles)))
+    return dict((key, value['quantiles']) for key, value
+                in cube.delta_flatness().items())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--n', type=int, nargs='+', default=(300, 1000))
+    args = parser.parse_args()
+
+    print('  npts/scan   per-pair Ts5Data (s)   ScanCube (s)')
+    for n in args.n:
+        outdir = tempfile.mkdtemp()
+        try:
+            infiles = write_run(outdir, n)
+            dt_pairs, expected = timeit(pairwise_ts5data, infiles)
+            dt_cube, results = timeit(scan_cube, infiles)
+            for key in expected:
+                for quantile in expected[key]:
+                    assert abs(results[key][quantile]
+                               - expected[key][quantile]) < 1e-6
+            print('%11i   %20.3f   %12.3f' % (n*n, dt_pairs, dt_cube))
+        finally:
+            shutil.rmtree(outdir)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Benchmark batched plane fits of many point clouds with
+xyzPlane_fit_batch against separate PointCloud.xyzPlane_fit calls.
+"""
+from __future__ import print_function
+import time
+import argparse
+import numpy as np
+from MetrologyData import PointCloud, xyzPlane_fit_batch
+
+def point_clouds(nclouds, npts):
+    "Tilted planes with Gaussian noise and 1% outliers."
+    clouds = []
+    for i in range(nclouds):
+        x = np.random.uniform(0, 40, size=npts)
+        y = np.random.uniform(0, 40, size=npts)
+        z = (np.random.normal(scale=0.01)*x + np.random.normal(scale=0.01)*y
+             + np.random.normal(scale=2, size=npts))
+        z[:npts//100] += 30
+        clouds.append(PointCloud(x, y, z))
+    return clouds
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--nclouds', type=int, nargs='+',
+                        default=(10, 100, 1000),
+                        help='Numbers of point clouds')
+    parser.add_argument('--npts', type=int, default=500,
+                        help='Number of points per cloud')
+    args = parser.parse_args()
+
+    np.random.seed(3371)
+    print('nclouds   separate (s)   batched (s)   max |dpar|')
+    for nclouds in args.nclouds:
+        clouds = point_clouds(nclouds, args.npts)
+        tstart = time.time()
+        separate = [cloud.xyzPlane_fit().pars for cloud in clouds]
+        dt_separate = time.time() - tstart
+        tstart = time.time()
+        batched = [plane.pars for plane in xyzPlane_fit_batch(clouds)]
+        dt_batched = time.time() - tstart
+        dpars = np.max(np.abs(np.array(separate) - np.array(batched)))
+        print('%7i   %12.3f  %12.3f  %11.2e'
+              % (nclouds, dt_separate, dt_batched, dpars))
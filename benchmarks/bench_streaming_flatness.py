@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Benchmark the elapsed time and peak resident memory of the flatness
+analysis (clipped plane fit, residuals and quantile table) of synthetic
+x, y, z csv scans (e2v format) of increasing size: the in-memory
+MetrologyData analysis against streaming_flatness, which reads the
+file in blocks.  Each analysis is run in a separate process, which
+reports its own peak RSS.  The in-memory analysis is skipped for scans
+larger than --max_in_memory points.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+import argparse
+import numpy as np
+
+def write_scan(outfile, npts, block_size=10**6, step=0.01):
+    """
+    Write a synthetic tilted sensor scan with npts points on a square
+    raster, with 0.1% outliers, in blocks of block_size lines.
+    """
+    n = int(np.ceil(np.sqrt(npts)))
+    with open(outfile, 'w') as output:
+        for start in range(0, npts, block_size):
+            index = np.arange(start, min(start + block_size, npts))
+            x, y = step*(index % n), step*(index//n)
+            z = (12.9 + 1e-4*x - 2e-4*y
+                 + np.random.normal(scale=0.002, size=len(index)))
+            z[np.random.uniform(size=len(z)) < 1e-3] += 0.05
+            values = np.column_stack((x, y, z))
+            output.write(('%.4f,%.4f,%.6f\n'*len(values))
+                         % tuple(values.ravel().tolist()))
+
+def run_in_memory(infile):
+    "The flatness analysis of flatnessTask, without the output files."
+    from MetrologyData import md_factory
+    md = md_factory.create(infile, dtype='e2v')
+    md.set_ref_plane(md.sensor.xyzPlane_fit())
+    md.quantile_table(outfile=os.devnull)
+    return md.quantiles['0.500']
+
+def run_streaming(infile):
+    "The constant-memory flatness analysis, without the output files."
+    from streamingFlatness import streaming_flatness
+    return streaming_flatness(infile, dtype='e2v').quantiles['0.500']
+
+def peak_rss():
+    """
+    Peak RSS of this process in MB.  On Linux, VmHWM is used, since
+    ru_maxrss includes the RSS of the parent process at the fork.
+    """
+    try:
+        with open('/proc/self/status') as input_:
+            for line in input_:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])/1024.
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.
+
+def child(mode, infile):
+    "Run one analysis and print the elapsed time and peak RSS (MB)."
+    tstart = time.time()
+    median = dict(memory=run_in_memory, streaming=run_streaming)[mode](infile)
+    maxrss = peak_rss()
+    print('%.3f %.1f %.6f' % (time.time() - tstart, maxrss, median))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(10**6, 10**7, 10**8))
+    parser.add_argument('--max_in_memory', type=int, default=10**7)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        sys.exit(0)
+
+    print('       npts  file (MB)  analysis     time (s)  peak RSS (MB)'
+          '  median resid')
+    for npts in args.npts:
+        fd, infile = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        try:
+            write_scan(infile, npts)
+            size = os.path.getsize(infile)/2.**20
+            for mode in ('memory', 'streaming'):
+                if mode == 'memory' and npts > args.max_in_memory:
+                    print('%11i  %9.0f  %-9s  %9s  %13s'
+                          % (npts, size, mode, 'skipped', ''))
+                    continue
+                output = subprocess.check_output(
+                    [sys.executable, os.path.abspath(__file__),
+                     '--child', mode, infile]).decode()
+                dt, maxrss, median = [float(item) for item
+                                      in output.split()[-3:]]
+                print('%11i  %9.0f  %-9s  %9.1f  %13.0f  %12.4f'
+                      % (npts, size, mode, dt, maxrss, median))
+                sys.stdout.flush()
+        finally:
+            os.remove(infile)
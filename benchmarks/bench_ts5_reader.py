@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark the single-pass TS5 scan reader against the original per-line
+readers in Ts5Data and qaPlot on a synthetic raft scan.
+"""
+from __future__ import print_function
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+from ts5Utils import read_ts5_scan, TS5_HOUSEKEEPING
+
+def legacy_xyz(infile):
+    "The original Ts5Data per-line reader."
+    data = dict([(key, []) for key in 'XYZ'])
+    for line in open(infile):
+        if not line.startswith('#'):
+            tokens = line.split(',')
+            data['X'].append(float(tokens[0]))
+            data['Y'].append(float(tokens[1]))
+            data['Z'].append(float(tokens[2]))
+    return data
+
+def legacy_housekeeping(infile):
+    "The original qaPlot per-line reader."
+    data = dict([(key, []) for key in 'ABCDPT'])
+    for line in open(infile):
+        if not line.startswith('#'):
+            tokens = line.split(',')
+            data['A'].append(float(tokens[9]))
+            data['B'].append(float(tokens[10]))
+            data['C'].append(float(tokens[11]))
+            data['D'].append(float(tokens[12]))
+            data['P'].append(float(tokens[13])*1E6)
+            data['T'].append(float(tokens[14])/1000.)
+    return data
+
+def write_raft_scan(outfile, npts):
+    "Write a synthetic TS5 scan with npts points and 15 columns."
+    values = np.random.uniform(0, 100, size=(npts, 15))
+    values[:, 14] = 1.5e12 + 1e3*np.arange(npts)
+    output = open(outfile, 'w')
+    output.write('# start time = 1500000000000.0 end time = 1500001000000.0\n')
+    for row in values:
+        output.write(','.join('%.6f' % value for value in row) + '\n')
+    output.close()
+
+def timeit(func, *args, **kwds):
+    "Return the best time of three calls and the result."
+    dts = []
+    for i in range(3):
+        tstart = time.time()
+        result = func(*args, **kwds)
+        dts.append(time.time() - tstart)
+    return min(dts), result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, default=100000,
+                        help='Number of scan points')
+    args = parser.parse_args()
+
+    np.random.seed(2201)
+    fd, infile = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        write_raft_scan(infile, args.npts)
+        dt_xyz, xyz = timeit(legacy_xyz, infile)
+        dt_hk, hk = timeit(legacy_housekeeping, infile)
+        dt_new, scan = timeit(read_ts5_scan, infile,
+                              columns='XYZ' + TS5_HOUSEKEEPING)
+        assert np.array_equal(scan['Z'], xyz['Z'])
+        assert np.array_equal(scan['A'], hk['A'])
+        print('%i points' % args.npts)
+        print('legacy Ts5Data reader      %8.3f s' % dt_xyz)
+        print('legacy qaPlot reader       %8.3f s' % dt_hk)
+        print('single-pass read_ts5_scan  %8.3f s' % dt_new)
+        print('speedup                    %8.1f' % ((dt_xyz + dt_hk)/dt_new))
+        # The delta producer reads the two room temperature scans in
+        # Ts5Data and all five scans of the run in qaPlot.
+        print('delta producer, legacy     %8.3f s' % (2*dt_xyz + 5*dt_hk))
+        print('delta producer, new        %8.3f s' % (5*dt_new))
+    finally:
+        os.remove(infile)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark writing the residuals of a synthetic TS5 raft scan: the
+original per-point text writer, the chunked text writer (which writes
+the same bytes) and the compressed binary residuals file, and reading
+them back with numpy.loadtxt and read_binary_residuals.
+"""
+from __future__ import print_function
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+from MetrologyData import md_factory
+from persistUtils import read_binary_residuals
+
+def write_raft_scan(outfile, npts):
+    "Write a synthetic TS5 scan with npts points and 15 columns."
+    values = np.random.uniform(0, 100, size=(npts, 15))
+    values[:, 2] = (0.01*values[:, 0] - 0.02*values[:, 1] + 3
+                    + np.random.normal(scale=0.002, size=npts))
+    values[:, 14] = 1.5e12 + 1e3*np.arange(npts)
+    output = open(outfile, 'w')
+    output.write('# start time = 1500000000000.0 end time = 1500001000000.0\n')
+    np.savetxt(output, values, fmt='%.6f', delimiter=',')
+    output.close()
+
+def legacy_write_residuals(md, outfile, contour_id=1):
+    "The original write_residuals method."
+    pos, z = md.sensor.data()
+    output = open(outfile, 'w')
+    output.write('Contour %i\n' % contour_id)
+    for my_pos, my_z in zip(pos, md.resids):
+        output.write('%.6f  %.6f  %.6f mm\n' % (my_pos[0], my_pos[1], my_z))
+    output.close()
+
+def read_text_residuals(infile):
+    "Parse a text residuals file."
+    return np.loadtxt(infile, skiprows=1, usecols=(0, 1, 2))
+
+def timeit(func, *args, **kwds):
+    "Return the best time of three calls."
+    dts = []
+    for i in range(3):
+        tstart = time.time()
+        func(*args, **kwds)
+        dts.append(time.time() - tstart)
+    return min(dts)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--npts', type=int, nargs='+',
+                        default=(100000, 1000000))
+    args = parser.parse_args()
+
+    print('    npts  writer      write (s)   Mpts/s   size (MB)   read (s)')
+    for npts in args.npts:
+        fd, outfile = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            write_raft_scan(outfile, npts)
+            md = md_factory.create(outfile, dtype='TS5')
+            md.set_ref_plane(md.sensor.xyzPlane_fit())
+            for label, func, kwds, reader in (
+                    ('legacy', legacy_write_residuals, dict(), None),
+                    ('text', md.write_residuals, dict(), read_text_residuals),
+                    ('binary', md.write_residuals, dict(binary=True),
+                     read_binary_residuals)):
+                if func is legacy_write_residuals:
+                    dt_write = timeit(func, md, outfile)
+                else:
+                    dt_write = timeit(func, outfile, **kwds)
+                dt_read = timeit(reader, outfile) if reader else float('nan')
+                print('%8i  %-10s  %9.3f  %7.2f  %10.1f  %9.3f'
+                      % (npts, label, dt_write, npts/dt_write/1e6,
+                         os.path.getsize(outfile)/2.**20, dt_read))
+        finally:
+            os.remove(outfile)
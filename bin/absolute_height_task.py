@@ -7,7 +7,17 @@ parser.add_argument('ogp_file', help='OGP data file of xyz tuples containing gau
 parser.add_argument('sensor_id', help='LSST ID number of sensor')
 parser.add_argument('--zoffset', type=float, default=-1.2,
                     help='z-offset')
+parser.add_argument('--processes', type=int, default=None,
+                    help='Number of processes for rendering the plots '
+                    '(default: in the task process)')
+parser.add_argument('--pickle_file', type=str, default=None,
+                    help='File for the persisted MetrologyData results')
+parser.add_argument('--numbers_only', action='store_true', default=False,
+                    help='Write the residuals, quantile table and results, '
+                    'but no plots')
 
 args = parser.parse_args()
 
-absoluteHeightTask(args.sensor_id, args.ogp_file, zoffset=args.zoffset)
+absoluteHeightTask(args.sensor_id, args.ogp_file, zoffset=args.zoffset,
+                   pickle_file=args.pickle_file, processes=args.processes,
+                   make_plots=not args.numbers_only)
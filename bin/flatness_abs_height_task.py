@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+import argparse
+from flatnessAbsHeightTask import flatnessAbsHeightTask
+
+parser = argparse.ArgumentParser(description='Sensor flatness and absolute height analyses of a single OGP scan.')
+parser.add_argument('ogp_file', help='OGP data file of xyz tuples containing gauge block and sensor metrology points')
+parser.add_argument('sensor_id', help='LSST ID number of sensor')
+parser.add_argument('--zoffset', type=float, default=-1.2,
+                    help='z-offset')
+parser.add_argument('--processes', type=int, default=None,
+                    help='Number of processes for rendering the plots '
+                    '(default: in the task process)')
+parser.add_argument('--flatness_pickle_file', type=str, default=None,
+                    help='File for the persisted flatness results')
+parser.add_argument('--abs_height_pickle_file', type=str, default=None,
+                    help='File for the persisted absolute height results')
+parser.add_argument('--numbers_only', action='store_true', default=False,
+                    help='Write the residuals, quantile tables and results, '
+                    'but no plots')
+
+args = parser.parse_args()
+
+flatnessAbsHeightTask(args.sensor_id, args.ogp_file, zoffset=args.zoffset,
+                      flatness_pickle_file=args.flatness_pickle_file,
+                      abs_height_pickle_file=args.abs_height_pickle_file,
+                      processes=args.processes,
+                      make_plots=not args.numbers_only)
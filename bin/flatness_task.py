@@ -7,7 +7,25 @@ parser.add_argument('infile', help='Data file of xyz tuples containing sensor me
 parser.add_argument('sensor_id', help='LSST ID number of sensor')
 parser.add_argument('--datatype', type=str, default='OGP',
                     help='Formatting of input file: OGP, e2v, ITL')
+parser.add_argument('--processes', type=int, default=None,
+                    help='Number of processes for rendering the plots '
+                    '(default: in the task process)')
+parser.add_argument('--pickle_file', type=str, default=None,
+                    help='File for the persisted MetrologyData results')
+parser.add_argument('--numbers_only', action='store_true', default=False,
+                    help='Write the residuals, quantile table and results, '
+                    'but no plots')
+parser.add_argument('--streaming', action='store_true', default=False,
+                    help='Read the scan in blocks, in constant memory, '
+                    'and write the residuals and quantile table only '
+                    '(TS5, e2v and ITL data)')
+parser.add_argument('--threads', type=int, default=None,
+                    help='Number of threads for the chunk-parallel plane '
+                    'fit, residuals and histogram (0: one per CPU)')
 
 args = parser.parse_args()
 
-flatnessTask(args.sensor_id, args.infile, dtype=args.datatype)
+flatnessTask(args.sensor_id, args.infile, dtype=args.datatype,
+             pickle_file=args.pickle_file, processes=args.processes,
+             make_plots=not args.numbers_only, streaming=args.streaming,
+             threads=args.threads)
@@ -41,4 +41,5 @@ print "met_file = %s" % met_file
 # Below dtype is always 'OGP', i.e., for this task the source of the data
 # is always the OGP scanner at BNL
 absoluteHeightTask(sensor_id, met_file, dtype='OGP',
-                   pickle_file='abs_height.pickle')
+                   pickle_file='abs_height.npz',
+                   summary_file='abs_height_summary.json')
@@ -24,4 +24,5 @@ met_file = metUtils.get_met_scan_data(sensor_id, patterns[ccd_vendor],
                                       sort=True)[-1]
 
 absoluteHeightTask(sensor_id, met_file, dtype=ccd_vendor,
-                   pickle_file='abs_height.pickle')
+                   pickle_file='abs_height.npz',
+                   summary_file='abs_height_summary.json')
@@ -1,10 +1,9 @@
 #!/usr/bin/env python
 import os
-import numpy as np
 import lcatr.schema
 import siteUtils
 import metUtils
-from MetrologyData import md_factory
+from persistUtils import load_summary
 
 ccd_vendor = siteUtils.getCcdVendor()
 
@@ -13,12 +12,13 @@ testtype = 'ABS_HEIGHT'
 results = metUtils.aggregate_filerefs(producer, testtype)
 
 #
-# Extract numerical results from pickled MetrologyData object, if it exists.
+# Extract numerical results from the summary of the MetrologyData object,
+# if it exists.
 #
-pickle_file = 'abs_height.pickle'
-if os.path.isfile(pickle_file):
-    sensorData = md_factory.load(pickle_file)
-    z_median_m_13 = np.median(sensorData.sensor.z) - 13000.
+summary_file = 'abs_height_summary.json'
+if os.path.isfile(summary_file):
+    sensorData = load_summary(summary_file)
+    z_median_m_13 = sensorData.z_median - 13000.
     z_quantile_0025 = sensorData.quantiles['0.025']
     z_quantile_0975 = sensorData.quantiles['0.975']
 
@@ -40,4 +40,5 @@ print "flat_file = %s" % flat_file
 
 # The dtype below indicates the source of the data, which is always OGP
 # for sensors measured at BNL
-flatnessTask(sensor_id, flat_file, dtype='OGP', pickle_file='flatness.pickle')
+flatnessTask(sensor_id, flat_file, dtype='OGP', pickle_file='flatness.npz',
+             summary_file='flatness_summary.json')
@@ -19,4 +19,5 @@ met_file = metUtils.get_met_scan_data(sensor_id, patterns[ccd_vendor],
                                       sort=True)[-1]
 
 flatnessTask(sensor_id, met_file, dtype=ccd_vendor,
-             pickle_file='flatness.pickle')
+             pickle_file='flatness.npz',
+             summary_file='flatness_summary.json')
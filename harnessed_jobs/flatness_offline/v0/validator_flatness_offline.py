@@ -2,13 +2,13 @@
 import lcatr.schema
 import siteUtils
 import metUtils
-from MetrologyData import md_factory
+from persistUtils import load_summary
 
 producer = 'SR-MET-05'
 testtype = 'FLATNESS'
 results = metUtils.aggregate_filerefs(producer, testtype)
 
-sensorData = md_factory.load('flatness.pickle')
+sensorData = load_summary('flatness_summary.json')
 peak_valley_95 = sensorData.quantiles['0.975'] - sensorData.quantiles['0.025']
 flatnesshalfband_95 = peak_valley_95/2.
 
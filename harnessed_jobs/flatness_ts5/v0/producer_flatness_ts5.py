@@ -24,4 +24,5 @@ infile = siteUtils.dependency_glob('*.csv',
                                    description='')[0]
 print "infile = %s" % infile
 
-flatnessTask(raft_id, infile, dtype='TS5', pickle_file='flatness_ts5.pickle')
+flatnessTask(raft_id, infile, dtype='TS5', pickle_file='flatness_ts5.npz',
+             summary_file='flatness_ts5_summary.json')
@@ -2,14 +2,14 @@
 import lcatr.schema
 import siteUtils
 import metUtils
-from MetrologyData import md_factory
+from persistUtils import load_summary
 
 producer = 'SR-MET-07'
 testtype = 'FLATNESS'
 
 results = metUtils.aggregate_filerefs_ts5(producer, testtype)
 
-raftData = md_factory.load('flatness_ts5.pickle')
+raftData = load_summary('flatness_ts5_summary.json')
 peak_valley_95 = raftData.quantiles_filt['0.975'] - raftData.quantiles_filt['0.025']
 peak_valley_100 = raftData.quantiles_filt['1.000'] - raftData.quantiles_filt['0.000']
 
@@ -31,18 +31,12 @@ results.append(lcatr.schema.valid(lcatr.schema.get('ts5_raft_flatness'),
                                   flatness_quantile=quantile_str,
                                   flatness_z=z_str))
 
-# Parse the metadata from the scan file
-temp_start = []
-temp_end = []
-for line in open(raftData.infile):
-    if line.startswith('# start time ='):
-        tokens = line.split()
-        start_time = float(tokens[4])
-        end_time = float(tokens[9])
-    if line.startswith('# temperature'):
-        tokens = line.split()
-        temp_start.append(float(tokens[5]))
-        temp_end.append(float(tokens[9]))
+# The metadata from the scan file headers, as parsed with the scan data
+metadata = raftData.scan_metadata[raftData.infile]
+start_time = metadata['start_time']
+end_time = metadata['end_time']
+temp_start = metadata['temp_start']
+temp_end = metadata['temp_end']
 
 results.append(lcatr.schema.valid(lcatr.schema.get('ts5_raft_flatness2'),
                                   start_time=start_time,
@@ -19,7 +19,9 @@ for acqjobname in acqjobnames:
                                            description='')[0])
 
 # The dtype below indicates the source of the data, which is always TS5
-flatnessTask_delta(raft_id, files, dtype='TS5', pickle_file='flatness_ts5_delta.pickle')
+raftDataDelta = flatnessTask_delta(raft_id, files, dtype='TS5',
+                                   pickle_file='flatness_ts5_delta.npz',
+                                   summary_file='flatness_ts5_delta_summary.json')
 
 # Make the QA plot using all of the scans from the run
 acqjobnames = ['Pump_and_Room_Temp_Measurement', 'Cooling_Measurement-1',
@@ -32,4 +34,7 @@ for acqjobname in acqjobnames:
                                            description='')[0])
 
 # The dtype below indicates the source of the data, which is always TS5
-qaPlot(files, '%s_flatness_qa_plot.png' % raft_id, title='QA Plot: %s' % raft_id)
+# The housekeeping data for the two room-temperature scans have
+# already been read, so pass them along to avoid re-reading those files.
+qaPlot(files, '%s_flatness_qa_plot.png' % raft_id, title='QA Plot: %s' % raft_id,
+       housekeeping=raftDataDelta.housekeeping)
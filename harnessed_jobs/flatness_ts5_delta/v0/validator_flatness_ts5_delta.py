@@ -3,7 +3,7 @@ import glob
 import lcatr.schema
 import siteUtils
 import metUtils
-from MetrologyData import md_factory
+from persistUtils import load_summary
 
 producer = 'SR-MET-07'
 testtype = 'FLATNESS'
@@ -25,7 +25,7 @@ md = siteUtils.DataCatalogMetadata(CCD_MANU=siteUtils.getCcdVendor(),
 
 results.extend([lcatr.schema.fileref.make(qafile, metadata=md(DATA_PRODUCT='QA_PLOT'))])
 
-raftData = md_factory.load('flatness_ts5_delta.pickle')
+raftData = load_summary('flatness_ts5_delta_summary.json')
 peak_valley_95 = raftData.quantiles_filt['0.975'] - raftData.quantiles_filt['0.025']
 peak_valley_100 = raftData.quantiles_filt['1.000'] - raftData.quantiles_filt['0.000']
 
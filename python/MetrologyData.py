@@ -1,21 +1,34 @@
-import os
-
-# The following is needed so that matplotlib can write to .matplotlib
-os.environ['MPLCONFIGDIR'] = os.curdir
-import matplotlib
-# For batch-processing, use cairo backend to avoid needing an X11 connection.
-# (The Agg backend does not work with 3D plots in matplotlib 1.5.1. The cairo
-# backend uses vector fonts and does not render Greek letters or some other
-# LaTeX math formatting.)
-matplotlib.use('cairo')
-
 import sys
+import re
+import copy
 import pickle
 import numpy as np
-import scipy.optimize
-import scipy.stats
-from mpl_toolkits.mplot3d import Axes3D
-import lsst.eotest.sensor.pylab_plotter as plot
+from planeFit import sigma_clip_fit, clip_mask, segmented_plane_fit
+from persistUtils import write_results, read_results, is_results_file, \
+    write_binary_residuals, format_residuals
+from quantileUtils import exact_quantiles, QuantileSketch
+from parallelUtils import chunk_map
+from ts5Utils import read_ts5_scan, TS5_HOUSEKEEPING, match_grid_points, \
+    grid_match_stats, GriddedScan
+
+def _plots():
+    """
+    Import the plotting functions on first use.  Importing metPlots
+    configures matplotlib and imports it, SciPy and lsst.eotest.
+    """
+    import metPlots
+    return metPlots
+
+class _LazyPlotter(object):
+    """
+    Stand-in for the lsst.eotest.sensor.pylab_plotter module, imported
+    by metPlots on first use, so that plot.save(...) etc. still work
+    for users of this module.
+    """
+    def __getattr__(self, name):
+        return getattr(_plots().plot, name)
+
+plot = _LazyPlotter()
 
 class XyzPlane(object):
     """
@@ -26,7 +39,8 @@ class XyzPlane(object):
         self.pars = a, b, c
     def __call__(self, positions):
         a, b, c = self.pars
-        return np.array([a*x + b*y + c for x, y in positions])
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        return a*positions[:, 0] + b*positions[:, 1] + c
 
 def xyz_plane(positions, a, b, c):
     "Function wrapping XyzPlane for passing to scipy.optimize.curve_fit"
@@ -39,33 +53,141 @@ class PointCloud(object):
     surface.
     """
     def __init__(self, x, y, z):
-        self.x = np.array(x)
-        self.y = np.array(y)
-        self.z = np.array(z)
+        # The points are stored as the rows of a single (N, 3) array;
+        # x, y, z and positions are views of its columns.
+        x = np.asarray(x, dtype=float)
+        self.xyz = np.empty((len(x), 3))
+        self.xyz[:, 0] = x
+        self.xyz[:, 1] = y
+        self.xyz[:, 2] = z
         self.stdev_filt = None
         self.mean_filt = None
 
+    @staticmethod
+    def from_xyz(xyz):
+        """
+        Create a PointCloud from an (N, 3) array of x, y, z values,
+        without copying it if it is already a C-contiguous float array.
+        """
+        cloud = PointCloud([], [], [])
+        cloud.xyz = np.ascontiguousarray(xyz, dtype=float).reshape(-1, 3)
+        return cloud
+
+    @staticmethod
+    def concatenate(clouds):
+        """
+        Combine a sequence of PointClouds into a new PointCloud, copying
+        the points of each into a single pre-sized array.
+        """
+        clouds = list(clouds)
+        xyz = np.empty((sum(len(cloud) for cloud in clouds), 3))
+        start = 0
+        for cloud in clouds:
+            xyz[start:start + len(cloud)] = cloud.xyz
+            start += len(cloud)
+        return PointCloud.from_xyz(xyz)
+
+    def __len__(self):
+        return len(self.xyz)
+
+    def _set_column(self, column, values):
+        self.xyz[:, column] = values
+
+    x = property(lambda self: self.xyz[:, 0],
+                 lambda self, values: self._set_column(0, values))
+    y = property(lambda self: self.xyz[:, 1],
+                 lambda self, values: self._set_column(1, values))
+    z = property(lambda self: self.xyz[:, 2],
+                 lambda self, values: self._set_column(2, values))
+
+    @property
+    def positions(self):
+        "(N, 2) view of the x, y positions."
+        return self.xyz[:, :2]
+
+    def __setstate__(self, state):
+        # PointClouds pickled before the points were stored in a single
+        # array have separate x, y and z arrays.
+        if 'xyz' not in state:
+            state = dict(state)
+            xyz = np.column_stack([state.pop(coord) for coord in 'xyz'])
+            state['xyz'] = xyz
+        self.__dict__.update(state)
+
     def data(self):
         """
         Return the xyz data repackaged in a format appropriate for
-        fitting using scipy.optimize.curve_fit and the xyz_plane function.
+        fitting using scipy.optimize.curve_fit and the xyz_plane function,
+        i.e., views of the (N, 2) positions and the z values.
         """
-        return np.array(zip(self.x, self.y)), self.z
+        return self.positions, self.z
 
     def __add__(self, other):
-        result = PointCloud([], [], [])
-        result.x = np.concatenate((self.x, other.x))
-        result.y = np.concatenate((self.y, other.y))
-        result.z = np.concatenate((self.z, other.z))
-        return result
+        return PointCloud.concatenate((self, other))
 
-    def xyzPlane_fit(self, nsigma=4, p0=(0, 0, 0)):
+    def xyzPlane_fit(self, nsigma=4, p0=(0, 0, 0), method='lstsq', tol=0,
+                     max_iter=100, threads=None):
         """
         Fit a plane to the xyz data, clipping the initial fit at the
         nsigma level to remove outlier points.  Return an XyzPlane
         functor set to the fit parameters.
+
+        The plane is a linear model, so by default (method='lstsq') the
+        fits are done with planeFit.sigma_clip_fit, which solves the
+        normal equations directly and, between refits, only updates
+        them for the points that enter or leave the clipped subset.
+        Refitting stops when the subset no longer changes, when the
+        standard deviation of the residuals changes by no more than
+        tol times its value, or after max_iter refits.  The number of
+        refits and the mask of the points used in the final fit are
+        available as the niter and mask attributes.
+
+        If threads is given, the passes over the points are split into
+        chunks evaluated by a pool of that many threads (see
+        parallelUtils), with results that agree with the serial fit to
+        within rounding.
+
+        method='curve_fit' uses scipy.optimize.curve_fit for each fit,
+        starting from the parameters p0, and refits until the standard
+        deviation of the residuals does not change.
         """
-        positions = np.array(zip(self.x, self.y))
+        if method == 'curve_fit':
+            return self._xyzPlane_curve_fit(nsigma, p0)
+        if method != 'lstsq':
+            raise RuntimeError("Unrecognized plane fitting method: " + method)
+
+        # Fit relative to the centroid of the points to preserve the
+        # precision of the running sums.
+        x0, y0, z0 = np.mean(self.x), np.mean(self.y), np.mean(self.z)
+        design = np.empty((len(self), 3))
+        w = np.empty(len(self))
+        def fill(chunk):
+            design[chunk, 0] = self.x[chunk] - x0
+            design[chunk, 1] = self.y[chunk] - y0
+            design[chunk, 2] = 1
+            w[chunk] = self.z[chunk] - z0
+        chunk_map(fill, len(self), threads)
+        pars, mean, stdev, self.mask, self.niter \
+            = sigma_clip_fit(design, w, nsigma=nsigma, tol=tol,
+                             max_iter=max_iter, threads=threads)
+        a, b, c = pars
+        pars = np.array((a, b, c + z0 - a*x0 - b*y0))
+
+        # Make the standard deviation and mean of the filtered residuals
+        # available, along with the fit parameters.  sigma_clip_fit
+        # computes residuals as data - model, but here the mean is
+        # given for model - data.
+        self.stdev_filt = stdev
+        self.mean_filt = -mean
+        self.pars = pars
+
+        # Return a XyzPlane functor initialized with the fitted parameters.
+        return XyzPlane(*pars)
+
+    def _xyzPlane_curve_fit(self, nsigma, p0):
+        "Clipped plane fit using scipy.optimize.curve_fit."
+        import scipy.optimize
+        positions = self.positions
 
         # Initial fit
         pars, _ = scipy.optimize.curve_fit(xyz_plane, positions, self.z, p0=p0)
@@ -76,15 +198,18 @@ class PointCloud(object):
         stdev_last = -1
         stdev_new = stdev
         index = np.where((dz > mean-nsigma*stdev) & (dz < mean+nsigma*stdev))
+        self.niter = 0
         while stdev_new != stdev_last:
             stdev_last = stdev_new
             # Refit the reference data within nsigma*stdev of the mean.
+            self.mask = clip_mask(dz, mean, stdev_new, nsigma)
             pars, _ = scipy.optimize.curve_fit(xyz_plane, positions[index],
                                                self.z[index], p0=pars)
             dz = xyz_plane(positions, *pars) - self.z
             mean, stdev_new = np.mean(dz[index]), np.std(dz[index])
             index = np.where((dz > mean-nsigma*stdev_new) &
                              (dz < mean+nsigma*stdev_new))
+            self.niter += 1
 
         # Make the standard deviation and mean of the filtered residuals
         # available, along with the fit parameters
@@ -95,6 +220,42 @@ class PointCloud(object):
         # Return a XyzPlane functor initialized with the fitted parameters.
         return XyzPlane(*pars)
 
+def xyzPlane_fit_batch(clouds, nsigma=4, tol=0, max_iter=100):
+    """
+    Fit planes to each of a sequence of PointClouds, as
+    PointCloud.xyzPlane_fit does, but with all of the fits done together
+    by planeFit.segmented_plane_fit.  The fit results are set as the
+    attributes of each PointCloud, and a list of the XyzPlane functors
+    is returned.  Clouds that cannot be fit, e.g., with fewer than three
+    points or with collinear points, get nan parameters.
+    """
+    labels = np.concatenate([np.zeros(len(cloud), dtype=int) + i
+                             for i, cloud in enumerate(clouds)])
+    x, y, z = PointCloud.concatenate(clouds).xyz.transpose()
+    segments, seg_pars, seg_mean, seg_stdev, mask, seg_niter \
+        = segmented_plane_fit(x, y, z, labels, nsigma=nsigma, tol=tol,
+                              max_iter=max_iter)
+    # Clouds without points have no segment, and get nan values.
+    pars = np.zeros((len(clouds), 3)) + np.nan
+    pars[segments] = seg_pars
+    mean = np.zeros(len(clouds)) + np.nan
+    mean[segments] = seg_mean
+    stdev = np.zeros(len(clouds)) + np.nan
+    stdev[segments] = seg_stdev
+    niter = np.zeros(len(clouds), dtype=int)
+    niter[segments] = seg_niter
+    masks = np.split(mask, np.cumsum([len(cloud) for cloud in clouds])[:-1])
+    planes = []
+    for i, cloud in enumerate(clouds):
+        cloud.pars = pars[i]
+        # The mean of the filtered residuals is given for model - data.
+        cloud.mean_filt = -mean[i]
+        cloud.stdev_filt = stdev[i]
+        cloud.mask = masks[i]
+        cloud.niter = niter[i]
+        planes.append(XyzPlane(*pars[i]))
+    return planes
+
 class MetrologyData(object):
     """
     Base class for metrology data.
@@ -104,12 +265,38 @@ class MetrologyData(object):
         self._read_data()
         self.resids = None
         self.resids_filt = None
+        self.sketch = None
+        self.sketch_filt = None
         self.pars = None
 
-    def set_ref_plane(self, plane_functor, zoffset=0, nsigma=5):
+    def analysis_copy(self):
+        """
+        Return a copy of this object for a separate analysis of the same
+        scan, e.g., flatness and absolute height.  The copy shares the
+        point arrays, but has its own PointClouds, without plane fit
+        results, and no reference plane, residuals or quantiles.
+        """
+        other = copy.copy(self)
+        for attr in ('plane_functor', 'quantiles', 'quantiles_filt'):
+            other.__dict__.pop(attr, None)
+        other.resids = other.resids_filt = None
+        other.sketch = other.sketch_filt = None
+        for attr, value in list(other.__dict__.items()):
+            if isinstance(value, PointCloud):
+                setattr(other, attr, PointCloud.from_xyz(value.xyz))
+        return other
+
+    def set_ref_plane(self, plane_functor, zoffset=0, nsigma=5,
+                      sketch_bin_width=None, threads=None):
+        # If threads is given, the residuals and clipping masks are
+        # evaluated for chunks of the points by a pool of that many
+        # threads (see parallelUtils), with the same results.
         self.plane_functor = plane_functor
         pos, z = self.sensor.data()
-        dz = z - plane_functor(pos) + zoffset
+        dz = np.empty(len(z))
+        def resids(chunk):
+            dz[chunk] = z[chunk] - plane_functor(pos[chunk]) + zoffset
+        chunk_map(resids, len(z), threads)
         self.resids = dz
 
         # Also define residuals with outliers removed (nsigma clipping)
@@ -120,184 +307,159 @@ class MetrologyData(object):
             # have been evaluated.  No plane needs to be fit here, but
             # the code expects to be able to reference the mean and
             # standard deviations of the filtered residuals.
-            mean, stdev = np.mean(dz), np.std(dz)
-            index = np.where((dz > mean-nsigma*stdev) &
-                             (dz < mean+nsigma*stdev))
-            self.sensor.mean_filt = np.mean(dz[index])
-            self.sensor.stdev_filt = np.std(dz[index])
+            #
+            # A single clipping pass is done, without a model.
+            _, mean, stdev, _, _ = sigma_clip_fit(np.zeros((len(dz), 0)), dz,
+                                                  nsigma=nsigma, max_iter=1,
+                                                  threads=threads)
+            self.sensor.mean_filt = mean
+            self.sensor.stdev_filt = stdev
 
         mean, stdev = self.sensor.mean_filt, self.sensor.stdev_filt
-        index = np.where((dz > mean-nsigma*stdev) & (dz < mean+nsigma*stdev))
-        self.resids_filt = dz[index]
+        mask = np.empty(len(dz), dtype=bool)
+        def clip(chunk):
+            mask[chunk] = clip_mask(dz[chunk], mean, stdev, nsigma)
+        chunk_map(clip, len(dz), threads)
+        self.resids_filt = dz[mask]
+
+        # Optionally, summarize the residuals in mergeable quantile
+        # sketches, e.g., for combining the residuals of many scans.
+        if sketch_bin_width is not None:
+            self.sketch = QuantileSketch(sketch_bin_width).add(dz)
+            self.sketch_filt = QuantileSketch(sketch_bin_width).add(
+                self.resids_filt)
 
     def flatness_plot(self, elev=10, azim=30, title=None,
-                      sensor_color='r', ref_color='b'):
-        win = plot.Window()
-        ax = Axes3D(win.fig)
-
-        ax.scatter(self.sensor.x, self.sensor.y, self.resids, c=sensor_color)
-
-        x = np.linspace(min(self.sensor.x), max(self.sensor.x), 100)
-        y = np.linspace(min(self.sensor.y), max(self.sensor.y), 100)
-
-        xx, yy, zz = [], [], []
-        for xval in x:
-            for yval in y:
-                xx.append(xval)
-                yy.append(yval)
-                zz.append(0)
-
-        xx = np.array(xx).reshape(len(y), len(x))
-        yy = np.array(yy).reshape(len(y), len(x))
-        zz = np.array(zz).reshape(len(y), len(x))
-
-        ax.plot_wireframe(xx, yy, zz, rstride=5, cstride=5)
-
-        index = np.where(self.resids > 0)
-        ax.scatter(self.sensor.x[index], self.sensor.y[index],
-                   self.resids[index], c=sensor_color)
-
-        plot.pylab.xlabel('x (mm)')
-        plot.pylab.ylabel('y (mm)')
-        ax.set_zlabel('z (micron)')
-        ax.view_init(elev=elev, azim=azim)
-        if title is None:
-            title = self.infile
-        ax.set_title(title)
-        return win, ax
+                      sensor_color='r', ref_color='b', grid_size=100,
+                      stride=5, max_points=None, outlier_nsigma=3):
+        return _plots().flatness_plot(self, elev=elev, azim=azim, title=title,
+                                      sensor_color=sensor_color,
+                                      ref_color=ref_color,
+                                      grid_size=grid_size, stride=stride,
+                                      max_points=max_points,
+                                      outlier_nsigma=outlier_nsigma)
 
     def absolute_height_plot(self, elev=10, azim=30, title=None,
                              sensor_color='r', ref_color='b',
-                             refpoint_color='b'):
-        win = plot.Window()
-        ax = Axes3D(win.fig)
-        ax.scatter(self.sensor.x, self.sensor.y, self.sensor.z,
-                   c=sensor_color)
-        try:
-            ax.scatter(self.reference.x, self.reference.y, self.reference.z,
-                       c=refpoint_color)
-            y = np.linspace(min(self.reference.y), max(self.reference.y), 100)
-        except AttributeError:
-            # Vendor data may not have data from the reference plane
-            # scans, so there are not reference points to plot.
-            #
-            # Use the sensor points to set the grid points in y.
-            y = np.linspace(min(self.sensor.y), max(self.sensor.y), 100)
-
-        x = np.linspace(min(self.sensor.x), max(self.sensor.x), 100)
-
-        xx, yy, zz = [], [], []
-        for xval in x:
-            for yval in y:
-                xx.append(xval)
-                yy.append(yval)
-                zz.append(self.plane_functor([(xval, yval)]))
-
-        xx = np.array(xx).reshape(len(y), len(x))
-        yy = np.array(yy).reshape(len(y), len(x))
-        zz = np.array(zz).reshape(len(y), len(x))
-
-        ax.plot_wireframe(xx, yy, zz, rstride=5, cstride=5)
-
-        index = np.where(self.resids > 0)
-        ax.scatter(self.sensor.x[index], self.sensor.y[index],
-                   self.sensor.z[index], c=sensor_color)
-
-        plot.pylab.xlabel('x (mm)')
-        plot.pylab.ylabel('y (mm)')
-        ax.set_zlabel('z (micron)')
-        ax.view_init(elev=elev, azim=azim)
-        if title is None:
-            title = self.infile
-        ax.set_title(title)
+                             refpoint_color='b', grid_size=100, stride=5,
+                             max_points=None, outlier_nsigma=3):
+        return _plots().absolute_height_plot(self, elev=elev, azim=azim,
+                                             title=title,
+                                             sensor_color=sensor_color,
+                                             ref_color=ref_color,
+                                             refpoint_color=refpoint_color,
+                                             grid_size=grid_size,
+                                             stride=stride,
+                                             max_points=max_points,
+                                             outlier_nsigma=outlier_nsigma)
+
+    def flatness_plot_views(self, views, outfiles, **kwds):
+        """
+        Make the flatness_plot once and save it as seen from each of the
+        (elev, azim) viewpoints in views to the corresponding file in
+        outfiles.  The other keyword arguments are passed to
+        flatness_plot.
+        """
+        elev, azim = views[0]
+        win, ax = self.flatness_plot(elev=elev, azim=azim, **kwds)
+        _plots().save_views(ax, views, outfiles)
+        return win, ax
+
+    def absolute_height_plot_views(self, views, outfiles, **kwds):
+        """
+        Make the absolute_height_plot once and save it as seen from each
+        of the (elev, azim) viewpoints in views to the corresponding file
+        in outfiles.
+        """
+        elev, azim = views[0]
+        win, ax = self.absolute_height_plot(elev=elev, azim=azim, **kwds)
+        _plots().save_views(ax, views, outfiles)
         return win, ax
 
     def quantile_table(self, outfile=None,
                        quantiles=(1, 0.995, 0.990, 0.975, 0.75, 0.5,
-                                  0.25, 0.025, 0.01, 0.005, 0)):
+                                  0.25, 0.025, 0.01, 0.005, 0),
+                       use_sketch=False):
         self.quantiles = {}
         if self.resids is None:
             raise RuntimeError("Reference plane not set")
+        if use_sketch and getattr(self, 'sketch', None) is None:
+            raise RuntimeError("Quantile sketches not computed")
         if outfile is None:
             output = sys.stdout
         else:
             output = open(outfile, 'w')
-        sorted_resids = sorted(self.resids)
-        npts = len(sorted_resids)
+        if use_sketch:
+            values = self.sketch.quantiles(quantiles)
+        else:
+            values = exact_quantiles(self.resids, quantiles)
         output.write('quantile     z (micron)\n')
-        for quantile in quantiles:
-            index = min(int(npts*quantile), npts-1)
-            output.write(' %.3f   %12.6f\n' % (quantile, sorted_resids[index]))
-            self.quantiles['%.3f' % quantile] = sorted_resids[index]
+        for quantile, value in zip(quantiles, values):
+            output.write(' %.3f   %12.6f\n' % (quantile, value))
+            self.quantiles['%.3f' % quantile] = value
         if outfile is not None:
             output.close()
 
         # Also evaluate quantiles with outliers filtered
-        self.quantiles_filt = {}
-        sorted_resids_filt = sorted(self.resids_filt)
-        npts = len(sorted_resids_filt)
-        for quantile in quantiles:
-            index = min(int(npts*quantile), npts-1)
-            self.quantiles_filt['%.3f' % quantile] = sorted_resids_filt[index]
-
-    def write_residuals(self, outfile, contour_id=1):
+        if use_sketch:
+            values = self.sketch_filt.quantiles(quantiles)
+        else:
+            values = exact_quantiles(self.resids_filt, quantiles)
+        self.quantiles_filt = dict(('%.3f' % quantile, value) for
+                                   quantile, value in zip(quantiles, values))
+
+    def write_residuals(self, outfile, contour_id=1, binary=False,
+                        chunk_size=2**16):
+        """
+        Write the sensor x, y positions and the residuals to outfile as
+        text, in chunks of chunk_size points, or, if binary is True, as
+        a compressed npz file (see persistUtils.write_binary_residuals).
+        """
         if self.resids is None:
             raise RuntimeError("Reference plane not set")
-        pos, z = self.sensor.data()
+        if binary:
+            write_binary_residuals(outfile, self.sensor.positions,
+                                   self.resids, contour_id=contour_id)
+            return
+        x, y = self.sensor.x, self.sensor.y
         output = open(outfile, 'w')
         output.write('Contour %i\n' % contour_id)
-        for my_pos, my_z in zip(pos, self.resids):
-            output.write('%.6f  %.6f  %.6f mm\n' % (my_pos[0], my_pos[1], my_z))
+        for start in range(0, len(self.resids), chunk_size):
+            end = start + chunk_size
+            output.write(format_residuals(x[start:end], y[start:end],
+                                          self.resids[start:end]))
         output.close()
 
     def resids_boxplot(self, yrange=None, title=None):
-        win = plot.Window()
-        plot.pylab.boxplot(self.resids)
-        plot.pylab.ylabel('micron')
-        plot.setAxis(yrange=yrange)
-        if title is None:
-            title = self.infile
-        win.set_title(title)
-        return win
-
-    def plot_statistics(self, nsigma=5, title=None, zoffset=0, bins=60):
+        return _plots().resids_boxplot(self, yrange=yrange, title=title)
+
+    def plot_statistics(self, nsigma=5, title=None, zoffset=0, bins=60,
+                        threads=None):
         """
         Plot summary statistics of z-value residuals relative to the
         provided XyzPlane functor.  The sensor data are used if
         plane_data is None.
         """
-        if self.resids is None:
-            raise RuntimeError("Reference plane not set")
-        dz = self.resids_filt
-
-        win = plot.histogram(dz,
-                             xname=r'z - $z_{\rm model}$ (micron)',
-                             yname='entries/bin',
-                             bins=bins) 
-        # Retrieve the plot limits to derive the width of the histogram bins
-        limits = plot.pylab.axis()
-        binsz = (limits[1] - limits[0])/bins
-
-        plot.pylab.annotate('mean=%.3f\nstdev=%.3f\n%i-sigma clip'
-                            % (self.sensor.mean_filt, self.sensor.stdev_filt,
-                               nsigma), (0.05, 0.8), xycoords='axes fraction')
-
-        # Overlay a Gaussian with the same sigma and correct normalization
-        x = np.linspace(np.min(dz), np.max(dz), 100)
-        gaussian = scipy.stats.norm(loc=self.sensor.mean_filt,
-                                    scale=self.sensor.stdev_filt)
-        plot.pylab.plot(x, np.size(dz)*binsz*gaussian.pdf(x), color='b',
-                        linestyle='-')
-        if title is None:
-            title = self.infile
-        win.set_title(title)
-        return win
-
-    def persist(self, outfile):
-        output = open(outfile, 'w')
+        return _plots().plot_statistics(self, nsigma=nsigma, title=title,
+                                        zoffset=zoffset, bins=bins,
+                                        threads=threads)
+
+    def persist(self, outfile, use_pickle=False):
+        """
+        Write this object to outfile in the array-based results format
+        of persistUtils or, if use_pickle is True, as a pickle.
+        """
+        if not use_pickle:
+            write_results(self, outfile)
+            return
+        output = open(outfile, 'wb')
         pickle.dump(self, output)
         output.close()
 
+# Regular expressions for splitting OGP files into Contour blocks.
+_contour_header = re.compile(r'\nContour[^\n]*')
+_blank_line = re.compile(r'\n[ \t\r\f\v]*(?=\n|$)')
+
 class OgpData(MetrologyData):
     """
     Abstraction for single sensor metrology scan, including gauge
@@ -309,24 +471,15 @@ class OgpData(MetrologyData):
     def _read_data(self):
         # Read the "Contour" data blocks into a local dict, convert
         # each to a PointCloud object, sort by mean y-value, and
-        # finally, set the sensor and reference datasets.
+        # finally, set the sensor and reference datasets.  A newline is
+        # prepended to the file contents so that every line, including
+        # the first, starts after a newline.
+        text = '\n' + open(self.infile).read()
         data = dict()
-        key = None
-        for line in open(self.infile):
-            if line.startswith('Contour'):
-                key = line.strip()
-                data[key] = []
-            if line.strip() and key is not None:
-                try:
-                    coords = self._xyz(line)
-                    data[key].append(coords)
-                except ValueError:
-                    pass
-            else:
-                key = None
-        # Convert to PointCloud objects.
-        for key in data:
-            data[key] = PointCloud(*zip(*tuple(data[key])))
+        for key, block in self._contour_blocks(text):
+            xyz = self._block_xyz(block)
+            if len(xyz) > 0:
+                data[key] = PointCloud.from_xyz(xyz)
 
         # Identify sensor and reference point clouds by mean y-values:
         # The sensor Contours are all in the range [0,42] and the reference
@@ -343,9 +496,60 @@ class OgpData(MetrologyData):
             else:
                 ref_clouds.append(cloud)
         if len(yavgs) > 1:
-            # Add all the reference point clouds together, explicitly
-            # setting the 'start' value in the sum function.
-            self.reference = sum(ref_clouds[1:], ref_clouds[0])
+            # Combine all the reference point clouds into a single,
+            # pre-sized array.
+            self.reference = PointCloud.concatenate(ref_clouds)
+
+    @staticmethod
+    def _contour_blocks(text):
+        """
+        Generator of (key, block) pairs for the Contours in the text
+        of an OGP file.  A block comprises the lines following a
+        'Contour' line up to the next blank line or 'Contour' line,
+        with each line preceded by a newline.
+        """
+        headers = list(_contour_header.finditer(text))
+        for i, header in enumerate(headers):
+            start = header.end()
+            end = len(text) if i == len(headers) - 1 else headers[i+1].start()
+            blank = _blank_line.search(text, start, end)
+            if blank is not None:
+                end = blank.start()
+            yield header.group().strip(), text[start:end]
+
+    def _block_xyz(self, block):
+        """
+        Convert the lines of a Contour block to an (N, 3) array of
+        x, y, z values, with z in microns.
+        """
+        # If every line has the same number of entries, e.g., 'x y z mm',
+        # the x, y, z columns can be sliced out of the tokens for the
+        # whole block and converted directly.  The total number of
+        # tokens is not enough to tell, since lines with extra and
+        # missing entries can offset each other, so each line is
+        # started with a marker token, and the lines are uniform if the
+        # markers are every ncols + 1 tokens.
+        tokens = block.replace('\n', '\n\0 ').split()
+        nlines = block.count('\n')
+        ncols = len(tokens)//nlines - 1 if nlines else 0
+        if (ncols >= 3 and len(tokens) == (ncols + 1)*nlines
+                and tokens[::ncols + 1].count('\0') == nlines):
+            try:
+                xyz = np.array([tokens[i::ncols + 1] for i in range(1, 4)],
+                               dtype=float).transpose()
+                xyz[:, 2] *= 1e3
+                return xyz
+            except ValueError:
+                pass
+        # Otherwise, convert line-by-line, skipping lines, e.g., column
+        # headings, that cannot be converted.
+        xyz = []
+        for line in block.splitlines():
+            try:
+                xyz.append(self._xyz(line))
+            except (ValueError, IndexError):
+                pass
+        return np.array(xyz, dtype=float).reshape(-1, 3)
 
     def _xyz(self, line):
         # Unpack a line and convert z values from mm to microns.
@@ -356,7 +560,12 @@ class Ts5Data(MetrologyData):
     """
     Abstraction for raft (RSA and RTM) metrology scans with TS5.
     """
-    def __init__(self, infile):
+    def __init__(self, infile, grid_tol=None):
+        # Tolerance for matching grid positions when differencing two
+        # scans: coordinates of the second scan within grid_tol of those
+        # of the first scan are matched.  See ts5Utils.match_grid_points.
+        self.grid_tol = grid_tol
+        self.match_stats = None
         super(Ts5Data, self).__init__(infile)
 
     def _read_data(self):
@@ -364,56 +573,70 @@ class Ts5Data(MetrologyData):
         # line are commanded x and y and the measured (summed) z, in mm.
         # Here to allow option of differencing two data sets, infile is
         # assumed to be a list of 1 or 2 elements
-        data = dict([(key, []) for key in 'XYZ'])
+        #
+        # The housekeeping columns (temperatures, pressure and time stamps)
+        # are read in the same pass and kept, keyed by filename, so that
+        # e.g. qaPlot does not need to read these files again.
+        #
+        # The metadata in the comment headers (scan start and end times and
+        # temperatures) are also parsed in that pass and kept, keyed by
+        # filename, in scan_metadata, which is persisted, so that the
+        # validators do not need the raw files.
+        self.housekeeping = dict()
+        self.scan_metadata = dict()
         # Test to see whether a single string or a list of two files has been
         # passed for infile
         if isinstance(self.infile, str):
-            filename = self.infile
+            filenames = [self.infile]
         else:
-            filename = self.infile[0]
- 
-        for line in open(filename):
-            if not line.startswith('#'):
-                tokens = line.split(',')
-                data['X'].append(float(tokens[0]))
-                data['Y'].append(float(tokens[1]))
-                data['Z'].append(float(tokens[2]))
+            filenames = list(self.infile)
+        scans = []
+        for filename in filenames:
+            scan, header = read_ts5_scan(filename,
+                                         columns='XYZ' + TS5_HOUSEKEEPING,
+                                         header=True)
+            self.housekeeping[filename] = dict((key, scan[key]) for key
+                                               in TS5_HOUSEKEEPING)
+            self.scan_metadata[filename] = header
+            scans.append(scan)
+        data = scans[0]
 
         # If a second file has been provided (for evaluating differential
-        # flatness) read it and subtract the z measurements, keeping
+        # flatness) subtract the z measurements, keeping
         # in mind that the grid points included may not be the same
         # in both files
-        data2 = dict([(key, []) for key in 'XYZ'])
-        if len(self.infile) == 2:
-            for line in open(self.infile[1]):
-                if not line.startswith('#'):
-                    tokens = line.split(',')
-                    data2['X'].append(float(tokens[0]))
-                    data2['Y'].append(float(tokens[1]))
-                    data2['Z'].append(float(tokens[2]))
-
-            # Convert to ndarrays so the where function can be used
-            x = np.array(data['X'])
-            y = np.array(data['Y'])
-            z = np.array(data['Z'])
-            x2 = np.array(data2['X'])
-            y2 = np.array(data2['Y'])
-            z2 = np.array(data2['Z'])
-
-            data3 = dict([(key, []) for key in 'XYZ'])
-            for i in np.arange(len(x)):
-                loc = np.where((x2 == x[i]) & (y2 == y[i]))[0]
-                if len(loc):
-                    data3['X'].append(x[i])
-                    data3['Y'].append(y[i])
-                    data3['Z'].append(z[i] - z2[loc[0]])
-
-            data = data3
+        if len(scans) == 2:
+            x2, y2, z2 = scans[1]['X'], scans[1]['Y'], scans[1]['Z']
+            index1, index2 = match_grid_points(data['X'], data['Y'], x2, y2,
+                                               tol=self.grid_tol)
+            self.match_stats = grid_match_stats(index1, index2,
+                                                len(data['X']), len(x2))
+            data = dict(X=data['X'][index1], Y=data['Y'][index1],
+                        Z=data['Z'][index1] - z2[index2])
 
         self.sensor = PointCloud(data['X'], data['Y'], data['Z'])
         # Convert z from mm to micron
         self.sensor.z *= 1e3
 
+    def gridded(self, step=None, tol=1e-4):
+        """
+        Return the sensor points as a ts5Utils.GriddedScan, i.e., a
+        masked image indexed by the commanded x, y grid, with z in
+        microns.  See GriddedScan.from_points for step and tol.
+        """
+        return GriddedScan.from_points(self.sensor.x, self.sensor.y,
+                                       self.sensor.z, step=step, tol=tol)
+
+    def gridded_plot(self, title=None, step=None, cmap=None):
+        "Image of the sensor heights on the commanded grid."
+        return _plots().gridded_plot(self, title=title, step=step, cmap=cmap)
+
+    def __getstate__(self):
+        # The housekeeping data are not needed by the validators, so
+        # omit them from the persisted object.
+        state = dict(self.__dict__)
+        state.pop('housekeeping', None)
+        return state
 
     def _xyz(self, line):
         # Unpack a line and convert z values from mm to microns.
@@ -459,17 +682,48 @@ class E2vData(MetrologyData):
 class MetrologyDataFactory(object):
     _prototypes = dict(OGP=OgpData, ITL=ItlData, e2v=E2vData, TS5=Ts5Data)
 
-    def __init__(self):
-        pass
+    def __init__(self, cache=None):
+        # Optional scanCache.ScanCache of parsed scan files.
+        self.cache = cache
 
-    def create(self, infile, dtype='OGP'):
+    def create(self, infile, dtype='OGP', cache=None, **kwds):
+        """
+        Create the MetrologyData object for infile and dtype.  If a
+        ScanCache is given, or has been set as the cache attribute of
+        the factory, the parsed object is loaded from it if possible,
+        and stored in it otherwise.
+        """
         try:
-            return self._prototypes[dtype](infile)
+            prototype = self._prototypes[dtype]
         except KeyError:
             raise RuntimeError("Unrecognized metrology data type: " + dtype)
-
-    def load(self, pickle_file):
-        "Unpersist a MetrologyData object from a pickle file."
-        return pickle.load(open(pickle_file))
+        if cache is None:
+            cache = self.cache
+        if cache is None:
+            return prototype(infile, **kwds)
+        key = cache.key(infile, dtype, **kwds)
+        state = cache.get(key)
+        if state is not None:
+            md = prototype.__new__(prototype)
+            md.__dict__.update(state)
+            return md
+        md = prototype(infile, **kwds)
+        cache.put(key, md.__dict__, infile)
+        return md
+
+    def load(self, pickle_file, mmap_mode=None):
+        """
+        Unpersist a MetrologyData object from a results file written by
+        persist or from a pickle file.  For results files, the arrays
+        are memory-mapped if mmap_mode is given, e.g., 'r' or 'c'.
+        """
+        if is_results_file(pickle_file):
+            return read_results(pickle_file, mmap_mode=mmap_mode)
+        with open(pickle_file, 'rb') as input_:
+            if sys.version_info[0] < 3:
+                return pickle.load(input_)
+            # Python 2 pickles of numpy arrays hold their data as str
+            # objects, which must be decoded as latin1.
+            return pickle.load(input_, encoding='latin1')
 
 md_factory = MetrologyDataFactory()
@@ -1,10 +1,26 @@
 import numpy as np
-import MetrologyData as metData
 from MetrologyData import md_factory, XyzPlane
+from persistUtils import write_summary
+from plotStage import render_plots
 
 def absoluteHeightTask(sensor_id, infile, dtype='OGP', zoffset=0,
-                       pickle_file=None):
+                       pickle_file=None, summary_file=None, processes=None,
+                       make_plots=True, binary_residuals=False):
     sensorData = md_factory.create(infile, dtype=dtype)
+    absolute_height_analysis(sensorData, sensor_id, dtype=dtype,
+                             zoffset=zoffset, pickle_file=pickle_file,
+                             summary_file=summary_file, processes=processes,
+                             make_plots=make_plots,
+                             binary_residuals=binary_residuals)
+
+def absolute_height_analysis(sensorData, sensor_id, dtype='OGP', zoffset=0,
+                             pickle_file=None, summary_file=None,
+                             processes=None, make_plots=True,
+                             binary_residuals=False):
+    """
+    Absolute height analysis of a parsed scan, writing the products of
+    absoluteHeightTask.
+    """
     if dtype == 'OGP':
         #
         # Fit and set the reference plane to the gauge blocks.
@@ -24,29 +40,38 @@ def absoluteHeightTask(sensor_id, infile, dtype='OGP', zoffset=0,
     #
     outfile = '%s_abs_height_residuals.txt' % sensor_id
     sensorData.write_residuals(outfile)
-    #
-    # Make a histogram of residual heights.
-    #
-    sensorData.plot_statistics(title='Sensor Absolute Height, %s' % infile)
-    metData.plot.save('%s_abs_height_hist.png' % sensor_id)
-    #
-    # Box and whisker plot of residual heights
-    #
-    sensorData.resids_boxplot()
-    metData.plot.save('%s_abs_height_boxplot.png' % sensor_id)
+    if binary_residuals:
+        sensorData.write_residuals('%s_abs_height_residuals.npz' % sensor_id,
+                                   binary=True)
     #
     # Quantile table
     #
     sensorData.quantile_table(outfile='%s_abs_height_quantile_table.txt'
                               % sensor_id)
-    #
-    # Surface plots
-    #
-    azims = (10, 45)
-    for azim in azims:
-        sensorData.absolute_height_plot(azim=azim)
-        metData.plot.save('%s_abs_height_point_cloud_azim_%i.png'
-                          % (sensor_id, azim))
 
     if pickle_file is not None:
         sensorData.persist(pickle_file)
+
+    if summary_file is not None:
+        write_summary(sensorData, summary_file)
+    #
+    # In numbers-only mode, stop here without importing any plotting
+    # code.
+    #
+    if not make_plots:
+        return
+    #
+    # Plots: histogram and box and whisker plot of residual heights and
+    # surface plots.
+    #
+    plots = [('plot_statistics',
+              dict(title='Sensor Absolute Height, %s' % sensorData.infile),
+              '%s_abs_height_hist.png' % sensor_id),
+             ('resids_boxplot', dict(),
+              '%s_abs_height_boxplot.png' % sensor_id)]
+    azims = (10, 45)
+    plots.append(('absolute_height_plot_views',
+                  dict(views=[(10, azim) for azim in azims]),
+                  ['%s_abs_height_point_cloud_azim_%i.png' % (sensor_id, azim)
+                   for azim in azims]))
+    render_plots(sensorData, plots, processes=processes)
@@ -0,0 +1,35 @@
+from MetrologyData import md_factory
+from flatnessTask import flatness_analysis
+from absoluteHeightTask import absolute_height_analysis
+
+def flatnessAbsHeightTask(sensor_id, infile, dtype='OGP', zoffset=0,
+                          flatness_pickle_file=None,
+                          flatness_summary_file=None,
+                          abs_height_pickle_file=None,
+                          abs_height_summary_file=None,
+                          processes=None, make_plots=True,
+                          binary_residuals=False):
+    """
+    Run the flatness and absolute height analyses of flatnessTask and
+    absoluteHeightTask for a single scan, which is parsed only once.
+    The products are the same as those of the two tasks.  Returns the
+    MetrologyData objects of the flatness and absolute height analyses.
+    """
+    sensorData = md_factory.create(infile, dtype=dtype)
+    #
+    # The absolute height analysis uses its own copy of the PointClouds,
+    # without the results of the sensor plane fit.
+    #
+    absHeightData = sensorData.analysis_copy()
+    flatness_analysis(sensorData, sensor_id,
+                      pickle_file=flatness_pickle_file,
+                      summary_file=flatness_summary_file,
+                      processes=processes, make_plots=make_plots,
+                      binary_residuals=binary_residuals)
+    absolute_height_analysis(absHeightData, sensor_id, dtype=dtype,
+                             zoffset=zoffset,
+                             pickle_file=abs_height_pickle_file,
+                             summary_file=abs_height_summary_file,
+                             processes=processes, make_plots=make_plots,
+                             binary_residuals=binary_residuals)
+    return sensorData, absHeightData
@@ -1,41 +1,90 @@
-import MetrologyData as metData
 from MetrologyData import md_factory
+from persistUtils import write_summary
+from plotStage import render_plots
+from streamingFlatness import streaming_flatness
 
-def flatnessTask(sensor_id, infile, dtype='OGP', pickle_file=None):
+def flatnessTask(sensor_id, infile, dtype='OGP', pickle_file=None,
+                 summary_file=None, processes=None, make_plots=True,
+                 binary_residuals=False, streaming=False, threads=None):
+    if streaming:
+        return flatness_streaming(sensor_id, infile, dtype=dtype,
+                                  summary_file=summary_file)
     sensorData = md_factory.create(infile, dtype=dtype)
+    flatness_analysis(sensorData, sensor_id, pickle_file=pickle_file,
+                      summary_file=summary_file, processes=processes,
+                      make_plots=make_plots,
+                      binary_residuals=binary_residuals, threads=threads)
+
+def flatness_analysis(sensorData, sensor_id, pickle_file=None,
+                      summary_file=None, processes=None, make_plots=True,
+                      binary_residuals=False, threads=None):
+    """
+    Flatness analysis of a parsed scan, writing the products of
+    flatnessTask.  If threads is given, the plane fit, residuals and
+    histogram are evaluated in chunks by a pool of that many threads.
+    """
     #
     # Fit and set the reference plane to the LSF to the sensor surface
     # points.
     #
-    sensorData.set_ref_plane(sensorData.sensor.xyzPlane_fit(), zoffset=0)
+    sensorData.set_ref_plane(sensorData.sensor.xyzPlane_fit(threads=threads),
+                             zoffset=0, threads=threads)
     #
     # Write residual points relative to LSF surface.
     #
     outfile = '%s_flatness_residuals.txt' % sensor_id
     sensorData.write_residuals(outfile)
-    #
-    # Make a histogram of residual heights.
-    #
-    sensorData.plot_statistics(title='Flatness, %s' % sensor_id)
-    metData.plot.save('%s_flatness_hist.png' % sensor_id)
-    #
-    # Box and whisker plot of residual heights
-    #
-    sensorData.resids_boxplot(title='Residuals Box Plot, %s' % sensor_id)
-    metData.plot.save('%s_flatness_boxplot.png' % sensor_id)
+    if binary_residuals:
+        sensorData.write_residuals('%s_flatness_residuals.npz' % sensor_id,
+                                   binary=True)
     #
     # Quantile table
     #
     sensorData.quantile_table(outfile='%s_flatness_quantile_table.txt'
                               % sensor_id)
+
+    if pickle_file is not None:
+        sensorData.persist(pickle_file)
+
+    if summary_file is not None:
+        write_summary(sensorData, summary_file)
+    #
+    # In numbers-only mode, stop here without importing any plotting
+    # code.
     #
-    # Surface plots
+    if not make_plots:
+        return
     #
+    # Plots: histogram and box and whisker plot of residual heights and
+    # surface plots.
+    #
+    plots = [('plot_statistics', dict(title='Flatness, %s' % sensor_id,
+                                      threads=threads),
+              '%s_flatness_hist.png' % sensor_id),
+             ('resids_boxplot',
+              dict(title='Residuals Box Plot, %s' % sensor_id),
+              '%s_flatness_boxplot.png' % sensor_id)]
     azims = (10, 45)
-    for azim in azims:
-        sensorData.flatness_plot(azim=azim, title='Surface Plot, %s' % sensor_id)
-        metData.plot.save('%s_flatness_point_cloud_azim_%i.png'
-                          % (sensor_id, azim))
+    plots.append(('flatness_plot_views',
+                  dict(views=[(10, azim) for azim in azims],
+                       title='Surface Plot, %s' % sensor_id),
+                  ['%s_flatness_point_cloud_azim_%i.png' % (sensor_id, azim)
+                   for azim in azims]))
+    render_plots(sensorData, plots, processes=processes)
 
-    if pickle_file is not None:
-        sensorData.persist(pickle_file)
+def flatness_streaming(sensor_id, infile, dtype='TS5', summary_file=None,
+                       chunk_size=2**22):
+    """
+    Flatness analysis in constant memory, for scans too large to be
+    read at once, writing the residuals and quantile table products of
+    flatnessTask, and, optionally, the summary.  The quantiles are
+    evaluated from sketches (see streamingFlatness), and no results
+    file or plots are made, since these need all of the points.
+    """
+    summary = streaming_flatness(
+        infile, dtype=dtype, chunk_size=chunk_size,
+        residuals_file='%s_flatness_residuals.txt' % sensor_id,
+        quantile_file='%s_flatness_quantile_table.txt' % sensor_id)
+    if summary_file is not None:
+        write_summary(summary, summary_file)
+    return summary
@@ -1,21 +1,29 @@
 import numpy as np
-import MetrologyData as metData
 from MetrologyData import md_factory
+from persistUtils import write_summary
+from plotStage import render_plots
 
-def flatnessTask_delta(raft_id, infiles, dtype='OGP', pickle_file=None):
+def flatnessTask_delta(raft_id, infiles, dtype='OGP', pickle_file=None,
+                       grid_tol=None, summary_file=None, processes=None,
+                       make_plots=True, binary_residuals=False):
     # This is modified from flatnessTask to accept a list of two data files as
     # input, the two room-temperature scans for a TS5 run, and evaluate the
     # change in flatness between the two scans.
     
-    # This routine implicitly assumes that the scan grids are exactly
-    # the same for the different data sets.  It does keep track of
-    # which scan points are missing in the various data sets.
+    # The scan points are matched by their commanded grid positions,
+    # which are compared exactly or, if grid_tol is given, to within
+    # grid_tol of the coordinates of the first scan (see
+    # ts5Utils.match_grid_points).  The numbers of matched points and of
+    # points missing from either data set are reported.
 
     # From Peter:  "This step would take the files from the previous steps,
     # subtract them, and look at the difference residuals: histogram,
     # quantiles, plots."
 
-    raftDataDelta = md_factory.create(infiles, dtype=dtype)
+    raftDataDelta = md_factory.create(infiles, dtype=dtype, grid_tol=grid_tol)
+    print('Grid points matched: %(matched)i, only in first scan: '
+          '%(only_in_A)i, only in second scan: %(only_in_B)i'
+          % raftDataDelta.match_stats)
 
     # For positions that are in common in the scans evaluate the difference in z
     raftDataDelta.set_ref_plane(raftDataDelta.sensor.xyzPlane_fit(), zoffset=0)
@@ -25,29 +33,40 @@ def flatnessTask_delta(raft_id, infiles, dtype='OGP', pickle_file=None):
     #
     outfile = '%s_flatness_delta_residuals.txt' % raft_id
     raftDataDelta.write_residuals(outfile)
-    #
-    # Make a histogram of residual heights.
-    #
-    raftDataDelta.plot_statistics(title='Raft Flatness, %s' % raft_id)
-    metData.plot.save('%s_flatness_delta_hist.png' % raft_id)
-    #
-    # Box and whisker plot of residual heights
-    #
-    raftDataDelta.resids_boxplot(title='Residual Box Plot, %s' % raft_id)
-    metData.plot.save('%s_flatness_delta_boxplot.png' % raft_id)
+    if binary_residuals:
+        raftDataDelta.write_residuals('%s_flatness_delta_residuals.npz'
+                                      % raft_id, binary=True)
     #
     # Quantile table
     #
     raftDataDelta.quantile_table(outfile='%s_flatness_delta_quantile_table.txt'
                                  % raft_id)
+
+    if pickle_file is not None:
+        raftDataDelta.persist(pickle_file)
+
+    if summary_file is not None:
+        write_summary(raftDataDelta, summary_file)
+    #
+    # In numbers-only mode, stop here without importing any plotting
+    # code.
     #
-    # Surface plots
+    if not make_plots:
+        return raftDataDelta
     #
+    # Plots: histogram and box and whisker plot of residual heights and
+    # surface plots.
+    #
+    plots = [('plot_statistics', dict(title='Raft Flatness, %s' % raft_id),
+              '%s_flatness_delta_hist.png' % raft_id),
+             ('resids_boxplot', dict(title='Residual Box Plot, %s' % raft_id),
+              '%s_flatness_delta_boxplot.png' % raft_id)]
     azims = (10, 45)
-    for azim in azims:
-        raftDataDelta.flatness_plot(azim=azim, title='Surface Plot (Warm-Cold)')
-        metData.plot.save('%s_flatness_delta_point_cloud_azim_%i.png'
-                          % (raft_id, azim))
+    plots.append(('flatness_plot_views',
+                  dict(views=[(10, azim) for azim in azims],
+                       title='Surface Plot (Warm-Cold)'),
+                  ['%s_flatness_delta_point_cloud_azim_%i.png'
+                   % (raft_id, azim) for azim in azims]))
+    render_plots(raftDataDelta, plots, processes=processes)
 
-    if pickle_file is not None:
-        raftDataDelta.persist(pickle_file)
+    return raftDataDelta
@@ -0,0 +1,245 @@
+"""
+Plotting functions for MetrologyData objects.  These are imported
+lazily by the MetrologyData plotting methods so that the parsers,
+PointCloud, fitting and quantile code can be used without matplotlib,
+SciPy or lsst.eotest.
+"""
+import os
+
+# The following is needed so that matplotlib can write to .matplotlib
+os.environ['MPLCONFIGDIR'] = os.curdir
+import matplotlib
+# For batch-processing, use cairo backend to avoid needing an X11 connection.
+# (The Agg backend does not work with 3D plots in matplotlib 1.5.1. The cairo
+# backend uses vector fonts and does not render Greek letters or some other
+# LaTeX math formatting.)
+matplotlib.use('cairo')
+
+import numpy as np
+import scipy.stats
+from mpl_toolkits.mplot3d import Axes3D
+import lsst.eotest.sensor.pylab_plotter as plot
+from planeFit import clip_mask
+from parallelUtils import chunk_histogram
+
+def reference_grid(x, y, plane=None, npts=100):
+    """
+    Return the x, y, z arrays, of shape (npts, npts), of the wireframe
+    grid of a reference surface spanning the ranges of the x and y
+    values.  The z values are given by the plane functor, evaluated
+    for all of the grid nodes at once, or are zero if plane is None.
+    npts may also be a tuple of the numbers of grid points in x and y.
+    """
+    nx, ny = (npts, npts) if np.isscalar(npts) else npts
+    xx, yy = np.meshgrid(np.linspace(np.min(x), np.max(x), nx),
+                         np.linspace(np.min(y), np.max(y), ny),
+                         indexing='ij')
+    if plane is None:
+        zz = np.zeros_like(xx)
+    else:
+        positions = np.column_stack((xx.ravel(), yy.ravel()))
+        zz = plane(positions).reshape(xx.shape)
+    return xx, yy, zz
+
+def decimate(x, y, max_points, keep=None, seed=0):
+    """
+    Return the indices of a spatially stratified subset of at most
+    max_points of the points (x, y), plus all of the points with keep
+    True, in their original order.  The points are binned in a grid of
+    about max_points cells, and points are taken in turn from each
+    occupied cell, in random order within the cells, so that sparsely
+    sampled regions are retained.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    npts = len(x)
+    if keep is None:
+        keep = np.zeros(npts, dtype=bool)
+    if max_points is None or npts - np.count_nonzero(keep) <= max_points:
+        return np.arange(npts)
+    candidates = np.where(~keep)[0]
+    nbins = max(1, int(np.sqrt(max_points)))
+    cells = np.zeros(len(candidates), dtype=int)
+    for values in (x[candidates], y[candidates]):
+        edges = np.linspace(np.min(values), np.max(values), nbins + 1)
+        index = np.clip(np.searchsorted(edges, values, side='right') - 1,
+                        0, nbins - 1)
+        cells = cells*nbins + index
+    # Sort by cell, and randomly within each cell, then rank the points
+    # within their cells and take the points by rank.
+    rng = np.random.RandomState(seed)
+    order = np.lexsort((rng.random_sample(len(candidates)), cells))
+    cells = cells[order]
+    first = np.concatenate(([True], cells[1:] != cells[:-1]))
+    starts = np.maximum.accumulate(np.where(first, np.arange(len(cells)), 0))
+    rank = np.arange(len(cells)) - starts
+    selected = order[np.argsort(rank, kind='mergesort')[:max_points]]
+    return np.sort(np.concatenate((candidates[selected], np.where(keep)[0])))
+
+def _sensor_points(md, max_points, outlier_nsigma):
+    # Indices of the sensor points to plot.  Outliers, i.e., residuals
+    # more than outlier_nsigma filtered standard deviations from the
+    # filtered mean, are always plotted.
+    if max_points is None:
+        return np.arange(len(md.sensor.z))
+    outliers = ~clip_mask(md.resids, md.sensor.mean_filt,
+                          md.sensor.stdev_filt, outlier_nsigma)
+    return decimate(md.sensor.x, md.sensor.y, max_points, keep=outliers)
+
+def flatness_plot(md, elev=10, azim=30, title=None,
+                  sensor_color='r', ref_color='b', grid_size=100, stride=5,
+                  max_points=None, outlier_nsigma=3):
+    """
+    Plot the sensor residuals and the reference plane.  If max_points
+    is given, at most max_points sensor points are plotted, selected by
+    decimate, plus the outliers.
+    """
+    win = plot.Window()
+    ax = Axes3D(win.fig)
+
+    points = _sensor_points(md, max_points, outlier_nsigma)
+    x, y = md.sensor.x[points], md.sensor.y[points]
+    resids = md.resids[points]
+    ax.scatter(x, y, resids, c=sensor_color)
+
+    xx, yy, zz = reference_grid(md.sensor.x, md.sensor.y, npts=grid_size)
+    ax.plot_wireframe(xx, yy, zz, rstride=stride, cstride=stride)
+
+    index = np.where(resids > 0)
+    ax.scatter(x[index], y[index], resids[index], c=sensor_color)
+
+    plot.pylab.xlabel('x (mm)')
+    plot.pylab.ylabel('y (mm)')
+    ax.set_zlabel('z (micron)')
+    ax.view_init(elev=elev, azim=azim)
+    if title is None:
+        title = md.infile
+    ax.set_title(title)
+    return win, ax
+
+def absolute_height_plot(md, elev=10, azim=30, title=None,
+                         sensor_color='r', ref_color='b',
+                         refpoint_color='b', grid_size=100, stride=5,
+                         max_points=None, outlier_nsigma=3):
+    """
+    Plot the sensor and reference points and the reference plane.  If
+    max_points is given, at most max_points sensor points, plus the
+    outliers, and max_points reference points are plotted.
+    """
+    win = plot.Window()
+    ax = Axes3D(win.fig)
+    points = _sensor_points(md, max_points, outlier_nsigma)
+    x, y, z = md.sensor.xyz[points].transpose()
+    ax.scatter(x, y, z, c=sensor_color)
+    try:
+        refpoints = decimate(md.reference.x, md.reference.y, max_points)
+        ax.scatter(md.reference.x[refpoints], md.reference.y[refpoints],
+                   md.reference.z[refpoints], c=refpoint_color)
+        grid_y = md.reference.y
+    except AttributeError:
+        # Vendor data may not have data from the reference plane
+        # scans, so there are not reference points to plot.
+        #
+        # Use the sensor points to set the grid points in y.
+        grid_y = md.sensor.y
+
+    xx, yy, zz = reference_grid(md.sensor.x, grid_y, plane=md.plane_functor,
+                                npts=grid_size)
+    ax.plot_wireframe(xx, yy, zz, rstride=stride, cstride=stride)
+
+    index = np.where(md.resids[points] > 0)
+    ax.scatter(x[index], y[index], z[index], c=sensor_color)
+
+    plot.pylab.xlabel('x (mm)')
+    plot.pylab.ylabel('y (mm)')
+    ax.set_zlabel('z (micron)')
+    ax.view_init(elev=elev, azim=azim)
+    if title is None:
+        title = md.infile
+    ax.set_title(title)
+    return win, ax
+
+def save_views(ax, views, outfiles):
+    """
+    Save the 3D plot in the axes ax, as seen from each of the (elev,
+    azim) viewpoints in views, to the corresponding output file.  Only
+    the view angles are changed, so the plot is built once and just
+    rendered for each view.
+    """
+    if len(views) != len(outfiles):
+        raise RuntimeError("Unrecognized views: %i views for %i files"
+                           % (len(views), len(outfiles)))
+    for (elev, azim), outfile in zip(views, outfiles):
+        ax.view_init(elev=elev, azim=azim)
+        plot.save(outfile)
+
+def gridded_plot(md, title=None, step=None, cmap=None):
+    """
+    Image of the heights of a TS5 scan on its commanded grid, with the
+    grid positions that were not measured left blank.
+    """
+    grid = md.gridded(step=step)
+    win = plot.Window()
+    image = plot.pylab.imshow(grid.image, origin='lower', extent=grid.extent,
+                              interpolation='nearest', aspect='auto',
+                              cmap=cmap)
+    plot.pylab.colorbar(image, label='z (micron)')
+    plot.pylab.xlabel('x (mm)')
+    plot.pylab.ylabel('y (mm)')
+    if title is None:
+        title = md.infile
+    win.set_title(title)
+    return win
+
+def resids_boxplot(md, yrange=None, title=None):
+    win = plot.Window()
+    plot.pylab.boxplot(md.resids)
+    plot.pylab.ylabel('micron')
+    plot.setAxis(yrange=yrange)
+    if title is None:
+        title = md.infile
+    win.set_title(title)
+    return win
+
+def plot_statistics(md, nsigma=5, title=None, zoffset=0, bins=60,
+                    threads=None):
+    """
+    Plot summary statistics of z-value residuals relative to the
+    provided XyzPlane functor.  The sensor data are used if
+    plane_data is None.  If threads is given, the histogram is
+    accumulated over chunks of the residuals by a pool of that many
+    threads, and the binned counts are plotted.
+    """
+    if md.resids is None:
+        raise RuntimeError("Reference plane not set")
+    dz = md.resids_filt
+
+    xname, yname = r'z - $z_{\rm model}$ (micron)', 'entries/bin'
+    if threads is None:
+        win = plot.histogram(dz, xname=xname, yname=yname, bins=bins)
+        xmin, xmax = np.min(dz), np.max(dz)
+    else:
+        counts, edges = chunk_histogram(dz, bins, threads=threads)
+        win = plot.Window()
+        plot.pylab.hist(edges[:-1], bins=edges, weights=counts,
+                        histtype='step', color='k')
+        plot.pylab.xlabel(xname)
+        plot.pylab.ylabel(yname)
+        xmin, xmax = edges[0], edges[-1]
+    # Retrieve the plot limits to derive the width of the histogram bins
+    limits = plot.pylab.axis()
+    binsz = (limits[1] - limits[0])/bins
+
+    plot.pylab.annotate('mean=%.3f\nstdev=%.3f\n%i-sigma clip'
+                        % (md.sensor.mean_filt, md.sensor.stdev_filt,
+                           nsigma), (0.05, 0.8), xycoords='axes fraction')
+
+    # Overlay a Gaussian with the same sigma and correct normalization
+    x = np.linspace(xmin, xmax, 100)
+    gaussian = scipy.stats.norm(loc=md.sensor.mean_filt,
+                                scale=md.sensor.stdev_filt)
+    plot.pylab.plot(x, np.size(dz)*binsz*gaussian.pdf(x), color='b',
+                    linestyle='-')
+    if title is None:
+        title = md.infile
+    win.set_title(title)
+    return win
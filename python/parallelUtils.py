@@ -0,0 +1,75 @@
+"""
+Chunk-parallel evaluation of passes over large point clouds with a pool
+of threads.  The points are split into one contiguous chunk per thread,
+and a kernel is applied to each chunk.  NumPy releases the GIL in the
+array operations of the kernels, so the chunks are processed
+concurrently, and the threads share the arrays, which need not be
+copied or pickled as for a process pool.  The partial results are
+returned in chunk order, so combining them does not depend on the
+thread scheduling.
+
+Element-wise results, e.g., residuals and clipping masks, and integer
+counts are the same as for a single pass over all of the points.  Sums
+of floating point values, e.g., the normal-equation sums, are added in a
+different order, so they, and the fit parameters and moments derived
+from them, agree with the serial results to within rounding, e.g., to
+about 1e-12 relative for the centered plane fit of
+PointCloud.xyzPlane_fit.  Clipping masks derived from such results can
+differ for points within rounding of the clipping bounds.
+"""
+import os
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy as np
+
+__all__ = ['chunk_slices', 'chunk_map', 'chunk_histogram']
+
+# Thread pools, keyed by the process id and the number of threads,
+# reused across calls, e.g., for the iterations of a clipped fit.  A
+# forked process, e.g., a plotStage worker, inherits the pools of its
+# parent but not their threads, so it creates its own.
+_pools = dict()
+
+def chunk_slices(npts, nchunks):
+    "Slices splitting range(npts) into nchunks nearly equal chunks."
+    bounds = [npts*i//nchunks for i in range(nchunks + 1)]
+    return [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+def chunk_map(func, npts, threads=None, min_chunk=2**16):
+    """
+    Apply func to slices covering range(npts) and return the list of
+    results in order.  If threads is None or 1, func is applied once,
+    to slice(0, npts), in this thread, so that the serial results are
+    unchanged.  Otherwise, the points are split into one chunk per
+    thread, or fewer so that chunks have at least min_chunk points, and
+    the chunks are processed by a pool of that many threads, or of one
+    per CPU if threads is 0.
+    """
+    if threads == 0:
+        threads = multiprocessing.cpu_count()
+    nchunks = min(threads or 1, max(npts//min_chunk, 1))
+    if nchunks <= 1:
+        return [func(slice(0, npts))]
+    key = (os.getpid(), threads)
+    if key not in _pools:
+        _pools[key] = ThreadPool(threads)
+    return _pools[key].map(func, chunk_slices(npts, nchunks), chunksize=1)
+
+def chunk_histogram(values, bins, threads=None):
+    """
+    Return the counts and bin edges of the histogram of values in bins
+    equal bins spanning their range, as numpy.histogram(values, bins),
+    with the range and counts accumulated over chunks of the values.
+    """
+    values = np.asarray(values).ravel()
+    if len(values) == 0:
+        return np.histogram(values, bins)
+    extrema = chunk_map(lambda chunk: (values[chunk].min(),
+                                       values[chunk].max()),
+                        len(values), threads)
+    value_range = (min(item[0] for item in extrema),
+                   max(item[1] for item in extrema))
+    edges = np.histogram_bin_edges(values[:0], bins, range=value_range)
+    counts = chunk_map(lambda chunk: np.histogram(values[chunk], edges)[0],
+                       len(values), threads)
+    return np.sum(counts, axis=0), edges
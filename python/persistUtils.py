@@ -0,0 +1,289 @@
+"""
+Array-based persistence of MetrologyData objects.
+
+The results file is an uncompressed npz (zip) archive.  Each array of
+the object is stored as a .npy member in its native dtype, so it can be
+memory-mapped directly from the archive, and the 'header' member holds
+a small json document with the format version, the scalar summary of
+the analysis (quantiles, quantiles_filt, pars, mean_filt, stdev_filt)
+and a description of how to reassemble the object from the arrays.
+
+The same summary can also be written to a small json file, and
+load_summary reads it from either, e.g., for the validators, which only
+need the quantiles.
+
+The residuals of the reference plane can also be written as a
+compressed npz file, as an alternative to the text residuals file.
+"""
+import json
+import struct
+import zipfile
+import importlib
+import numpy as np
+
+__all__ = ['write_results', 'read_results', 'read_header', 'is_results_file',
+           'summarize', 'write_summary', 'load_summary', 'MetrologySummary',
+           'encode_state', 'decode_state', 'write_binary_residuals',
+           'read_binary_residuals', 'format_residuals',
+           'RESULTS_FORMAT_VERSION']
+
+# Version of the results file layout.  Readers refuse files written
+# with a later version.
+RESULTS_FORMAT_VERSION = 1
+
+_header_member = 'header'
+
+def encode_state(value, arrays, name='state'):
+    """
+    Encode a value, e.g., the __dict__ of a MetrologyData object, as a
+    json-serializable description.  numpy arrays are replaced by
+    references to entries, named after their location in the value,
+    that are added to the arrays dict.  Objects other than dicts,
+    lists and scalars, e.g., PointClouds, are encoded by class and
+    state, as given by __getstate__, if defined, or the attribute dict.
+    """
+    if isinstance(value, np.ndarray):
+        arrays[name] = value
+        return dict(array=name)
+    if isinstance(value, np.generic):
+        return dict(value=value.item())
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return dict(value=value)
+    if isinstance(value, (list, tuple)) and all(
+            item is None or isinstance(item, (bool, int, float, str))
+            for item in value):
+        return dict(value=[_item(item) for item in value],
+                    tuple=isinstance(value, tuple))
+    if isinstance(value, dict):
+        keys = sorted(value.keys())
+        return dict(keys=keys,
+                    items=[encode_state(value[key], arrays,
+                                        '%s.%i' % (name, i))
+                           for i, key in enumerate(keys)])
+    if hasattr(value, '__dict__'):
+        cls = type(value)
+        state = None
+        if hasattr(value, '__getstate__'):
+            state = value.__getstate__()
+        if state is None:
+            state = value.__dict__
+        return dict(module=cls.__module__, cls=cls.__name__,
+                    state=encode_state(state, arrays, name))
+    raise RuntimeError("Unrecognized value type for encoding: %s"
+                       % type(value))
+
+def decode_state(description, arrays):
+    """
+    Reassemble a value from the output of encode_state, with arrays
+    mapping the array names to the arrays, e.g., a dict or an NpzFile.
+    """
+    if 'array' in description:
+        return arrays[description['array']]
+    if 'value' in description:
+        value = description['value']
+        if description.get('tuple'):
+            value = tuple(value)
+        return _str(value)
+    if 'keys' in description:
+        return dict((_str(key), decode_state(item, arrays)) for key, item
+                    in zip(description['keys'], description['items']))
+    cls = getattr(importlib.import_module(description['module']),
+                  description['cls'])
+    value = cls.__new__(cls)
+    state = decode_state(description['state'], arrays)
+    if hasattr(value, '__setstate__'):
+        value.__setstate__(state)
+    else:
+        value.__dict__.update(state)
+    return value
+
+def _item(value):
+    # numpy scalars, e.g., fit parameters, as Python scalars.
+    return value.item() if isinstance(value, np.generic) else value
+
+def _str(value):
+    # json returns unicode strings under Python 2.
+    if isinstance(value, dict):
+        return dict((_str(key), _str(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [_str(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_str(item) for item in value)
+    if not isinstance(value, str) and type(value).__name__ == 'unicode':
+        return str(value)
+    return value
+
+def summarize(md):
+    """
+    Scalar summary of a MetrologyData object: the quantiles, the
+    parameters and filtered residual statistics of the reference plane,
+    the median height of the sensor points, the input file(s) and, for
+    TS5 scans, the scan metadata from the file headers.
+    """
+    summary = dict(infile=md.infile)
+    for attr in ('quantiles', 'quantiles_filt'):
+        values = getattr(md, attr, None)
+        if values is not None:
+            summary[attr] = dict((key, float(value))
+                                 for key, value in values.items())
+    plane = getattr(md, 'plane_functor', None)
+    if plane is not None:
+        summary['pars'] = [float(par) for par in plane.pars]
+    sensor = getattr(md, 'sensor', None)
+    for attr in ('mean_filt', 'stdev_filt'):
+        value = getattr(sensor, attr, None)
+        if value is not None:
+            summary[attr] = float(value)
+    if sensor is not None and len(sensor.z) > 0:
+        summary['npts'] = len(sensor.z)
+        summary['z_median'] = float(np.median(sensor.z))
+    scan_metadata = getattr(md, 'scan_metadata', None)
+    if scan_metadata is not None:
+        summary['scan_metadata'] = scan_metadata
+    return summary
+
+class MetrologySummary(object):
+    """
+    Scalar results of a metrology analysis, as read by load_summary.
+    The entries of the summary are available as attributes, which are
+    None if they were not evaluated, e.g., quantiles_filt if
+    quantile_table was not called.
+    """
+    _attributes = ('infile', 'quantiles', 'quantiles_filt', 'pars',
+                   'mean_filt', 'stdev_filt', 'npts', 'z_median',
+                   'scan_metadata')
+
+    def __init__(self, summary):
+        for attr in self._attributes:
+            setattr(self, attr, None)
+        self.__dict__.update(summary)
+
+def write_summary(md, outfile):
+    """
+    Write the scalar summary of a MetrologyData object, or a
+    MetrologySummary, e.g., from streamingFlatness, to a json file.
+    """
+    if isinstance(md, MetrologySummary):
+        summary = dict(md.__dict__)
+    else:
+        summary = summarize(md)
+    with open(outfile, 'w') as output:
+        json.dump(summary, output, indent=2, sort_keys=True)
+
+def load_summary(infile):
+    """
+    Read the summary written by write_summary, or the summary in the
+    header of a results file, as a MetrologySummary object.  This needs
+    neither the MetrologyData module nor any plotting code.
+    """
+    if is_results_file(infile):
+        summary = read_header(infile)['summary']
+    else:
+        with open(infile) as input_:
+            summary = json.load(input_)
+    return MetrologySummary(_str(summary))
+
+def write_results(md, outfile):
+    "Write a MetrologyData object to outfile in the results format."
+    arrays = dict()
+    header = dict(format_version=RESULTS_FORMAT_VERSION,
+                  summary=summarize(md), state=encode_state(md, arrays))
+    members = dict(('a%i' % i, np.ascontiguousarray(arrays[name]))
+                   for i, name in enumerate(sorted(arrays)))
+    header['arrays'] = dict(('a%i' % i, name)
+                            for i, name in enumerate(sorted(arrays)))
+    members[_header_member] = np.frombuffer(json.dumps(header).encode(),
+                                            dtype=np.uint8)
+    # np.savez appends .npz to file names without it, so write to an
+    # open file instead.
+    with open(outfile, 'wb') as output:
+        np.savez(output, **members)
+
+def is_results_file(infile):
+    "Return True if infile is a results file, i.e., a zip archive."
+    with open(infile, 'rb') as input_:
+        return input_.read(4) == b'PK\x03\x04'
+
+def read_header(infile):
+    "Read the json header of a results file."
+    with zipfile.ZipFile(infile) as archive:
+        header = json.loads(np.lib.format.read_array(
+            archive.open(_header_member + '.npy')).tobytes().decode())
+    if header.get('format_version', 0) > RESULTS_FORMAT_VERSION:
+        raise RuntimeError("Unrecognized results format version: %s"
+                           % header.get('format_version'))
+    return header
+
+def read_results(infile, mmap_mode=None):
+    """
+    Read a MetrologyData object from a results file.  If mmap_mode is
+    given, e.g., 'r' or 'c', the arrays are memory-mapped from the file.
+    """
+    header = read_header(infile)
+    arrays = dict()
+    with zipfile.ZipFile(infile) as archive, open(infile, 'rb') as input_:
+        for member, name in header['arrays'].items():
+            info = archive.getinfo(member + '.npy')
+            if (mmap_mode is not None
+                    and info.compress_type == zipfile.ZIP_STORED):
+                arrays[name] = _mmap_member(infile, input_, info, mmap_mode)
+            else:
+                arrays[name] = np.lib.format.read_array(archive.open(info))
+    return decode_state(header['state'], arrays)
+
+def _mmap_member(infile, input_, info, mmap_mode):
+    """
+    Memory-map the array in an uncompressed .npy member of a zip archive.
+    """
+    # The member data follow the 30 byte local file header, the file
+    # name and the extra field.
+    input_.seek(info.header_offset + 26)
+    name_length, extra_length = struct.unpack('<HH', input_.read(4))
+    start = info.header_offset + 30 + name_length + extra_length
+    input_.seek(start)
+    if np.lib.format.read_magic(input_) == (1, 0):
+        read_array_header = np.lib.format.read_array_header_1_0
+    else:
+        read_array_header = np.lib.format.read_array_header_2_0
+    shape, fortran_order, dtype = read_array_header(input_)
+    if dtype.hasobject or np.prod(shape) == 0:
+        input_.seek(start)
+        return np.lib.format.read_array(input_)
+    return np.memmap(infile, dtype=dtype, mode=mmap_mode, shape=shape,
+                     order='F' if fortran_order else 'C',
+                     offset=input_.tell()).view(np.ndarray)
+
+def format_residuals(x, y, resids):
+    """
+    Text of the rows of the residuals file written by
+    MetrologyData.write_residuals for the x, y positions and residuals,
+    formatted with a single string operation.
+    """
+    values = np.empty((len(resids), 3))
+    values[:, 0], values[:, 1], values[:, 2] = x, y, resids
+    return (('%.6f  %.6f  %.6f mm\n'*len(values))
+            % tuple(values.ravel().tolist()))
+
+def write_binary_residuals(outfile, positions, resids, contour_id=1):
+    """
+    Write the x, y positions and residuals as the 'x', 'y' and 'resids'
+    float64 members of a compressed npz file, which can be read with
+    read_binary_residuals or numpy.load.
+    """
+    positions = np.asarray(positions)
+    with open(outfile, 'wb') as output:
+        np.savez_compressed(output, x=positions[:, 0], y=positions[:, 1],
+                            resids=np.asarray(resids, dtype=float),
+                            contour_id=np.array(contour_id),
+                            format_version=np.array(RESULTS_FORMAT_VERSION))
+
+def read_binary_residuals(infile):
+    """
+    Read a file written by write_binary_residuals, returning the x, y
+    and residual arrays.
+    """
+    with np.load(infile) as data:
+        if int(data['format_version']) > RESULTS_FORMAT_VERSION:
+            raise RuntimeError("Unrecognized residuals format version: %s"
+                               % int(data['format_version']))
+        return data['x'], data['y'], data['resids']
@@ -0,0 +1,284 @@
+"""
+Sigma-clipped linear least-squares fitting using running sums of the
+normal equations.
+"""
+import numpy as np
+from parallelUtils import chunk_map
+
+def clip_mask(dz, mean, stdev, nsigma):
+    "Mask of the residuals within nsigma*stdev of the mean."
+    return (dz > mean - nsigma*stdev) & (dz < mean + nsigma*stdev)
+
+class NormalEquations(object):
+    """
+    Running sums for the least-squares fit of the model z = design.pars
+    to a subset of points, and for the mean and standard deviation of
+    the residuals z - design.pars of that subset.  Points are added to
+    or removed from the subset by updating the sums.  The design matrix
+    may have no columns, in which case only the moments of z are
+    accumulated.
+    """
+    def __init__(self, design, z):
+        self.design = design
+        self.z = z
+        ncols = design.shape[1]
+        self.npts = 0
+        self.ata = np.zeros((ncols, ncols))
+        self.atz = np.zeros(ncols)
+        self.asum = np.zeros(ncols)
+        self.zsum = 0.
+        self.zz = 0.
+
+    def update(self, index, sign=1, threads=None):
+        """
+        Add (sign=1) or remove (sign=-1) the points selected by index, a
+        boolean mask.  If threads is given, the sums for chunks of the
+        points are evaluated in parallel (see parallelUtils.chunk_map).
+        """
+        def sums(chunk):
+            design = self.design[chunk][index[chunk]]
+            z = self.z[chunk][index[chunk]]
+            return (len(z), design.T.dot(design), design.T.dot(z),
+                    design.sum(axis=0), z.sum(), z.dot(z))
+        for npts, ata, atz, asum, zsum, zz in chunk_map(sums, len(self.z),
+                                                        threads):
+            self.npts += sign*npts
+            self.ata += sign*ata
+            self.atz += sign*atz
+            self.asum += sign*asum
+            self.zsum += sign*zsum
+            self.zz += sign*zz
+
+    def solve(self):
+        """
+        Least-squares parameters for the current subset.  If the normal
+        equations are singular, e.g., for collinear points, the
+        minimum-norm solution is returned.
+        """
+        if self.ata.shape[0] == 0:
+            return np.zeros(0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if np.linalg.cond(self.ata) < 1e12:
+                return np.linalg.solve(self.ata, self.atz)
+        return np.linalg.lstsq(self.ata, self.atz, rcond=None)[0]
+
+    def moments(self, pars):
+        """
+        Mean and standard deviation of the residuals z - design.pars
+        of the current subset.
+        """
+        mean = (self.zsum - pars.dot(self.asum))/self.npts
+        sum_sq = self.zz - 2*pars.dot(self.atz) + pars.dot(self.ata).dot(pars)
+        return mean, np.sqrt(max(sum_sq/self.npts - mean**2, 0))
+
+def _clip_mask(design, z, pars, mean, stdev, nsigma, threads):
+    # clip_mask of the residuals z - design.pars, evaluated in chunks.
+    mask = np.empty(len(z), dtype=bool)
+    def kernel(chunk):
+        mask[chunk] = clip_mask(z[chunk] - design[chunk].dot(pars), mean,
+                                stdev, nsigma)
+    chunk_map(kernel, len(z), threads)
+    return mask
+
+def sigma_clip_fit(design, z, nsigma=4, tol=0, max_iter=100, threads=None):
+    """
+    Fit the model z = design.pars by linear least squares, iteratively
+    refitting to the points with residuals, z - design.pars, within
+    nsigma standard deviations of the mean.  Between iterations, only
+    the points that enter or leave the fitted subset are added to or
+    removed from the normal equations.
+
+    Iteration stops when the subset no longer changes, when the
+    standard deviation of the residuals changes by no more than
+    tol times its value, or after max_iter iterations.
+
+    If threads is given, the residuals, clipping masks and sums are
+    evaluated for chunks of the points in parallel (see
+    parallelUtils.chunk_map).  The parameters and moments agree with
+    those of the serial fit to within rounding, and so do the masks,
+    except possibly for points within rounding of the clipping bounds.
+
+    Return the fit parameters, the mean and standard deviation of the
+    residuals of the fitted points, the mask of the fitted points, and
+    the number of iterations after the initial fit to all of the points.
+    """
+    eqs = NormalEquations(design, z)
+    mask = np.ones(len(z), dtype=bool)
+    eqs.update(mask, threads=threads)
+    pars = eqs.solve()
+    mean, stdev = eqs.moments(pars)
+    niter = 0
+    while niter < max_iter:
+        new_mask = _clip_mask(design, z, pars, mean, stdev, nsigma, threads)
+        changed = new_mask != mask
+        nchanged = np.count_nonzero(changed)
+        if nchanged == 0:
+            break
+        if nchanged < np.count_nonzero(new_mask):
+            eqs.update(changed & new_mask, threads=threads)
+            eqs.update(changed & mask, sign=-1, threads=threads)
+        else:
+            # It is cheaper (and more accurate) to start over.
+            eqs = NormalEquations(design, z)
+            eqs.update(new_mask, threads=threads)
+        mask = new_mask
+        stdev_last = stdev
+        pars = eqs.solve()
+        mean, stdev = eqs.moments(pars)
+        niter += 1
+        if abs(stdev - stdev_last) <= tol*stdev:
+            break
+    return pars, mean, stdev, mask, niter
+
+def _segment_sums(labels, nseg, u, v, w, weights=None):
+    """
+    Per-segment sums of the products of the centered coordinates needed
+    for the plane-fit normal equations and the residual moments.
+    """
+    def bincount(values):
+        if weights is not None:
+            values = values*weights
+        return np.bincount(labels, weights=values, minlength=nseg)
+    ones = np.ones(len(u))
+    return dict(n=bincount(ones), u=bincount(u), v=bincount(v),
+                w=bincount(w), uu=bincount(u*u), uv=bincount(u*v),
+                vv=bincount(v*v), uw=bincount(u*w), vw=bincount(v*w),
+                ww=bincount(w*w))
+
+def _segment_solve(sums):
+    """
+    Solve the normal equations for all segments at once, returning the
+    plane parameters (nseg, 3) for the centered coordinates and the mean
+    and standard deviation of the residuals.  Segments with fewer than
+    three points, or with singular normal equations, e.g., for collinear
+    points, get nan values.
+    """
+    ata = np.array([[sums['uu'], sums['uv'], sums['u']],
+                    [sums['uv'], sums['vv'], sums['v']],
+                    [sums['u'], sums['v'], sums['n']]]).transpose(2, 0, 1)
+    atz = np.array([sums['uw'], sums['vw'], sums['w']]).transpose()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ok = (sums['n'] >= 3) & (np.linalg.cond(ata) < 1e12)
+    ata[~ok] = np.identity(3)
+    pars = np.linalg.solve(ata, atz[:, :, np.newaxis])[:, :, 0]
+    pars[~ok] = np.nan
+    npts = np.where(ok, sums['n'], 1)
+    mean = (sums['w'] - pars[:, 0]*sums['u'] - pars[:, 1]*sums['v']
+            - pars[:, 2]*sums['n'])/npts
+    sum_sq = (sums['ww'] - 2*np.sum(pars*atz, axis=1)
+              + np.einsum('ij,ijk,ik->i', pars, ata, pars))
+    stdev = np.sqrt(np.maximum(sum_sq/npts - mean**2, 0))
+    return pars, mean, stdev
+
+def segmented_plane_fit(x, y, z, labels, nsigma=4, tol=0, max_iter=100):
+    """
+    Fit planes z = a*x + b*y + c independently to each segment of points
+    sharing the same label, with the same iterative nsigma clipping and
+    stopping conditions as sigma_clip_fit, but for all segments in the
+    same array operations.
+
+    Return the distinct labels, the plane parameters (a, b, c) for each
+    label as an (nseg, 3) array, the mean and standard deviation of the
+    residuals, z - model, of the fitted points of each segment, the mask
+    of the fitted points, and the number of iterations for each segment.
+    """
+    x, y, z = [np.asarray(values, dtype=float) for values in (x, y, z)]
+    labels = np.asarray(labels)
+    if labels.dtype.kind in 'iu' and len(labels) and labels.min() >= 0:
+        # Map non-negative integer labels to segment indices without
+        # sorting.
+        present = np.bincount(labels) > 0
+        segments = np.where(present)[0]
+        labels = (np.cumsum(present) - 1)[labels]
+    else:
+        segments, labels = np.unique(labels, return_inverse=True)
+        labels = labels.ravel()
+    nseg = len(segments)
+
+    # Center the coordinates of each segment on its centroid.
+    counts = np.bincount(labels, minlength=nseg)
+    centroid = [np.bincount(labels, weights=values, minlength=nseg)/counts
+                for values in (x, y, z)]
+    u, v, w = [values - center[labels]
+               for values, center in zip((x, y, z), centroid)]
+
+    mask = np.ones(len(z), dtype=bool)
+    sums = _segment_sums(labels, nseg, u, v, w)
+    pars, mean, stdev = _segment_solve(sums)
+    niter = np.zeros(nseg, dtype=int)
+    active = np.isfinite(pars[:, 0])
+    while np.any(active):
+        # Update the masks of the segments that have not converged.
+        index = np.where(active[labels])[0]
+        seg = labels[index]
+        dz = w[index] - (pars[seg, 0]*u[index] + pars[seg, 1]*v[index]
+                         + pars[seg, 2])
+        new_mask = mask.copy()
+        new_mask[index] = clip_mask(dz, mean[seg], stdev[seg], nsigma)
+        changed = new_mask != mask
+        nchanged = np.bincount(labels[changed], minlength=nseg)
+        active &= nchanged > 0
+        if not np.any(active):
+            break
+        # Add the points that entered the fitted subsets and subtract
+        # those that left.
+        sign = np.where(new_mask[changed], 1., -1.)
+        delta = _segment_sums(labels[changed], nseg, u[changed], v[changed],
+                              w[changed], weights=sign)
+        for key in sums:
+            sums[key] += delta[key]
+        mask = new_mask
+        stdev_last = stdev
+        new_pars, new_mean, new_stdev = _segment_solve(sums)
+        pars = np.where(active[:, np.newaxis], new_pars, pars)
+        mean = np.where(active, new_mean, mean)
+        stdev = np.where(active, new_stdev, stdev)
+        niter += active
+        active[active] = ((np.abs(stdev[active] - stdev_last[active])
+                           > tol*stdev[active]) & (niter[active] < max_iter))
+
+    # Convert the parameters back to the uncentered coordinates.
+    x0, y0, z0 = centroid
+    pars[:, 2] += z0 - pars[:, 0]*x0 - pars[:, 1]*y0
+    return segments, pars, mean, stdev, mask, niter
+
+class PlaneSums(object):
+    """
+    Normal-equation sums for the fit of a plane z = a*x + b*y + c and
+    for the moments of its residuals, accumulated over chunks of points,
+    e.g., of a scan read in blocks, so that the points need not be held
+    in memory.  The coordinates are taken relative to a fixed center,
+    e.g., the mean of the first chunk, to preserve the precision of the
+    sums.
+    """
+    def __init__(self, center):
+        self.center = tuple(float(value) for value in center)
+        self.sums = None
+
+    def add(self, x, y, z):
+        "Add the points x, y, z to the sums and return this object."
+        u, v, w = [np.asarray(values, dtype=float) - center
+                   for values, center in zip((x, y, z), self.center)]
+        sums = _segment_sums(np.zeros(len(u), dtype=int), 1, u, v, w)
+        if self.sums is None:
+            self.sums = sums
+        else:
+            for key in sums:
+                self.sums[key] += sums[key]
+        return self
+
+    @property
+    def npts(self):
+        "The number of points added."
+        return 0 if self.sums is None else int(self.sums['n'][0])
+
+    def solve(self):
+        """
+        Return the plane parameters (a, b, c) and the mean and standard
+        deviation of the residuals, z - model, of the points added.
+        """
+        pars, mean, stdev = _segment_solve(self.sums)
+        pars = pars[0]
+        x0, y0, z0 = self.center
+        pars[2] += z0 - pars[0]*x0 - pars[1]*y0
+        return pars, mean[0], stdev[0]
@@ -0,0 +1,91 @@
+"""
+Plotting stage of the analysis tasks.  The plots of a MetrologyData
+object are rendered after its numerical products have been written,
+optionally in a pool of worker processes.  The object is passed to the
+workers as a temporary results file, which each worker memory-maps
+once, so that large scans are not pickled for every plot.
+"""
+from __future__ import print_function
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+import MetrologyData as metData
+from persistUtils import write_results
+
+__all__ = ['render_plots']
+
+# MetrologyData objects loaded by the current (worker) process, keyed
+# by results file.
+_loaded = dict()
+
+def _render_plot(md, method, kwds, outfile):
+    """
+    Make and save one plot and return (output file, elapsed time).  If
+    outfile is a list, e.g., for flatness_plot_views, it is passed to
+    the method as outfiles, and the method saves the plot(s).
+    """
+    tstart = time.time()
+    if isinstance(outfile, (list, tuple)):
+        getattr(md, method)(outfiles=outfile, **kwds)
+    else:
+        getattr(md, method)(**kwds)
+        metData.plot.save(outfile)
+    metData.plot.pylab.close('all')
+    return outfile, time.time() - tstart
+
+def _render(args):
+    """
+    Worker function: render one plot given (results file, method name,
+    keyword arguments, output file).
+    """
+    results_file, method, kwds, outfile = args
+    tstart = time.time()
+    if results_file not in _loaded:
+        _loaded.clear()
+        _loaded[results_file] = metData.md_factory.load(results_file,
+                                                        mmap_mode='r')
+    outfile, _ = _render_plot(_loaded[results_file], method, kwds, outfile)
+    return outfile, time.time() - tstart
+
+def render_plots(md, plots, processes=None, verbose=True):
+    """
+    Render plots of the MetrologyData object md.  plots is a list of
+    (method name, keyword arguments, output file), e.g.,
+    ('plot_statistics', dict(title='Flatness'), 'flatness_hist.png'),
+    or, for the methods saving several views of a 3D plot, (method
+    name, keyword arguments, list of output files).
+
+    By default, or if processes is 0 or 1, the plots are made in this
+    process.  Otherwise they are made by a pool of that many worker
+    processes, up to the number of plots.  Each worker imports the
+    plotting code, with its non-interactive backend, itself, and the
+    time to load the object is included in the time of its first plot.
+    Returns the list of (output file, elapsed time), which is also
+    printed if verbose is True.
+    """
+    processes = min(processes or 1, len(plots))
+    if processes <= 1:
+        timings = [_render_plot(md, *item) for item in plots]
+    else:
+        tmpdir = tempfile.mkdtemp()
+        results_file = os.path.join(tmpdir, 'plot_stage.npz')
+        try:
+            write_results(md, results_file)
+            args = [(results_file, method, kwds, outfile)
+                    for method, kwds, outfile in plots]
+            pool = multiprocessing.Pool(processes)
+            try:
+                timings = pool.map(_render, args, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            shutil.rmtree(tmpdir)
+    if verbose:
+        for outfile, dt in timings:
+            if isinstance(outfile, (list, tuple)):
+                outfile = ', '.join(outfile)
+            print('%s: %.2f s' % (outfile, dt))
+    return timings
@@ -14,8 +14,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import datetime
+from ts5Utils import read_ts5_scan, TS5_HOUSEKEEPING
 
-def qaPlot(infiles, outfile, title=None):
+def qaPlot(infiles, outfile, title=None, housekeeping=None):
     # Read the TS5 metrology files specified in infiles, construct time history
     # of the temperature (all four sensors) and pressure
 
@@ -23,20 +24,24 @@ def qaPlot(infiles, outfile, title=None):
     # line are commanded x and y and the measured (summed) z, in mm.
     # The entries of interest here are temp sensors A, B, C, and D, the time (T), and
     # pressure (P)
-    data = dict([(key, []) for key in 'ABCDPT'])
-        
+    #
+    # housekeeping is an optional dict of these columns, keyed by
+    # filename, for files that have already been read, e.g., the
+    # housekeeping attribute of a Ts5Data object.
+    if housekeeping is None:
+        housekeeping = dict()
+    scans = []
     for file in infiles:
-        for line in open(file):
-            if not(line.startswith('#')):
-                tokens = line.split(',')
-                data['A'].append(float(tokens[9]))
-                data['B'].append(float(tokens[10]))
-                data['C'].append(float(tokens[11]))
-                data['D'].append(float(tokens[12]))
-                # Multiply the pressure by 1E6 to convert it to micro-torr
-                data['P'].append(float(tokens[13])*1E6)
-                # Divide the time stamp by 1000 to convert it to seconds
-                data['T'].append(float(tokens[14])/1000.)
+        if file in housekeeping:
+            scans.append(housekeeping[file])
+        else:
+            scans.append(read_ts5_scan(file, columns=TS5_HOUSEKEEPING))
+    data = dict((key, np.concatenate([scan[key] for scan in scans]))
+                for key in TS5_HOUSEKEEPING)
+    # Multiply the pressure by 1E6 to convert it to micro-torr
+    data['P'] = data['P']*1E6
+    # Divide the time stamp by 1000 to convert it to seconds
+    data['T'] = data['T']/1000.
 
     win, axarr = plt.subplots(2, sharex=True)
     times = [datetime.datetime.fromtimestamp(t) for t in data['T']]
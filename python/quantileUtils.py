@@ -0,0 +1,149 @@
+"""
+Utilities for evaluating quantiles of residual distributions.
+"""
+import numpy as np
+
+def quantile_indices(npts, quantiles):
+    """
+    Indices into the sorted values of the requested quantiles, using the
+    convention of MetrologyData.quantile_table: min(int(npts*q), npts-1).
+    """
+    quantiles = np.asarray(quantiles, dtype=float)
+    return np.minimum((npts*quantiles).astype(int), npts - 1)
+
+def exact_quantiles(values, quantiles):
+    """
+    Return the requested quantiles of values as an array, using partial
+    selection of the needed order statistics rather than a full sort.
+    """
+    values = np.asarray(values).ravel()
+    if len(values) == 0:
+        raise IndexError("Cannot evaluate quantiles of an empty array")
+    index = quantile_indices(len(values), quantiles)
+    return np.partition(values, np.unique(index))[index]
+
+def segment_quantiles(values, labels, nseg, quantiles):
+    """
+    Return the requested quantiles of the values of each segment of
+    points sharing the same label, 0 <= label < nseg, as an (nseg,
+    nquantiles) array, with the index convention of quantile_table.
+    The values are grouped by segment, with a stable sort of the labels
+    unless they are already in order, and the order statistics of each
+    segment are found by partial selection.  Empty segments get nan
+    values.
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    labels = np.asarray(labels).ravel()
+    if np.any(labels[1:] < labels[:-1]):
+        order = np.argsort(labels, kind='mergesort')
+        values, labels = values[order], labels[order]
+    counts = np.bincount(labels, minlength=nseg)
+    ends = np.cumsum(counts)
+    result = np.full((nseg, len(quantiles)), np.nan)
+    for k in np.where(counts > 0)[0]:
+        result[k] = exact_quantiles(values[ends[k] - counts[k]:ends[k]],
+                                    quantiles)
+    return result
+
+class QuantileSketch(object):
+    """
+    Mergeable summary of a distribution of values for approximate
+    quantile evaluation without keeping the values in memory.
+
+    Values are counted in bins of width bin_width on a fixed grid
+    anchored at zero, and only the occupied bins are stored, along with
+    the exact number, minimum and maximum of the values.  Since the grid
+    is the same for all sketches with the same bin_width, merging
+    sketches loses no information: the merged sketch is identical to
+    the sketch of the combined values.
+
+    Error bound: for the index convention of quantile_table, each
+    quantile is within bin_width/2 of the exact order statistic, and the
+    0 and 1 quantiles are exact.  The storage is proportional to the
+    number of occupied bins, i.e., to the range of the values divided by
+    bin_width, at most.
+    """
+    def __init__(self, bin_width=0.01):
+        self.bin_width = float(bin_width)
+        self.bins = np.array([], dtype=np.int64)
+        self.counts = np.array([], dtype=np.int64)
+        self.npts = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        "Add an array of values to the sketch and return the sketch."
+        values = np.asarray(values, dtype=float).ravel()
+        if len(values) == 0:
+            return self
+        bins = np.floor(values/self.bin_width).astype(np.int64)
+        self._add_counts(bins, np.ones(len(bins), dtype=np.int64))
+        self.npts += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        return self
+
+    def merge(self, other):
+        "Merge another sketch into this one and return this sketch."
+        if other.bin_width != self.bin_width:
+            raise RuntimeError("Cannot merge sketches with bin widths %s and %s"
+                               % (self.bin_width, other.bin_width))
+        self._add_counts(other.bins, other.counts)
+        self.npts += other.npts
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def __add__(self, other):
+        return QuantileSketch(self.bin_width).merge(self).merge(other)
+
+    def _add_counts(self, bins, counts):
+        bins, index = np.unique(np.concatenate((self.bins, bins)),
+                                return_inverse=True)
+        self.counts = np.bincount(index.ravel(),
+                                  weights=np.concatenate((self.counts, counts)),
+                                  minlength=len(bins)).astype(np.int64)
+        self.bins = bins
+
+    def quantiles(self, quantiles):
+        """
+        Return the requested quantiles as an array, using the index
+        convention of quantile_table.
+        """
+        if self.npts == 0:
+            raise IndexError("Cannot evaluate quantiles of an empty sketch")
+        index = quantile_indices(self.npts, quantiles)
+        loc = np.searchsorted(np.cumsum(self.counts), index, side='right')
+        values = (self.bins[loc] + 0.5)*self.bin_width
+        values = np.clip(values, self.min, self.max)
+        values[index == 0] = self.min
+        values[index == self.npts - 1] = self.max
+        return values
+
+    def to_dict(self):
+        """
+        Return the contents of the sketch as a dict of Python scalars and
+        lists, e.g., for writing to a json file.
+        """
+        return dict(bin_width=self.bin_width, npts=self.npts,
+                    min=float(self.min), max=float(self.max),
+                    bins=self.bins.tolist(), counts=self.counts.tolist())
+
+    @staticmethod
+    def from_dict(contents):
+        "Create a sketch from the output of to_dict."
+        sketch = QuantileSketch(contents['bin_width'])
+        sketch.bins = np.array(contents['bins'], dtype=np.int64)
+        sketch.counts = np.array(contents['counts'], dtype=np.int64)
+        sketch.npts = contents['npts']
+        sketch.min = contents['min']
+        sketch.max = contents['max']
+        return sketch
+
+def merge_sketches(sketches):
+    "Merge a sequence of QuantileSketches, e.g., for the sensors of a raft."
+    sketches = list(sketches)
+    merged = QuantileSketch(sketches[0].bin_width)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
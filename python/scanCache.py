@@ -0,0 +1,172 @@
+"""
+On-disk cache of parsed metrology scans, used by
+MetrologyDataFactory.create to avoid re-parsing raw scan files.
+
+Each cache entry is a directory containing the arrays of the parsed
+object as .npy files, which are memory-mapped when loaded, and a json
+file describing how to reassemble the object's attributes from them.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from persistUtils import encode_state, decode_state
+
+__all__ = ['ScanCache']
+
+# Version of the cache entry layout, included in the cache keys.
+CACHE_VERSION = 2
+
+def _filenames(infile):
+    # MetrologyData objects are made from a file name or, for
+    # differential TS5 scans, a list of file names.
+    return [infile] if isinstance(infile, str) else list(infile)
+
+def _load_array(filename):
+    # Memory-map the array (copy-on-write, so that the cached file is
+    # never modified), falling back to reading it if it cannot be
+    # mapped, e.g., if it is empty for some numpy versions.
+    try:
+        return np.load(filename, mmap_mode='c').view(np.ndarray)
+    except ValueError:
+        return np.load(filename)
+
+class ScanCache(object):
+    """
+    Cache of parsed metrology scans in cache_dir.
+
+    Entries are keyed by the data type, the keyword arguments of the
+    MetrologyData constructor, the file names, and either a hash of the
+    file contents (key='content') or the file sizes and modification
+    times (key='stat').  When the total size of the entries exceeds
+    max_bytes, the least recently used entries are removed.
+    """
+    _index_file = 'state.json'
+
+    def __init__(self, cache_dir, max_bytes=2**30, key='content'):
+        if key not in ('content', 'stat'):
+            raise RuntimeError("Unrecognized cache key type: " + key)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.key_type = key
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def key(self, infile, dtype, **kwds):
+        "Cache key for the MetrologyData object for infile and dtype."
+        filenames = _filenames(infile)
+        digest = hashlib.sha1()
+        digest.update(repr((CACHE_VERSION, dtype, sorted(kwds.items()),
+                            filenames)).encode())
+        for filename in filenames:
+            if self.key_type == 'stat':
+                stat = os.stat(filename)
+                digest.update(repr((stat.st_size, stat.st_mtime)).encode())
+                continue
+            with open(filename, 'rb') as input_:
+                for block in iter(lambda: input_.read(2**20), b''):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """
+        Return the attribute dict of the cached object for key, with the
+        arrays memory-mapped (copy-on-write), or None if there is no
+        entry.
+        """
+        index_file = os.path.join(self._entry(key), self._index_file)
+        try:
+            with open(index_file) as input_:
+                contents = json.load(input_)
+        except (IOError, OSError, ValueError):
+            return None
+        # Record the access for the LRU eviction.
+        try:
+            os.utime(index_file, None)
+        except OSError:
+            pass
+        arrays = dict((name, _load_array(os.path.join(self._entry(key),
+                                                      filename)))
+                      for name, filename in contents['arrays'].items())
+        return decode_state(contents['state'], arrays)
+
+    def put(self, key, state, infile=None):
+        """
+        Store the attribute dict of an object under key, then evict
+        least recently used entries as needed.
+        """
+        arrays = dict()
+        contents = dict(state=encode_state(state, arrays),
+                        arrays=dict((name, '%i.npy' % i) for i, name
+                                    in enumerate(sorted(arrays))),
+                        files=[os.path.abspath(filename) for filename
+                               in _filenames(infile or [])],
+                        created=time.time())
+        # Write the entry to a temporary directory and move it into
+        # place, so that readers never see a partial entry.
+        tmpdir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp')
+        try:
+            for name, filename in contents['arrays'].items():
+                np.save(os.path.join(tmpdir, filename),
+                        np.ascontiguousarray(arrays[name]))
+            with open(os.path.join(tmpdir, self._index_file), 'w') as output:
+                json.dump(contents, output)
+            if os.path.isdir(self._entry(key)):
+                shutil.rmtree(self._entry(key))
+            os.rename(tmpdir, self._entry(key))
+        except Exception:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+
+    def entries(self):
+        """
+        Return a list of (last access time, size in bytes, key) for the
+        cache entries, most recently used first.
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            index_file = os.path.join(self._entry(key), self._index_file)
+            if key.startswith('.') or not os.path.isfile(index_file):
+                continue
+            size = sum(os.path.getsize(os.path.join(self._entry(key), item))
+                       for item in os.listdir(self._entry(key)))
+            entries.append((os.path.getmtime(index_file), size, key))
+        return sorted(entries, reverse=True)
+
+    def evict(self, keep=None):
+        "Remove least recently used entries until within max_bytes."
+        total = 0
+        for _, size, key in self.entries():
+            total += size
+            if total > self.max_bytes and key != keep:
+                self._remove(key)
+                total -= size
+
+    def invalidate(self, infile=None):
+        """
+        Remove the entries made from the file(s) infile, for any data
+        type, or, if infile is None, remove all entries.
+        """
+        files = set(os.path.abspath(filename)
+                    for filename in _filenames(infile or []))
+        for _, _, key in self.entries():
+            if infile is not None:
+                index_file = os.path.join(self._entry(key), self._index_file)
+                try:
+                    with open(index_file) as input_:
+                        entry_files = json.load(input_)['files']
+                except (IOError, OSError, ValueError):
+                    continue
+                if files.isdisjoint(entry_files):
+                    continue
+            self._remove(key)
+
+    def _remove(self, key):
+        shutil.rmtree(self._entry(key), ignore_errors=True)
@@ -0,0 +1,172 @@
+"""
+Flatness analysis of scans that are too large to be held in memory.
+
+The scan file is read several times in blocks of about chunk_size
+bytes, and only one block is in memory at a time:  a first pass
+accumulates the normal-equation sums of a plane fit to all of the
+points, each following pass refits to the points within nsigma of the
+previous fit, and a final pass evaluates the residuals, which are
+summarized in QuantileSketches and optionally written to a residuals
+file.  The memory needed is set by chunk_size and by the number of
+occupied sketch bins, not by the number of points.
+
+With max_iter large enough for the clipped subset to converge, the fit
+is that of PointCloud.xyzPlane_fit, to within the rounding of the sums,
+and each quantile is within bin_width/2 of the exact value given by
+MetrologyData.quantile_table.
+"""
+import numpy as np
+from planeFit import PlaneSums, clip_mask
+from quantileUtils import QuantileSketch
+from persistUtils import MetrologySummary, format_residuals
+from ts5Utils import iter_ts5_scan
+
+__all__ = ['iter_xyz', 'streaming_flatness']
+
+_QUANTILES = (1, 0.995, 0.990, 0.975, 0.75, 0.5, 0.25, 0.025, 0.01, 0.005, 0)
+
+def _iter_itl(infile, chunk_size):
+    """
+    Generator of x, y, z arrays, in the units of the file, of the scan
+    points in an ITL metrology file, parsed as ItlData does, in blocks
+    of lines of about chunk_size bytes.  A point whose X, Y and Z lines
+    straddle two blocks is carried over to the next one.
+    """
+    pending = dict((key, []) for key in 'XYZ')
+    with open(infile) as input_:
+        for lines in iter(lambda: input_.readlines(chunk_size), []):
+            for line in lines:
+                if line.startswith('ImagePoint'):
+                    tokens = line.split()
+                    if len(tokens) > 5:
+                        # Scan summary data, not a scan point.
+                        continue
+                    pending[tokens[1]].append(float(tokens[3]))
+            npts = min(len(values) for values in pending.values())
+            if npts:
+                yield tuple(np.array(pending[key][:npts]) for key in 'XYZ')
+                for key in 'XYZ':
+                    del pending[key][:npts]
+
+def iter_xyz(infile, dtype='TS5', chunk_size=2**22):
+    """
+    Generator of the x, y, z arrays of the scan points in infile, with z
+    converted from mm to microns, in blocks of about chunk_size bytes of
+    the file.  The TS5, e2v (x, y, z csv) and ITL formats are supported.
+    """
+    if dtype in ('TS5', 'e2v'):
+        for block in iter_ts5_scan(infile, columns='XYZ',
+                                   chunk_size=chunk_size):
+            yield block['X'], block['Y'], 1e3*block['Z']
+    elif dtype == 'ITL':
+        for x, y, z in _iter_itl(infile, chunk_size):
+            yield x, y, 1e3*z
+    else:
+        raise RuntimeError("Unrecognized metrology data type for "
+                           "streaming: " + dtype)
+
+def _plane_sums(chunks, center=None, plane=None, nsigma=None):
+    """
+    Accumulate PlaneSums over the chunks, for all of the points, or, if
+    plane = (pars, mean, stdev) is given, for the points with residuals
+    within nsigma standard deviations of the mean.  The center is that
+    of the first nonempty chunk unless given.
+    """
+    sums = None
+    for x, y, z in chunks:
+        if len(z) == 0:
+            continue
+        if plane is not None:
+            pars, mean, stdev = plane
+            keep = clip_mask(z - (pars[0]*x + pars[1]*y + pars[2]), mean,
+                             stdev, nsigma)
+            x, y, z = x[keep], y[keep], z[keep]
+        if sums is None:
+            if center is None:
+                center = (np.mean(x), np.mean(y), np.mean(z))
+            sums = PlaneSums(center)
+        sums.add(x, y, z)
+    return sums
+
+def _same_sums(sums, other):
+    # The clipped subset is unchanged if its sums are unchanged.
+    return all(np.array_equal(sums.sums[key], other.sums[key])
+               for key in sums.sums)
+
+def streaming_flatness(infile, dtype='TS5', nsigma=4, max_iter=1,
+                       clip_nsigma=5, bin_width=0.01, chunk_size=2**22,
+                       residuals_file=None, quantile_file=None,
+                       quantiles=_QUANTILES):
+    """
+    Flatness of the scan in infile, i.e., the residuals with respect to
+    a plane fit with nsigma clipping, evaluated in constant memory.
+    The fit is refit to the clipped points up to max_iter times, each
+    refit being a pass over the file, stopping early if the clipped
+    subset no longer changes.  The residual quantiles, without and with
+    clip_nsigma clipping as in MetrologyData.set_ref_plane, are
+    evaluated from QuantileSketches with bins of bin_width microns.
+
+    The residuals file and the quantile table are written, in the
+    formats of MetrologyData.write_residuals and quantile_table, if
+    residuals_file and quantile_file are given.  Returns a
+    persistUtils.MetrologySummary with the entries of summarize, the
+    number of refits, niter, and the sketches, as dicts (see
+    QuantileSketch.to_dict).  z_median is also from a sketch.
+    """
+    def chunks():
+        return iter_xyz(infile, dtype=dtype, chunk_size=chunk_size)
+
+    sums = _plane_sums(chunks())
+    if sums is None:
+        raise RuntimeError("No scan points found in " + infile)
+    plane = sums.solve()
+    niter = 0
+    while niter < max_iter:
+        clipped = _plane_sums(chunks(), center=sums.center, plane=plane,
+                              nsigma=nsigma)
+        if clipped is None or _same_sums(clipped, sums):
+            break
+        sums = clipped
+        plane = sums.solve()
+        niter += 1
+    pars, mean, stdev = plane
+
+    # As in set_ref_plane, the clipping of the residuals is centered on
+    # the mean of the fit residuals given for model - data.
+    sketch = QuantileSketch(bin_width)
+    sketch_filt = QuantileSketch(bin_width)
+    z_sketch = QuantileSketch(bin_width)
+    output = None
+    if residuals_file is not None:
+        output = open(residuals_file, 'w')
+        output.write('Contour 1\n')
+    try:
+        for x, y, z in chunks():
+            dz = z - (pars[0]*x + pars[1]*y + pars[2])
+            sketch.add(dz)
+            sketch_filt.add(dz[clip_mask(dz, -mean, stdev, clip_nsigma)])
+            z_sketch.add(z)
+            if output is not None:
+                output.write(format_residuals(x, y, dz))
+    finally:
+        if output is not None:
+            output.close()
+
+    values = sketch.quantiles(quantiles)
+    values_filt = sketch_filt.quantiles(quantiles)
+    if quantile_file is not None:
+        with open(quantile_file, 'w') as output:
+            output.write('quantile     z (micron)\n')
+            for quantile, value in zip(quantiles, values):
+                output.write(' %.3f   %12.6f\n' % (quantile, value))
+    return MetrologySummary(dict(
+        infile=infile, npts=sketch.npts, niter=niter,
+        pars=[float(par) for par in pars], mean_filt=float(-mean),
+        stdev_filt=float(stdev),
+        quantiles=dict(('%.3f' % quantile, float(value))
+                       for quantile, value in zip(quantiles, values)),
+        quantiles_filt=dict(('%.3f' % quantile, float(value))
+                            for quantile, value in zip(quantiles,
+                                                       values_filt)),
+        z_median=float(z_sketch.quantiles([0.5])[0]),
+        sketch=sketch.to_dict(), sketch_filt=sketch_filt.to_dict()))
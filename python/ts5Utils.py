@@ -0,0 +1,524 @@
+"""
+Utilities for reading TS5 raft metrology scan files, and gridded views
+of a scan and of the stacked scans of a run.
+"""
+import os
+import warnings
+import numpy as np
+from planeFit import clip_mask, segmented_plane_fit
+from quantileUtils import segment_quantiles
+
+# Column indices of the quantities recorded in the TS5 csv files: the
+# commanded x and y and the measured (summed) z, in mm, temperature
+# sensors A, B, C, and D (C), the pressure (torr) and the time stamp (ms).
+TS5_COLUMNS = dict(X=0, Y=1, Z=2, A=9, B=10, C=11, D=12, P=13, T=14)
+
+# Housekeeping quantities, i.e., everything but the scan coordinates.
+TS5_HOUSEKEEPING = 'ABCDPT'
+
+def _split_comments(text):
+    """
+    Split the text of a TS5 file into the data lines and a list of the
+    comment lines, i.e., those starting with '#'.
+    """
+    text = '\n' + text.replace('\r', '')
+    data, comments = [], []
+    start = 0
+    while True:
+        index = text.find('\n#', start)
+        if index == -1:
+            data.append(text[start:])
+            break
+        data.append(text[start:index])
+        start = text.find('\n', index + 1)
+        if start == -1:
+            start = len(text)
+        comments.append(text[index+1:start])
+    return ''.join(data).strip(), comments
+
+def _ts5_array(data, columns):
+    """
+    Convert the data lines of a TS5 file to a 2D array with one row per
+    scan point.  If the lines are uniform, all of the columns are
+    converted in a single call, otherwise only the requested column
+    indices are converted line-by-line.
+    """
+    nlines = data.count('\n') + 1
+    ncols = data[:data.find('\n')].count(',') + 1
+    try:
+        with warnings.catch_warnings():
+            # numpy < 2 warns, and numpy >= 2 raises a ValueError, if
+            # the text could not be read to its end, e.g., because of
+            # blank lines, trailing commas or fields that are not numeric.
+            warnings.simplefilter('ignore')
+            values = np.fromstring(data.replace('\n', ','), sep=',')
+    except ValueError:
+        values = np.array([])
+    # A line with an extra field followed by one with a missing field
+    # leaves the total size unchanged, so check each line's fields.
+    if (values.size == nlines*ncols
+            and all(line.count(',') == ncols - 1
+                    for line in data.split('\n'))):
+        return values.reshape(nlines, ncols)[:, columns]
+    rows = [line.split(',') for line in data.split('\n') if line.strip()]
+    return np.array([[float(row[i]) for i in columns] for row in rows])
+
+def parse_ts5_header(comments):
+    """
+    Extract the scan metadata from the comment lines of a TS5 file:
+    the start and end times of the scan, from the '# start time = ...'
+    line, and the start and end readings of the temperature sensors,
+    from the '# temperature ...' lines, in file order.  Returns a dict
+    with start_time and end_time, which are None if not found, and the
+    lists temp_start and temp_end.
+    """
+    header = dict(start_time=None, end_time=None, temp_start=[],
+                  temp_end=[])
+    for line in comments:
+        tokens = line.split()
+        try:
+            if line.startswith('# start time ='):
+                header['start_time'] = float(tokens[4])
+                header['end_time'] = float(tokens[9])
+            elif line.startswith('# temperature'):
+                start, end = float(tokens[5]), float(tokens[9])
+                header['temp_start'].append(start)
+                header['temp_end'].append(end)
+        except (IndexError, ValueError):
+            continue
+    return header
+
+def iter_ts5_scan(infile, columns='XYZ', chunk_size=2**22, comments=None):
+    """
+    Generator of the selected columns of a TS5 metrology scan, read in
+    blocks of whole lines of about chunk_size bytes, as dicts of numpy
+    arrays keyed by the names in TS5_COLUMNS, in the units of the file.
+    Only one block is held in memory at a time.  If comments is a list,
+    the comment lines of the file are appended to it as they are read.
+    """
+    indices = [TS5_COLUMNS[column] for column in columns]
+    remainder = ''
+    with open(infile) as input_:
+        while True:
+            chunk = input_.read(chunk_size)
+            if chunk:
+                # Carry any partial last line over to the next block.
+                text = remainder + chunk
+                end = text.rfind('\n') + 1
+                text, remainder = text[:end], text[end:]
+            else:
+                text, remainder = remainder, ''
+            data, block_comments = _split_comments(text)
+            if comments is not None:
+                comments.extend(block_comments)
+            if data:
+                values = _ts5_array(data, indices)
+                yield dict((column, values[:, i])
+                           for i, column in enumerate(columns))
+            if not chunk:
+                break
+
+def read_ts5_scan(infile, columns='XYZ', chunk_size=2**22, header=False):
+    """
+    Read the selected columns of a TS5 metrology scan in a single pass
+    and return them as a dict of numpy arrays, keyed by the names in
+    TS5_COLUMNS.  Values are returned in the units of the file.  The
+    file is converted in blocks of whole lines of about chunk_size
+    bytes (see iter_ts5_scan), so that the peak memory is set by the
+    size of the output arrays rather than by that of the text of the
+    file.
+
+    If header is True, the comment lines found in the same pass are
+    also parsed with parse_ts5_header, and (columns dict, header dict)
+    is returned.
+    """
+    comments = []
+    blocks = list(iter_ts5_scan(infile, columns=columns,
+                                chunk_size=chunk_size, comments=comments))
+    if not blocks:
+        scan = dict((column, np.array([])) for column in columns)
+    elif len(blocks) == 1:
+        scan = dict((column, blocks[0][column].copy())
+                    for column in columns)
+    else:
+        scan = dict((column, np.concatenate([block[column]
+                                             for block in blocks]))
+                    for column in columns)
+    if header:
+        return scan, parse_ts5_header(comments)
+    return scan
+
+def _axis_codes(u1, u2, tol):
+    """
+    Integer codes of the coordinates u1 of a first scan and u2 of a
+    second scan along one axis.  The distinct values of u1 that are
+    separated by no more than tol, i.e., the jittered positions of one
+    grid line, share a code.  Each value of u2 gets the code of the
+    nearest value of u1 if it is within tol of it, or -1 otherwise.
+    """
+    values, inverse = np.unique(u1, return_inverse=True)
+    group = np.concatenate(([0], np.cumsum(np.diff(values) > tol)))
+    # The nearest value of u1 is either side of the insertion point.
+    upper = np.minimum(np.searchsorted(values, u2), len(values) - 1)
+    lower = np.maximum(upper - 1, 0)
+    nearest = np.where(np.abs(u2 - values[lower])
+                       < np.abs(u2 - values[upper]), lower, upper)
+    code2 = np.where(np.abs(u2 - values[nearest]) <= tol, group[nearest], -1)
+    return group[inverse.ravel()], code2, group[-1] + 1
+
+def match_grid_points(x1, y1, x2, y2, tol=None):
+    """
+    Match the (x, y) grid points of two scans with a sort-based join.
+    Return index arrays (index1, index2) such that point index1[i] of
+    the first scan and point index2[i] of the second scan are at the
+    same grid position.  The matches are in the order of the first
+    scan, and if a grid position occurs more than once in the second
+    scan, the first occurrence is used.  By default, coordinates must
+    match exactly.  If tol is given, e.g., to match nominal grid
+    positions that differ by small offsets, the coordinates of the
+    first scan that are within tol of each other are taken to be those
+    of one grid line, and a point of the second scan is on that line if
+    its coordinate is within tol of one of them.  The grid step must be
+    larger than tol plus the spread of the positions of each line.
+    """
+    x1, y1, x2, y2 = [np.asarray(values, dtype=float)
+                      for values in (x1, y1, x2, y2)]
+    if len(x1) == 0 or len(x2) == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    # Replace the coordinates with integer codes for the grid lines so
+    # that each grid position has a single integer key, or a negative
+    # key for points of the second scan off the first scan's grid.
+    (cx1, cx2, _), (cy1, cy2, ny) \
+        = [_axis_codes(u1, u2, tol or 0) for u1, u2 in ((x1, x2), (y1, y2))]
+    key1 = cx1.astype(np.int64)*ny + cy1
+    key2 = np.where((cx2 < 0) | (cy2 < 0), -1, cx2.astype(np.int64)*ny + cy2)
+
+    # A stable sort of the second scan's keys, so that searchsorted finds
+    # the first occurrence of each grid position.
+    order = np.argsort(key2, kind='mergesort')
+    sorted_key2 = key2[order]
+    loc = np.searchsorted(sorted_key2, key1)
+    loc[loc == len(sorted_key2)] = 0
+    index1 = np.where(sorted_key2[loc] == key1)[0]
+    index2 = order[loc[index1]]
+    return index1, index2
+
+def grid_match_stats(index1, index2, npts1, npts2):
+    """
+    Summary of the matching of two scans from the output of
+    match_grid_points: the number of matched points of the first scan
+    and the numbers of points found only in the first or second scans.
+    """
+    return dict(matched=len(index1), only_in_A=npts1 - len(index1),
+                only_in_B=npts2 - len(np.unique(index2)))
+
+def _grid_axis(values, step, tol, origin=None):
+    """
+    Return the origin, step, number of grid points and grid indices of
+    coordinate values on a regular grid.  If step is None, it is taken
+    to be the smallest nonzero difference between consecutive values,
+    i.e., between neighboring points of the raster scan.  The origin is
+    the smallest value, unless given, e.g., for a grid common to several
+    scans.
+    """
+    if origin is None:
+        origin = np.min(values)
+    if step is None:
+        diffs = np.abs(np.diff(values))
+        diffs = diffs[diffs > tol]
+        step = np.min(diffs) if len(diffs) else 1.
+    index = np.rint((values - origin)/step).astype(int)
+    if np.any(np.abs(values - origin - index*step) > tol):
+        raise RuntimeError("Unrecognized grid: coordinates are not on a "
+                           "grid with step %g" % step)
+    return origin, step, index.max() + 1 if len(index) else 0, index
+
+class GriddedScan(object):
+    """
+    View of a scan on its commanded x, y grid as a 2D masked array,
+    image[j, i] being the z value at (x[i], y[j]), with grid positions
+    that were not measured masked.  Differences of scans, regions and
+    image statistics are array operations.
+    """
+    def __init__(self, x, y, image):
+        self.x = x
+        self.y = y
+        self.image = image
+
+    @staticmethod
+    def from_points(x, y, z, step=None, tol=1e-4):
+        """
+        Build the grid from scan points in O(N).  step is the grid
+        spacing, as a number or an (x, y) pair, which is inferred from
+        the scan order if None.  Coordinates must be within tol of the
+        grid positions.  If a position occurs more than once, the first
+        occurrence is used.
+        """
+        x, y, z = [np.asarray(values, dtype=float) for values in (x, y, z)]
+        steps = step if isinstance(step, (tuple, list)) else (step, step)
+        x0, dx, nx, ix = _grid_axis(x, steps[0], tol)
+        y0, dy, ny, iy = _grid_axis(y, steps[1], tol)
+        data = np.zeros((ny, nx))
+        mask = np.ones((ny, nx), dtype=bool)
+        # Assign in reverse order so that the first occurrences are kept.
+        data[iy[::-1], ix[::-1]] = z[::-1]
+        mask[iy, ix] = False
+        return GriddedScan(x0 + dx*np.arange(nx), y0 + dy*np.arange(ny),
+                           np.ma.MaskedArray(data, mask=mask))
+
+    @property
+    def step(self):
+        "The (x, y) grid spacings."
+        return tuple(values[1] - values[0] if len(values) > 1 else 0.
+                     for values in (self.x, self.y))
+
+    @property
+    def extent(self):
+        "(left, right, bottom, top) of the grid cells, e.g., for imshow."
+        dx, dy = self.step
+        return (self.x[0] - dx/2., self.x[-1] + dx/2.,
+                self.y[0] - dy/2., self.y[-1] + dy/2.)
+
+    def points(self):
+        "The x, y, z values of the measured grid positions."
+        jj, ii = np.nonzero(~np.ma.getmaskarray(self.image))
+        return self.x[ii], self.y[jj], self.image.data[jj, ii]
+
+    def region(self, xmin, xmax, ymin, ymax):
+        """
+        The part of the grid with xmin <= x <= xmax and ymin <= y <= ymax,
+        as a view of this grid's arrays.
+        """
+        i0 = np.searchsorted(self.x, xmin, side='left')
+        i1 = np.searchsorted(self.x, xmax, side='right')
+        j0 = np.searchsorted(self.y, ymin, side='left')
+        j1 = np.searchsorted(self.y, ymax, side='right')
+        return GriddedScan(self.x[i0:i1], self.y[j0:j1],
+                           self.image[j0:j1, i0:i1])
+
+    def __sub__(self, other):
+        """
+        Difference of two scans on the same grid spacing, over the
+        overlap of the grids.  Positions not measured in either scan are
+        masked.
+        """
+        slices = []
+        for mine, theirs, step, other_step in zip((self.x, self.y),
+                                                  (other.x, other.y),
+                                                  self.step, other.step):
+            step = step or other_step or 1.
+            offset = int(np.rint((theirs[0] - mine[0])/step))
+            if (other_step and not np.isclose(step, other_step)
+                    or not np.isclose(theirs[0], mine[0] + offset*step)):
+                raise RuntimeError("Unrecognized grid: the grids of the "
+                                   "scans are not aligned")
+            start = max(0, offset)
+            end = min(len(mine), offset + len(theirs))
+            slices.append((slice(start, max(start, end)),
+                           slice(start - offset, max(start, end) - offset)))
+        (xs_mine, xs_theirs), (ys_mine, ys_theirs) = slices
+        return GriddedScan(self.x[xs_mine], self.y[ys_mine],
+                           self.image[ys_mine, xs_mine]
+                           - other.image[ys_theirs, xs_theirs])
+
+# Quantiles reported by MetrologyData.quantile_table.
+_QUANTILES = (1, 0.995, 0.990, 0.975, 0.75, 0.5, 0.25, 0.025, 0.01, 0.005, 0)
+
+class ScanCube(object):
+    """
+    The TS5 scans of a run, e.g., the room temperature, cooling, cold
+    and after thermal cycle scans, stacked on their common commanded
+    grid: z[k, j, i] is the height (micron) of scan k at (x[i], y[j]),
+    masked where scan k has no point.  Each file is read once, with its
+    housekeeping columns and header metadata, so that deltas between
+    any scans, and statistics over scans, are array operations on the
+    stack, without re-reading the files or re-matching grid points.
+    """
+    def __init__(self, labels, x, y, z, housekeeping=None,
+                 scan_metadata=None):
+        self.labels = list(labels)
+        self.x = x
+        self.y = y
+        self.z = z
+        # Keyed by filename, as for Ts5Data, e.g., for qaPlot.
+        self.housekeeping = housekeeping or dict()
+        self.scan_metadata = scan_metadata or dict()
+
+    @staticmethod
+    def from_files(infiles, labels=None, step=None, tol=1e-4):
+        """
+        Read the scans in infiles and stack them.  labels, e.g., the
+        names of the measurement steps, are the file basenames by
+        default.  step is the grid spacing, as a number or an (x, y)
+        pair, which is inferred from the first scan if None.  The grid
+        covers all of the scans, whose coordinates must be within tol
+        of its positions.  If a position occurs more than once in a
+        scan, the first occurrence is used.
+        """
+        infiles = list(infiles)
+        if labels is None:
+            labels = [os.path.basename(infile) for infile in infiles]
+        scans = []
+        housekeeping = dict()
+        scan_metadata = dict()
+        for infile in infiles:
+            scan, header = read_ts5_scan(infile,
+                                         columns='XYZ' + TS5_HOUSEKEEPING,
+                                         header=True)
+            housekeeping[infile] = dict((key, scan[key]) for key
+                                        in TS5_HOUSEKEEPING)
+            scan_metadata[infile] = header
+            scans.append(scan)
+        steps = step if isinstance(step, (tuple, list)) else (step, step)
+        axes = []
+        for column, step in zip('XY', steps):
+            if step is None:
+                step = _grid_axis(scans[0][column], None, tol)[1]
+            origin = min(np.min(scan[column]) for scan in scans
+                         if len(scan[column]))
+            indices = [_grid_axis(scan[column], step, tol, origin=origin)[3]
+                       for scan in scans]
+            npts = max(index.max() + 1 for index in indices if len(index))
+            axes.append((origin + step*np.arange(npts), indices))
+        (x, ix), (y, iy) = axes
+        data = np.zeros((len(scans), len(y), len(x)))
+        mask = np.ones(data.shape, dtype=bool)
+        for k, scan in enumerate(scans):
+            # Assign in reverse order so that the first occurrences are
+            # kept.
+            data[k, iy[k][::-1], ix[k][::-1]] = 1e3*scan['Z'][::-1]
+            mask[k, iy[k], ix[k]] = False
+        return ScanCube(labels, x, y, np.ma.MaskedArray(data, mask=mask),
+                        housekeeping=housekeeping,
+                        scan_metadata=scan_metadata)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def index(self, scan):
+        "Index in the stack of a scan given by label or index."
+        if scan in self.labels:
+            return self.labels.index(scan)
+        return range(len(self.labels))[scan]
+
+    def scan(self, scan):
+        "A scan, by label or index, as a GriddedScan."
+        return GriddedScan(self.x, self.y, self.z[self.index(scan)])
+
+    def delta(self, scan1, scan2):
+        """
+        The difference, scan1 - scan2, of two scans given by label or
+        index, as a GriddedScan, with positions not measured in both
+        scans masked.
+        """
+        return GriddedScan(self.x, self.y, self.z[self.index(scan1)]
+                           - self.z[self.index(scan2)])
+
+    def pairs(self):
+        "Index arrays (first, second) of all pairs of scans, first < second."
+        first, second = np.triu_indices(len(self), 1)
+        return first, second
+
+    def delta_flatness(self, pairs=None, nsigma=4, clip_nsigma=5,
+                       quantiles=_QUANTILES):
+        """
+        Flatness of the deltas, first - second, of pairs of scans, by
+        default all of them, evaluated as flatnessTask_delta does for
+        two scans, i.e., the residuals of a clipped plane fit to the
+        common points and their quantiles, without and with nsigma
+        clipping, but for all of the pairs together.  pairs is a list of
+        (first, second) scans, by label or index.
+
+        Returns a dict keyed by the (first, second) labels of the
+        results for each pair, as a dict with the fit parameters pars,
+        the npts fitted, mean_filt and stdev_filt of the fit residuals,
+        and the quantiles and quantiles_filt of the residuals, as
+        reported by MetrologyData.quantile_table.
+        """
+        if pairs is None:
+            first, second = self.pairs()
+        else:
+            first = np.array([self.index(pair[0]) for pair in pairs],
+                             dtype=int)
+            second = np.array([self.index(pair[1]) for pair in pairs],
+                              dtype=int)
+        deltas = self.z[first] - self.z[second]
+        results = self._flatness(deltas, nsigma, clip_nsigma, quantiles)
+        return dict(((self.labels[i], self.labels[j]), result)
+                    for i, j, result in zip(first, second, results))
+
+    def _flatness(self, deltas, nsigma, clip_nsigma, quantiles):
+        # Fit the planes to all of the masked images in deltas with a
+        # single segmented fit, then evaluate the residual quantiles of
+        # all of them from a single sort.
+        nseg = len(deltas)
+        labels, jj, ii = np.nonzero(~np.ma.getmaskarray(deltas))
+        x, y = self.x[ii], self.y[jj]
+        dz = deltas.data[labels, jj, ii]
+        _, pars, mean, stdev, _, _ = segmented_plane_fit(x, y, dz, labels,
+                                                         nsigma=nsigma)
+        # segmented_plane_fit skips the segment indices of empty deltas.
+        present = np.bincount(labels, minlength=nseg) > 0
+        seg = np.cumsum(present) - 1
+        resids = dz - (pars[seg[labels], 0]*x + pars[seg[labels], 1]*y
+                       + pars[seg[labels], 2])
+        # As in MetrologyData.set_ref_plane, the clipping of the
+        # residuals is centered on the mean of the fit residuals given
+        # for model - data.
+        keep = clip_mask(resids, -mean[seg[labels]], stdev[seg[labels]],
+                         clip_nsigma)
+        values = segment_quantiles(resids, labels, nseg, quantiles)
+        values_filt = segment_quantiles(resids[keep], labels[keep], nseg,
+                                        quantiles)
+        npts = np.bincount(labels, minlength=nseg)
+        results = []
+        for k in range(nseg):
+            if not present[k]:
+                results.append(dict(npts=0))
+                continue
+            results.append(dict(
+                pars=tuple(float(par) for par in pars[seg[k]]),
+                npts=int(npts[k]), mean_filt=float(-mean[seg[k]]),
+                stdev_filt=float(stdev[seg[k]]),
+                quantiles=dict(('%.3f' % q, float(value))
+                               for q, value in zip(quantiles, values[k])),
+                quantiles_filt=dict(('%.3f' % q, float(value)) for q, value
+                                    in zip(quantiles, values_filt[k]))))
+        return results
+
+    def drift(self, scans=None):
+        """
+        Per-point statistics over the scans, by label or index, by
+        default all of them, as a dict of masked images: the number of
+        scans measuring each position (nscans), the mean, standard
+        deviation and range (max - min) of the heights, and the net
+        change from the first to the last of the scans (net), which is
+        masked unless both measured the position.
+        """
+        if scans is None:
+            index = np.arange(len(self))
+        else:
+            index = np.array([self.index(scan) for scan in scans], dtype=int)
+        z = self.z[index]
+        return dict(nscans=z.count(axis=0), mean=z.mean(axis=0),
+                    stdev=z.std(axis=0),
+                    range=z.max(axis=0) - z.min(axis=0),
+                    net=z[-1] - z[0])
+
+    def cold_warm(self, cold, warm, nsigma=4, clip_nsigma=5,
+                  quantiles=_QUANTILES):
+        """
+        Compare the cold and warm scans, given as lists of labels or
+        indices: the delta of the mean cold and mean warm heights, over
+        the positions measured in all of the scans, as a GriddedScan,
+        and its flatness, as for delta_flatness.
+        """
+        mean = []
+        for scans in (cold, warm):
+            z = self.z[[self.index(scan) for scan in scans]]
+            mask = np.any(np.ma.getmaskarray(z), axis=0)
+            mean.append(np.ma.MaskedArray(z.data.mean(axis=0), mask=mask))
+        delta = mean[0] - mean[1]
+        flatness = self._flatness(delta[np.newaxis], nsigma, clip_nsigma,
+                                  quantiles)[0]
+        return GriddedScan(self.x, self.y, delta), flatness
@@ -2,11 +2,12 @@
 Unit tests for MetrologyData class.
 """
 from __future__ import print_function
+import pickle
 import unittest
 import numpy as np
 import scipy.stats
 import itertools
-from MetrologyData import PointCloud, XyzPlane
+from MetrologyData import PointCloud, XyzPlane, xyzPlane_fit_batch
 
 class PointCloudTestCase(unittest.TestCase):
     "TestCase class for the PointCloud class."
@@ -51,5 +52,97 @@ class PointCloudTestCase(unittest.TestCase):
             self.assertAlmostEqual(fitted_plane.pars[0],
                                    fitted_plane_new.pars[0])
 
+    def test_xyzPlane_fit_methods(self):
+        """
+        Test that the direct least-squares fit agrees with the
+        scipy.optimize.curve_fit fit.
+        """
+        np.random.seed(1837)
+        positions = np.random.uniform(0, 40, size=(1000, 2))
+        x, y = positions.transpose()
+        z = XyzPlane(0.5, -0.2, 13000.)(positions) \
+            + np.random.normal(scale=2, size=len(x))
+        pc = PointCloud(x, y, z)
+        plane_lstsq = pc.xyzPlane_fit(method='lstsq')
+        stdev_lstsq = pc.stdev_filt
+        plane_curve_fit = pc.xyzPlane_fit(method='curve_fit')
+        np.testing.assert_allclose(plane_lstsq.pars, plane_curve_fit.pars,
+                                   rtol=1e-6)
+        self.assertAlmostEqual(stdev_lstsq, pc.stdev_filt)
+
+        # XyzPlane also accepts a sequence of (x, y) tuples.
+        self.assertAlmostEqual(plane_lstsq([(x[0], y[0])])[0],
+                               plane_lstsq(positions)[0])
+
+    def test_collinear_points(self):
+        """
+        Test that the direct least-squares fit of collinear points
+        gives a plane through the points, as the curve_fit fit does.
+        """
+        np.random.seed(2207)
+        t = np.linspace(0, 10, 50)
+        for x, y in ((t, np.zeros(len(t)) + 3.), (2*t + 1, t)):
+            z = 12.9 + 0.1*x + np.random.normal(scale=0.01, size=len(t))
+            pc = PointCloud(x, y, z)
+            plane_lstsq = pc.xyzPlane_fit(method='lstsq')
+            stdev_lstsq = pc.stdev_filt
+            self.assertTrue(np.all(np.isfinite(plane_lstsq.pars)))
+            plane_curve_fit = pc.xyzPlane_fit(method='curve_fit')
+            positions = np.column_stack((x, y))
+            np.testing.assert_allclose(plane_lstsq(positions),
+                                       plane_curve_fit(positions),
+                                       atol=1e-6)
+            self.assertAlmostEqual(stdev_lstsq, pc.stdev_filt)
+
+    def test_xyzPlane_fit_batch(self):
+        """
+        Test that the batched fits agree with the individual fits, and
+        that clouds without points get nan parameters.
+        """
+        np.random.seed(5531)
+        clouds = []
+        for i, npts in enumerate((100, 0, 100)):
+            positions = np.random.uniform(0, 40, size=(npts, 2))
+            z = XyzPlane(0.1*i, -0.2, 13000. + i)(positions) \
+                + np.random.normal(scale=2, size=npts)
+            clouds.append(PointCloud(positions[:, 0], positions[:, 1], z))
+        planes = xyzPlane_fit_batch(clouds)
+        self.assertEqual(len(planes), 3)
+        self.assertTrue(np.all(np.isnan(planes[1].pars)))
+        self.assertEqual(len(clouds[1].mask), 0)
+        for i in (0, 2):
+            expected = PointCloud.from_xyz(clouds[i].xyz).xyzPlane_fit()
+            np.testing.assert_allclose(planes[i].pars, expected.pars,
+                                       rtol=1e-8)
+
+    def test_storage(self):
+        """
+        Test that x, y, z and the positions are views of the (N, 3)
+        array, that point clouds are combined correctly, and that point
+        clouds pickled with separate x, y, z arrays can be read.
+        """
+        pc = PointCloud([1, 2, 3], [4, 5, 6], [7, 8, 9])
+        self.assertEqual(pc.xyz.shape, (3, 3))
+        pc.z *= 1e3
+        np.testing.assert_array_equal(pc.xyz[:, 2], [7e3, 8e3, 9e3])
+        positions, z = pc.data()
+        positions[0, 1] = -4
+        self.assertEqual(pc.y[0], -4)
+        self.assertEqual(positions.shape, (3, 2))
+
+        clouds = [PointCloud([i], [i], [i]) for i in range(4)]
+        combined = PointCloud.concatenate(clouds)
+        np.testing.assert_array_equal(combined.x, range(4))
+        np.testing.assert_array_equal((clouds[0] + clouds[1]).z, [0, 1])
+        self.assertEqual(len(combined), 4)
+
+        old_pc = PointCloud.__new__(PointCloud)
+        state = dict(x=pc.x.copy(), y=pc.y.copy(), z=pc.z.copy(),
+                     stdev_filt=None, mean_filt=None)
+        old_pc.__setstate__(state)
+        np.testing.assert_array_equal(old_pc.xyz, pc.xyz)
+        restored = pickle.loads(pickle.dumps(pc))
+        np.testing.assert_array_equal(restored.xyz, pc.xyz)
+
 if __name__ == '__main__':
     unittest.main()
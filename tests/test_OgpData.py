@@ -0,0 +1,68 @@
+"""
+Unit tests for the OgpData Contour block parser.
+"""
+from __future__ import print_function
+import os
+import unittest
+import tempfile
+import numpy as np
+from MetrologyData import md_factory
+
+def _write_contour(output, contour_id, x, y, z, heading=False):
+    output.write('Contour %i\n' % contour_id)
+    if heading:
+        output.write('X  Y  Z\n')
+    for xx, yy, zz in zip(x, y, z):
+        output.write('%.6f  %.6f  %.6f mm\n' % (xx, yy, zz))
+    output.write('\n')
+
+class OgpDataTestCase(unittest.TestCase):
+    "TestCase class for the OgpData class."
+    def setUp(self):
+        np.random.seed(8761)
+        self.sensor = np.random.uniform(1, 41, size=(3, 200))
+        self.sensor[2] = np.random.normal(loc=-1, scale=0.005, size=200)
+        self.refs = []
+        for yoffset in (-10, 50):
+            ref = np.random.uniform(0, 40, size=(3, 20))
+            ref[1] = np.random.uniform(yoffset, yoffset + 1, size=20)
+            ref[2] = np.random.normal(loc=-2, scale=0.005, size=20)
+            self.refs.append(ref)
+        fd, self.infile = tempfile.mkstemp(suffix='.DAT')
+        with os.fdopen(fd, 'w') as output:
+            output.write('OGP scan header\n\n')
+            _write_contour(output, 1, *self.refs[0])
+            output.write('Lines after a blank line are ignored\n')
+            _write_contour(output, 2, *self.sensor, heading=True)
+            _write_contour(output, 3, *self.refs[1])
+
+    def tearDown(self):
+        os.remove(self.infile)
+
+    def test_read_data(self):
+        "Test that the sensor and reference Contours are read correctly."
+        ogp_data = md_factory.create(self.infile, dtype='OGP')
+        x, y, z = [np.array(['%.6f' % value for value in values], dtype=float)
+                   for values in self.sensor]
+        np.testing.assert_array_equal(ogp_data.sensor.x, x)
+        np.testing.assert_array_equal(ogp_data.sensor.y, y)
+        np.testing.assert_array_equal(ogp_data.sensor.z, 1e3*z)
+        z_ref = np.concatenate([np.array(['%.6f' % value for value in ref[2]],
+                                         dtype=float) for ref in self.refs])
+        np.testing.assert_array_equal(np.sort(ogp_data.reference.z),
+                                      np.sort(1e3*z_ref))
+
+    def test_irregular_lines(self):
+        """
+        Test that lines with extra and missing entries that offset each
+        other are converted line-by-line.
+        """
+        with open(self.infile, 'w') as output:
+            output.write('Contour 1\n1 2 3 4 5\n6 7 8\n9 10 11 12\n\n')
+        ogp_data = md_factory.create(self.infile, dtype='OGP')
+        np.testing.assert_array_equal(ogp_data.sensor.x, [1, 6, 9])
+        np.testing.assert_array_equal(ogp_data.sensor.y, [2, 7, 10])
+        np.testing.assert_array_equal(ogp_data.sensor.z, [3000, 8000, 11000])
+
+if __name__ == '__main__':
+    unittest.main()
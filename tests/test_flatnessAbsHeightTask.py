@@ -0,0 +1,86 @@
+"""
+Unit tests for the fused flatness and absolute height task.
+"""
+from __future__ import print_function
+import os
+import json
+import shutil
+import unittest
+import tempfile
+import numpy as np
+from MetrologyData import md_factory
+from persistUtils import read_header
+from flatnessTask import flatnessTask
+from absoluteHeightTask import absoluteHeightTask
+from flatnessAbsHeightTask import flatnessAbsHeightTask
+from test_OgpData import _write_contour
+
+class FlatnessAbsHeightTaskTestCase(unittest.TestCase):
+    "TestCase class for flatnessAbsHeightTask."
+    def setUp(self):
+        np.random.seed(2020)
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        self.infile = os.path.join(self.tmpdir, 'scan.DAT')
+        sensor = np.random.uniform(1, 41, size=(3, 200))
+        sensor[2] = np.random.normal(loc=-1, scale=0.005, size=200)
+        with open(self.infile, 'w') as output:
+            output.write('OGP scan header\n\n')
+            for contour_id, yoffset in ((1, -10), (3, 50)):
+                ref = np.random.uniform(0, 40, size=(3, 20))
+                ref[1] = np.random.uniform(yoffset, yoffset + 1, size=20)
+                ref[2] = np.random.normal(loc=-2, scale=0.005, size=20)
+                _write_contour(output, contour_id, *ref)
+            _write_contour(output, 2, *sensor)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def _run(self, subdir, func):
+        os.mkdir(os.path.join(self.tmpdir, subdir))
+        os.chdir(os.path.join(self.tmpdir, subdir))
+        func()
+        os.chdir(self.cwd)
+        return os.path.join(self.tmpdir, subdir)
+
+    def test_products(self):
+        "Test that the products match those of the separate tasks."
+        def separate():
+            flatnessTask('sensor', self.infile, pickle_file='flatness.npz',
+                         summary_file='flatness_summary.json', processes=1)
+            absoluteHeightTask('sensor', self.infile, zoffset=-1.2,
+                               pickle_file='abs_height.npz',
+                               summary_file='abs_height_summary.json',
+                               processes=1)
+        def fused():
+            flatnessAbsHeightTask(
+                'sensor', self.infile, zoffset=-1.2,
+                flatness_pickle_file='flatness.npz',
+                flatness_summary_file='flatness_summary.json',
+                abs_height_pickle_file='abs_height.npz',
+                abs_height_summary_file='abs_height_summary.json',
+                processes=1)
+        dirs = self._run('separate', separate), self._run('fused', fused)
+        products = sorted(os.listdir(dirs[0]))
+        self.assertEqual(products, sorted(os.listdir(dirs[1])))
+        self.assertEqual(len(products), 16)
+        for product in products:
+            files = [os.path.join(item, product) for item in dirs]
+            if product.endswith('.txt'):
+                contents = [open(item).read() for item in files]
+                self.assertEqual(contents[0], contents[1])
+            elif product.endswith('.json'):
+                contents = [json.load(open(item)) for item in files]
+                self.assertEqual(contents[0], contents[1])
+            elif product.endswith('.npz'):
+                self.assertEqual(read_header(files[0]),
+                                 read_header(files[1]))
+                loaded = [md_factory.load(item) for item in files]
+                np.testing.assert_array_equal(loaded[0].resids,
+                                              loaded[1].resids)
+                np.testing.assert_array_equal(loaded[0].sensor.xyz,
+                                              loaded[1].sensor.xyz)
+
+if __name__ == '__main__':
+    unittest.main()
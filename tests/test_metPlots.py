@@ -0,0 +1,94 @@
+"""
+Unit tests for the plotting helper functions.
+"""
+from __future__ import print_function
+import os
+import unittest
+import tempfile
+import numpy as np
+from MetrologyData import XyzPlane, md_factory
+from metPlots import reference_grid, decimate, plot
+from test_OgpData import _write_contour
+
+class ReferenceGridTestCase(unittest.TestCase):
+    "TestCase class for the reference_grid function."
+    def setUp(self):
+        np.random.seed(1013)
+        self.x = np.random.uniform(-20, 20, size=50)
+        self.y = np.random.uniform(0, 40, size=50)
+        self.plane = XyzPlane(0.01, -0.02, 3.)
+
+    def test_reference_grid(self):
+        "Test the grid against a node-by-node evaluation of the plane."
+        xx, yy, zz = reference_grid(self.x, self.y, plane=self.plane,
+                                    npts=(20, 30))
+        self.assertEqual(xx.shape, (20, 30))
+        x = np.linspace(min(self.x), max(self.x), 20)
+        y = np.linspace(min(self.y), max(self.y), 30)
+        for i, xval in enumerate(x):
+            for j, yval in enumerate(y):
+                self.assertEqual(xx[i, j], xval)
+                self.assertEqual(yy[i, j], yval)
+                self.assertEqual(zz[i, j], self.plane([(xval, yval)])[0])
+
+        xx, yy, zz = reference_grid(self.x, self.y, npts=10)
+        self.assertEqual(zz.shape, (10, 10))
+        self.assertEqual(np.count_nonzero(zz), 0)
+
+class DecimateTestCase(unittest.TestCase):
+    "TestCase class for the decimate function."
+    def setUp(self):
+        np.random.seed(1015)
+        # A densely sampled region and a sparsely sampled one.
+        self.x = np.concatenate((np.random.uniform(0, 10, size=10000),
+                                 np.random.uniform(10, 40, size=100)))
+        self.y = np.random.uniform(0, 40, size=len(self.x))
+
+    def test_decimate(self):
+        "Test the number and spatial distribution of the points kept."
+        npts = len(self.x)
+        np.testing.assert_array_equal(decimate(self.x, self.y, None),
+                                      np.arange(npts))
+        np.testing.assert_array_equal(decimate(self.x, self.y, npts),
+                                      np.arange(npts))
+
+        index = decimate(self.x, self.y, 1000)
+        self.assertEqual(len(index), 1000)
+        self.assertEqual(len(np.unique(index)), 1000)
+        self.assertTrue(np.all(np.diff(index) > 0))
+        # Most of the sparse points are kept, rather than ~1%.
+        self.assertGreater(np.count_nonzero(self.x[index] > 10), 50)
+        np.testing.assert_array_equal(index, decimate(self.x, self.y, 1000))
+
+        keep = np.zeros(npts, dtype=bool)
+        keep[np.random.choice(npts, 20, replace=False)] = True
+        index = decimate(self.x, self.y, 1000, keep=keep)
+        self.assertEqual(len(index), 1020)
+        self.assertTrue(set(np.where(keep)[0]).issubset(index))
+
+class AbsoluteHeightPlotTestCase(unittest.TestCase):
+    "TestCase class for absolute_height_plot with reference points."
+    def setUp(self):
+        np.random.seed(1016)
+        fd, self.infile = tempfile.mkstemp(suffix='.DAT')
+        with os.fdopen(fd, 'w') as output:
+            ref = np.random.uniform(0, 40, size=(3, 20))
+            ref[1] = np.random.uniform(-10, -9, size=20)
+            _write_contour(output, 1, *ref)
+            _write_contour(output, 2, *np.random.uniform(1, 41, size=(3, 200)))
+
+    def tearDown(self):
+        os.remove(self.infile)
+        plot.pylab.close('all')
+
+    def test_absolute_height_plot(self):
+        "Test the plot with all and with decimated sensor points."
+        ogpData = md_factory.create(self.infile, dtype='OGP')
+        ogpData.set_ref_plane(ogpData.reference.xyzPlane_fit())
+        for max_points in (None, 50):
+            win, ax = ogpData.absolute_height_plot(max_points=max_points)
+            # Sensor, reference and positive residual points.
+            self.assertEqual(len(ax.collections), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Unit tests for the chunk-parallel reductions.
+"""
+from __future__ import print_function
+import os
+import glob
+import shutil
+import unittest
+import tempfile
+import numpy as np
+from parallelUtils import chunk_slices, chunk_map, chunk_histogram
+from planeFit import sigma_clip_fit
+from MetrologyData import md_factory, PointCloud
+from flatnessTask import flatnessTask
+
+class ParallelUtilsTestCase(unittest.TestCase):
+    "TestCase class for the parallel evaluation against the serial code."
+    def setUp(self):
+        np.random.seed(9137)
+        npts = 300000
+        x = np.random.uniform(0, 40, size=npts)
+        y = np.random.uniform(0, 40, size=npts)
+        z = (1.3e4 + 0.2*x - 0.1*y
+             + np.random.normal(scale=2, size=npts))
+        z[::499] += np.random.uniform(20, 50, size=len(z[::499]))
+        self.cloud = PointCloud(x, y, z)
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        self.infile = os.path.join(self.tmpdir, 'scan.csv')
+        np.savetxt(self.infile, np.column_stack((x, y, 1e-3*z)),
+                   fmt='%.6f', delimiter=',')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_chunk_map(self):
+        "Test the chunking of the points."
+        for npts, nchunks in ((10, 3), (7, 7), (2**20, 4)):
+            slices = chunk_slices(npts, nchunks)
+            self.assertEqual(len(slices), nchunks)
+            self.assertEqual(np.concatenate([np.arange(npts)[item]
+                                             for item in slices]).tolist(),
+                             list(range(npts)))
+        self.assertEqual(chunk_map(lambda chunk: chunk, 100, threads=4),
+                         [slice(0, 100)])
+        self.assertEqual(len(chunk_map(lambda chunk: chunk, 2**20,
+                                       threads=4)), 4)
+
+    def test_chunk_histogram(self):
+        "Test that the chunked histogram is identical to numpy's."
+        values = np.concatenate((self.cloud.z, np.linspace(1.3e4, 1.3e4 + 8,
+                                                           61)))
+        for bins in (1, 7, 60):
+            for threads in (None, 3):
+                counts, edges = chunk_histogram(values, bins, threads=threads)
+                expected, expected_edges = np.histogram(values, bins)
+                np.testing.assert_array_equal(counts, expected)
+                np.testing.assert_array_equal(edges, expected_edges)
+
+    def test_plane_fit(self):
+        """
+        Test the parallel plane fit, residuals and clipping masks
+        against the serial results: the masks and element-wise
+        residuals are identical, and the fit parameters and moments
+        agree to within rounding.
+        """
+        serial = PointCloud.from_xyz(self.cloud.xyz)
+        plane = serial.xyzPlane_fit()
+        for threads in (2, 3, 0):
+            cloud = PointCloud.from_xyz(self.cloud.xyz)
+            parallel = cloud.xyzPlane_fit(threads=threads)
+            np.testing.assert_array_equal(cloud.mask, serial.mask)
+            self.assertEqual(cloud.niter, serial.niter)
+            np.testing.assert_allclose(parallel.pars, plane.pars,
+                                       rtol=1e-12, atol=1e-12)
+            self.assertAlmostEqual(cloud.mean_filt, serial.mean_filt,
+                                   places=10)
+            self.assertAlmostEqual(cloud.stdev_filt, serial.stdev_filt,
+                                   places=10)
+        # Without centering, the rounding of the sums is amplified by
+        # the conditioning of the normal equations.
+        design = np.column_stack((self.cloud.x, self.cloud.y,
+                                  np.ones(len(self.cloud))))
+        expected = sigma_clip_fit(design, self.cloud.z, nsigma=3)
+        result = sigma_clip_fit(design, self.cloud.z, nsigma=3, threads=4)
+        np.testing.assert_array_equal(result[3], expected[3])
+        np.testing.assert_allclose(result[0], expected[0], rtol=1e-8)
+
+    def test_set_ref_plane(self):
+        """
+        Test that the parallel residuals and clipped residuals are
+        identical to the serial ones, and the parallel histogram plot.
+        """
+        serial = md_factory.create(self.infile, dtype='e2v')
+        parallel = serial.analysis_copy()
+        plane = serial.sensor.xyzPlane_fit()
+        serial.set_ref_plane(plane)
+        parallel.sensor.xyzPlane_fit()
+        parallel.set_ref_plane(plane, threads=3)
+        for attr in ('resids', 'resids_filt'):
+            np.testing.assert_array_equal(getattr(parallel, attr),
+                                          getattr(serial, attr))
+        # The single clipping pass without a model.
+        for md, threads in ((serial, None), (parallel, 3)):
+            md.sensor.mean_filt = None
+            md.set_ref_plane(plane, zoffset=10, threads=threads)
+        np.testing.assert_array_equal(parallel.resids_filt,
+                                      serial.resids_filt)
+        self.assertAlmostEqual(parallel.sensor.stdev_filt,
+                               serial.sensor.stdev_filt, places=10)
+
+        win = parallel.plot_statistics(title='parallel', threads=2)
+        self.assertEqual(win.axes[0].get_title(), 'parallel')
+
+    def test_flatnessTask(self):
+        """
+        Test flatnessTask with a thread pool for the fit and a process
+        pool for the plots: the forked plot workers inherit the thread
+        pool of the fit, but not its threads, so they must use their own.
+        """
+        os.chdir(self.tmpdir)
+        # Just enough points for two chunks of at least 2**16 points,
+        # since the surface plots are slow.
+        npts = 140000
+        np.savetxt('sensor.csv', np.column_stack((self.cloud.x[:npts],
+                                                  self.cloud.y[:npts],
+                                                  1e-3*self.cloud.z[:npts])),
+                   fmt='%.6f', delimiter=',')
+        flatnessTask('sensor', 'sensor.csv', dtype='e2v', threads=2,
+                     processes=2)
+        self.assertEqual(len(glob.glob('sensor_flatness_*.png')), 4)
+        self.assertTrue(os.path.isfile('sensor_flatness_residuals.txt'))
+
+if __name__ == '__main__':
+    unittest.main()
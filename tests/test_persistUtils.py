@@ -0,0 +1,175 @@
+"""
+Unit tests for the array-based persistence of MetrologyData objects.
+"""
+from __future__ import print_function
+import os
+import sys
+import json
+import subprocess
+import zipfile
+import unittest
+import tempfile
+import numpy as np
+from MetrologyData import md_factory
+from persistUtils import read_header, is_results_file, write_summary, \
+    load_summary, read_binary_residuals
+
+class PersistTestCase(unittest.TestCase):
+    "TestCase class for MetrologyData.persist and md_factory.load."
+    def setUp(self):
+        infile = os.path.join(os.environ['METROLOGYDATAANALYSISDIR'], 'tests',
+                              'ITL_vendor_metrology_data.txt')
+        self.sensorData = md_factory.create(infile, dtype='ITL')
+        self.sensorData.set_ref_plane(self.sensorData.sensor.xyzPlane_fit(),
+                                      sketch_bin_width=0.01)
+        self.sensorData.quantile_table(outfile=os.devnull)
+        fd, self.outfile = tempfile.mkstemp(suffix='.npz')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.outfile)
+
+    def _check_loaded(self, loaded):
+        self.assertEqual(type(loaded), type(self.sensorData))
+        self.assertEqual(loaded.infile, self.sensorData.infile)
+        self.assertEqual(loaded.quantiles, self.sensorData.quantiles)
+        self.assertEqual(loaded.quantiles_filt,
+                         self.sensorData.quantiles_filt)
+        np.testing.assert_array_equal(loaded.resids, self.sensorData.resids)
+        np.testing.assert_array_equal(loaded.sensor.xyz,
+                                      self.sensorData.sensor.xyz)
+        np.testing.assert_array_equal(loaded.sensor.mask,
+                                      self.sensorData.sensor.mask)
+        self.assertEqual(loaded.plane_functor.pars,
+                         self.sensorData.plane_functor.pars)
+        self.assertEqual(loaded.sketch.npts, self.sensorData.sketch.npts)
+
+    def test_results_file(self):
+        "Test writing and reading the results format."
+        self.sensorData.persist(self.outfile)
+        self.assertTrue(is_results_file(self.outfile))
+        self._check_loaded(md_factory.load(self.outfile))
+
+        loaded = md_factory.load(self.outfile, mmap_mode='r')
+        self._check_loaded(loaded)
+        self.assertTrue(isinstance(loaded.resids.base, np.memmap))
+
+        header = read_header(self.outfile)
+        summary = header['summary']
+        self.assertEqual(summary['quantiles']['0.975'],
+                         self.sensorData.quantiles['0.975'])
+        self.assertEqual(summary['stdev_filt'],
+                         self.sensorData.sensor.stdev_filt)
+        self.assertEqual(summary['pars'],
+                         list(self.sensorData.plane_functor.pars))
+
+    def test_format_version(self):
+        "Test that files with a later format version are refused."
+        self.sensorData.persist(self.outfile)
+        header = read_header(self.outfile)
+        header['format_version'] += 1
+        with zipfile.ZipFile(self.outfile) as archive:
+            members = dict((name, archive.read(name))
+                           for name in archive.namelist())
+        with zipfile.ZipFile(self.outfile, 'w') as archive:
+            for name, contents in members.items():
+                if name == 'header.npy':
+                    fd, tmpfile = tempfile.mkstemp(suffix='.npy')
+                    os.close(fd)
+                    np.save(tmpfile, np.frombuffer(json.dumps(header).encode(),
+                                                   dtype=np.uint8))
+                    contents = open(tmpfile, 'rb').read()
+                    os.remove(tmpfile)
+                archive.writestr(name, contents)
+        self.assertRaises(RuntimeError, md_factory.load, self.outfile)
+
+    def test_pickle(self):
+        "Test that pickle files can still be written and read."
+        self.sensorData.persist(self.outfile, use_pickle=True)
+        self.assertFalse(is_results_file(self.outfile))
+        self._check_loaded(md_factory.load(self.outfile))
+
+    def test_legacy_pickles(self):
+        """
+        Test reading pickles written by Python 2 with protocols 0 and 2
+        before the results format, from an e2v scan of 200 points.
+        """
+        x, y = [values.ravel() for values in
+                np.meshgrid(np.arange(20.), np.arange(10.))]
+        z = 12.9 + 1e-3*x - 2e-3*y + 2e-3*np.cos(1.7*x + 2.9*y)
+        with open(self.outfile, 'w') as output:
+            for item in zip(x, y, z):
+                output.write('%.4f,%.4f,%.6f\n' % item)
+        expected = md_factory.create(self.outfile, dtype='e2v')
+        expected.set_ref_plane(expected.sensor.xyzPlane_fit())
+        expected.quantile_table(outfile=os.devnull)
+        for protocol in (0, 2):
+            loaded = md_factory.load(
+                os.path.join(os.environ['METROLOGYDATAANALYSISDIR'], 'tests',
+                             'e2v_py2_protocol%i.pkl' % protocol))
+            self.assertEqual(type(loaded), type(expected))
+            self.assertEqual(loaded.infile, 'scan.csv')
+            np.testing.assert_array_equal(loaded.sensor.xyz,
+                                          expected.sensor.xyz)
+            np.testing.assert_allclose(loaded.plane_functor.pars,
+                                       expected.plane_functor.pars,
+                                       rtol=1e-6)
+            np.testing.assert_allclose(loaded.resids, expected.resids,
+                                       atol=1e-3)
+            self.assertEqual(sorted(loaded.quantiles),
+                             sorted(expected.quantiles))
+
+    def test_summary(self):
+        """
+        Test the summary file and reading the summary from a results
+        file, and that load_summary needs no plotting or SciPy modules.
+        """
+        write_summary(self.sensorData, self.outfile)
+        self.assertFalse(is_results_file(self.outfile))
+        summary = load_summary(self.outfile)
+        self.sensorData.persist(self.outfile)
+        for item in (summary, load_summary(self.outfile)):
+            self.assertEqual(item.quantiles, self.sensorData.quantiles)
+            self.assertEqual(item.quantiles_filt,
+                             self.sensorData.quantiles_filt)
+            self.assertEqual(item.infile, self.sensorData.infile)
+            self.assertEqual(item.z_median,
+                             np.median(self.sensorData.sensor.z))
+            self.assertEqual(item.npts, len(self.sensorData.sensor.z))
+            self.assertEqual(item.mean_filt, self.sensorData.sensor.mean_filt)
+
+        command = ('import sys; before = set(sys.modules); '
+                   'from persistUtils import load_summary; '
+                   'load_summary(%s); '
+                   'print(sorted(name for name in set(sys.modules) - before '
+                   'if name.split(".")[0] in '
+                   '("MetrologyData", "matplotlib", "scipy")))'
+                   % repr(self.outfile))
+        output = subprocess.check_output([sys.executable, '-c', command])
+        self.assertEqual(output.decode().strip(), '[]')
+
+    def test_residuals(self):
+        """
+        Test the text residuals file against per-point formatting, and
+        the round trip of the binary residuals file.
+        """
+        sensor = self.sensorData.sensor
+        self.sensorData.write_residuals(self.outfile, chunk_size=7)
+        expected = ['Contour 1\n'] + ['%.6f  %.6f  %.6f mm\n' % item for item
+                                      in zip(sensor.x, sensor.y,
+                                             self.sensorData.resids)]
+        with open(self.outfile) as input_:
+            self.assertEqual(input_.read(), ''.join(expected))
+
+        self.sensorData.write_residuals(self.outfile, contour_id=2,
+                                        binary=True)
+        x, y, resids = read_binary_residuals(self.outfile)
+        np.testing.assert_array_equal(x, sensor.x)
+        np.testing.assert_array_equal(y, sensor.y)
+        np.testing.assert_array_equal(resids, self.sensorData.resids)
+        with np.load(self.outfile) as data:
+            self.assertEqual(int(data['contour_id']), 2)
+            self.assertEqual(data['resids'].dtype, np.float64)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Unit tests for the sigma-clipped least-squares fitting code.
+"""
+from __future__ import print_function
+import unittest
+import numpy as np
+from planeFit import sigma_clip_fit, clip_mask, segmented_plane_fit
+
+class SigmaClipFitTestCase(unittest.TestCase):
+    "TestCase class for the sigma_clip_fit function."
+    def setUp(self):
+        np.random.seed(48151)
+        npts = 5000
+        x = np.random.uniform(-20, 20, size=npts)
+        y = np.random.uniform(-20, 20, size=npts)
+        self.z = 0.3*x - 0.1*y + 2 + np.random.normal(scale=1.5, size=npts)
+        self.z[:50] += np.random.uniform(10, 30, size=50)
+        self.design = np.column_stack((x, y, np.ones(npts)))
+
+    def tearDown(self):
+        pass
+
+    def test_sigma_clip_fit(self):
+        """
+        Test that the incrementally updated fit agrees with a direct fit
+        to the final subset of points.
+        """
+        pars, mean, stdev, mask, niter \
+            = sigma_clip_fit(self.design, self.z, nsigma=3)
+        self.assertTrue(niter > 0)
+        self.assertEqual(np.count_nonzero(mask[:50]), 0)
+        expected = np.linalg.lstsq(self.design[mask], self.z[mask],
+                                   rcond=-1)[0]
+        np.testing.assert_allclose(pars, expected, rtol=1e-10)
+        dz = self.z[mask] - self.design[mask].dot(pars)
+        self.assertAlmostEqual(mean, np.mean(dz), places=10)
+        self.assertAlmostEqual(stdev, np.std(dz), places=10)
+        # The subset has converged.
+        np.testing.assert_array_equal(
+            mask, clip_mask(self.z - self.design.dot(pars), mean, stdev, 3))
+
+    def test_iteration_limits(self):
+        "Test the max_iter and tol stopping conditions."
+        niter = sigma_clip_fit(self.design, self.z, nsigma=3)[-1]
+        self.assertEqual(sigma_clip_fit(self.design, self.z, nsigma=3,
+                                        max_iter=1)[-1], 1)
+        self.assertTrue(sigma_clip_fit(self.design, self.z, nsigma=3,
+                                       tol=0.1)[-1] <= niter)
+
+    def test_no_model(self):
+        "Test a single clipping pass for a design matrix with no columns."
+        dz = self.z - self.design.dot((0.3, -0.1, 2))
+        _, mean, stdev, mask, _ = sigma_clip_fit(np.zeros((len(dz), 0)), dz,
+                                                 nsigma=5, max_iter=1)
+        index = clip_mask(dz, np.mean(dz), np.std(dz), 5)
+        np.testing.assert_array_equal(mask, index)
+        self.assertAlmostEqual(mean, np.mean(dz[index]), places=10)
+        self.assertAlmostEqual(stdev, np.std(dz[index]), places=10)
+
+class SegmentedPlaneFitTestCase(unittest.TestCase):
+    "TestCase class for the segmented_plane_fit function."
+    def setUp(self):
+        np.random.seed(62342)
+        self.segments = []
+        for i, npts in enumerate((1000, 200, 3000, 2)):
+            x = np.random.uniform(0, 40, size=npts)
+            y = np.random.uniform(0, 40, size=npts) + 50*i
+            z = (0.1*i*x - 0.2*y + 1000*i
+                 + np.random.normal(scale=0.5 + i, size=npts))
+            z[:npts//50] += 30*(i + 1)
+            self.segments.append((x, y, z))
+
+    def tearDown(self):
+        pass
+
+    def test_segmented_plane_fit(self):
+        "Test that the segmented fits agree with the individual fits."
+        labels = np.concatenate([np.zeros(len(x), dtype=int) + 10*i for
+                                 i, (x, y, z) in enumerate(self.segments)])
+        x, y, z = [np.concatenate(values) for values in zip(*self.segments)]
+        # Shuffle the points to check that segments need not be contiguous.
+        order = np.random.permutation(len(x))
+        segments, pars, mean, stdev, mask, niter \
+            = segmented_plane_fit(x[order], y[order], z[order], labels[order],
+                                  nsigma=3)
+        np.testing.assert_array_equal(segments, [0, 10, 20, 30])
+        for i, (xx, yy, zz) in enumerate(self.segments[:3]):
+            design = np.column_stack((xx, yy, np.ones(len(xx))))
+            expected = sigma_clip_fit(design, zz, nsigma=3)
+            np.testing.assert_allclose(pars[i], expected[0], rtol=1e-8)
+            self.assertAlmostEqual(mean[i], expected[1], places=8)
+            self.assertAlmostEqual(stdev[i], expected[2], places=8)
+            self.assertEqual(niter[i], expected[4])
+            np.testing.assert_array_equal(
+                mask[np.argsort(order)][labels == 10*i], expected[3])
+        # Too few points to fit the last segment.
+        self.assertTrue(np.all(np.isnan(pars[3])))
+
+    def test_collinear_segment(self):
+        """
+        Test that a segment of collinear points, e.g., a single-line
+        OGP contour, gets nan values without affecting the others.
+        """
+        x0, y0, z0 = self.segments[0]
+        for yy in (np.zeros(50) + 3., np.linspace(0, 10, 50)):
+            xx = 2*yy + 1
+            x, y, z = [np.concatenate((values, extra)) for values, extra
+                       in zip(self.segments[0], (xx, yy, xx + yy))]
+            labels = np.concatenate((np.zeros(len(x0), dtype=int),
+                                     np.ones(len(xx), dtype=int)))
+            segments, pars, mean, stdev, mask, niter \
+                = segmented_plane_fit(x, y, z, labels, nsigma=3)
+            design = np.column_stack((x0, y0, np.ones(len(x0))))
+            expected = sigma_clip_fit(design, z0, nsigma=3)
+            np.testing.assert_allclose(pars[0], expected[0], rtol=1e-8)
+            self.assertTrue(np.all(np.isnan(pars[1])))
+            self.assertEqual(niter[1], 0)
+
+if __name__ == '__main__':
+    unittest.main()
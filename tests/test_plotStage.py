@@ -0,0 +1,116 @@
+"""
+Unit tests for the plotting stage of the analysis tasks.
+"""
+from __future__ import print_function
+import os
+import sys
+import shutil
+import subprocess
+import unittest
+import tempfile
+import multiprocessing
+from MetrologyData import md_factory
+from plotStage import render_plots
+from flatnessTask import flatnessTask
+
+class PlotStageTestCase(unittest.TestCase):
+    "TestCase class for render_plots and the tasks using it."
+    def setUp(self):
+        self.infile = os.path.join(os.environ['METROLOGYDATAANALYSISDIR'],
+                                   'tests', 'ITL_vendor_metrology_data.txt')
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_render_plots(self):
+        """
+        Test rendering plots, including several views of a 3D plot,
+        serially and with a process pool.
+        """
+        sensorData = md_factory.create(self.infile, dtype='ITL')
+        sensorData.set_ref_plane(sensorData.sensor.xyzPlane_fit())
+        for processes in (1, 2):
+            plots = [('resids_boxplot', dict(title='box'),
+                      os.path.join(self.tmpdir, 'box_%i.png' % processes)),
+                     ('flatness_plot', dict(azim=10),
+                      os.path.join(self.tmpdir, 'surf_%i.png' % processes)),
+                     ('absolute_height_plot_views',
+                      dict(views=[(10, 10), (10, 45)]),
+                      [os.path.join(self.tmpdir, 'view_%i_%i.png'
+                                    % (processes, azim))
+                       for azim in (10, 45)])]
+            timings = render_plots(sensorData, plots, processes=processes,
+                                   verbose=False)
+            self.assertEqual([outfile for outfile, _ in timings],
+                             [outfile for _, _, outfile in plots])
+            for outfile, dt in timings:
+                if not isinstance(outfile, list):
+                    outfile = [outfile]
+                for item in outfile:
+                    self.assertTrue(os.path.isfile(item))
+                self.assertGreater(dt, 0)
+
+    def test_default_processes(self):
+        """
+        Test that by default the plots are made in this process, from
+        the object itself rather than from a results file.
+        """
+        sensorData = md_factory.create(self.infile, dtype='ITL')
+        sensorData.set_ref_plane(sensorData.sensor.xyzPlane_fit())
+        calls = []
+        boxplot = sensorData.resids_boxplot
+        sensorData.resids_boxplot = \
+            lambda **kwds: calls.append(boxplot(**kwds))
+        outfiles = [os.path.join(self.tmpdir, 'box_%i.png' % i)
+                    for i in range(2)]
+        # Whatever the number of CPUs.
+        cpu_count = multiprocessing.cpu_count
+        multiprocessing.cpu_count = lambda: 4
+        try:
+            render_plots(sensorData, [('resids_boxplot', dict(title='box'),
+                                       outfile) for outfile in outfiles],
+                         verbose=False)
+        finally:
+            multiprocessing.cpu_count = cpu_count
+        self.assertEqual(len(calls), 2)
+        for outfile in outfiles:
+            self.assertTrue(os.path.isfile(outfile))
+
+    def test_flatnessTask(self):
+        "Test that flatnessTask writes all of its products."
+        os.chdir(self.tmpdir)
+        flatnessTask('sensor', self.infile, dtype='ITL',
+                     pickle_file='flatness.npz',
+                     summary_file='flatness_summary.json', processes=2)
+        for suffix in ('residuals.txt', 'quantile_table.txt', 'hist.png',
+                       'boxplot.png', 'point_cloud_azim_10.png',
+                       'point_cloud_azim_45.png'):
+            self.assertTrue(os.path.isfile('sensor_flatness_' + suffix))
+        for outfile in ('flatness.npz', 'flatness_summary.json'):
+            self.assertTrue(os.path.isfile(outfile))
+
+    def test_numbers_only(self):
+        """
+        Test that the numbers-only mode writes the numerical products,
+        but no plots, and imports no plotting modules.
+        """
+        os.chdir(self.tmpdir)
+        command = ('import sys; before = set(sys.modules); '
+                   'from flatnessTask import flatnessTask; '
+                   'flatnessTask("sensor", %s, dtype="ITL", '
+                   'pickle_file="flatness.npz", make_plots=False); '
+                   'print(sorted(name for name in set(sys.modules) - before '
+                   'if name.split(".")[0] in '
+                   '("metPlots", "matplotlib", "mpl_toolkits", "lsst")))'
+                   % repr(self.infile))
+        output = subprocess.check_output([sys.executable, '-c', command])
+        self.assertEqual(output.decode().strip().split('\n')[-1], '[]')
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['flatness.npz', 'sensor_flatness_quantile_table.txt',
+                          'sensor_flatness_residuals.txt'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Unit tests for the quantile evaluation code.
+"""
+from __future__ import print_function
+import os
+import json
+import unittest
+import numpy as np
+from quantileUtils import exact_quantiles, QuantileSketch, merge_sketches, \
+    segment_quantiles
+from MetrologyData import md_factory, XyzPlane
+
+class ExactQuantilesTestCase(unittest.TestCase):
+    "TestCase class for the exact_quantiles function."
+    def setUp(self):
+        np.random.seed(2718)
+        self.quantiles = (1, 0.995, 0.990, 0.975, 0.75, 0.5,
+                          0.25, 0.025, 0.01, 0.005, 0)
+
+    def tearDown(self):
+        pass
+
+    def test_exact_quantiles(self):
+        """
+        Test that the selected order statistics match those of a full
+        sort for the quantile_table index convention.
+        """
+        for npts in (1, 2, 7, 100, 1001):
+            for values in (np.random.normal(size=npts),
+                           np.random.randint(0, 5, size=npts).astype(float)):
+                sorted_values = sorted(values)
+                expected = [sorted_values[min(int(npts*quantile), npts-1)]
+                            for quantile in self.quantiles]
+                np.testing.assert_array_equal(
+                    exact_quantiles(values, self.quantiles), expected)
+
+    def test_segment_quantiles(self):
+        "Test the per-segment quantiles against exact_quantiles."
+        labels = np.random.randint(0, 5, size=1000)
+        labels[labels == 3] = 4
+        values = np.random.normal(size=len(labels))
+        result = segment_quantiles(values, labels, 6, self.quantiles)
+        self.assertEqual(result.shape, (6, len(self.quantiles)))
+        for label in (0, 1, 2, 4):
+            np.testing.assert_array_equal(
+                result[label],
+                exact_quantiles(values[labels == label], self.quantiles))
+        self.assertTrue(np.all(np.isnan(result[[3, 5]])))
+
+    def test_empty(self):
+        "Test that an empty array raises an IndexError."
+        self.assertRaises(IndexError, exact_quantiles, [], self.quantiles)
+
+class QuantileSketchTestCase(unittest.TestCase):
+    "TestCase class for the QuantileSketch class."
+    def setUp(self):
+        self.quantiles = (1, 0.995, 0.990, 0.975, 0.75, 0.5,
+                          0.25, 0.025, 0.01, 0.005, 0)
+        self.bin_width = 0.01
+        self.sensors = []
+        for vendor_file in ('ITL_vendor_metrology_data.txt',
+                            'WFS_vendor_metrology_data.txt'):
+            infile = os.path.join(os.environ['METROLOGYDATAANALYSISDIR'],
+                                  'tests', vendor_file)
+            sensorData = md_factory.create(infile, dtype='ITL')
+            sensorData.set_ref_plane(XyzPlane(0, 0, 12992.),
+                                     sketch_bin_width=self.bin_width)
+            self.sensors.append(sensorData)
+
+    def tearDown(self):
+        pass
+
+    def _check_bounds(self, sketch, values):
+        exact = exact_quantiles(values, self.quantiles)
+        approx = sketch.quantiles(self.quantiles)
+        self.assertTrue(np.all(np.abs(approx - exact)
+                               <= self.bin_width/2.*(1 + 1e-6)))
+        self.assertEqual(approx[0], exact[0])
+        self.assertEqual(approx[-1], exact[-1])
+
+    def test_error_bounds(self):
+        """
+        Test that the sketch quantiles of the vendor data residuals are
+        within the documented bounds of the exact quantiles.
+        """
+        for sensorData in self.sensors:
+            self._check_bounds(sensorData.sketch, sensorData.resids)
+            self._check_bounds(sensorData.sketch_filt, sensorData.resids_filt)
+            sensorData.quantile_table(outfile=os.devnull, use_sketch=True)
+            self.assertEqual(sorted(sensorData.quantiles.keys()),
+                             sorted('%.3f' % q for q in self.quantiles))
+
+    def test_merge(self):
+        """
+        Test that merging sketches is the same as sketching the combined
+        residuals, and that sketches survive serialization.
+        """
+        merged = merge_sketches(sensorData.sketch
+                                for sensorData in self.sensors)
+        resids = np.concatenate([sensorData.resids
+                                 for sensorData in self.sensors])
+        combined = QuantileSketch(self.bin_width).add(resids)
+        np.testing.assert_array_equal(merged.bins, combined.bins)
+        np.testing.assert_array_equal(merged.counts, combined.counts)
+        self._check_bounds(merged, resids)
+
+        restored = QuantileSketch.from_dict(json.loads(
+            json.dumps(merged.to_dict())))
+        np.testing.assert_array_equal(restored.quantiles(self.quantiles),
+                                      merged.quantiles(self.quantiles))
+
+        summed = self.sensors[0].sketch + self.sensors[1].sketch
+        self.assertEqual(summed.npts, len(resids))
+        self.assertRaises(RuntimeError, merged.merge, QuantileSketch(0.1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Unit tests for the parsed-scan cache.
+"""
+from __future__ import print_function
+import os
+import time
+import shutil
+import unittest
+import tempfile
+import numpy as np
+from scanCache import ScanCache
+from MetrologyData import md_factory
+from test_ts5Utils import write_ts5_scan
+
+class ScanCacheTestCase(unittest.TestCase):
+    "TestCase class for the ScanCache class."
+    def setUp(self):
+        np.random.seed(1009)
+        self.cache_dir = tempfile.mkdtemp()
+        self.files = []
+        x, y = np.random.uniform(0, 40, size=(2, 100))
+        for i in range(2):
+            fd, infile = tempfile.mkstemp(suffix='.csv')
+            os.close(fd)
+            write_ts5_scan(infile, x, y, np.random.normal(size=100))
+            self.files.append(infile)
+        self.itl_file = os.path.join(os.environ['METROLOGYDATAANALYSISDIR'],
+                                     'tests', 'ITL_vendor_metrology_data.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        for item in self.files:
+            os.remove(item)
+
+    def test_create(self):
+        """
+        Test that objects loaded from the cache match the parsed objects
+        and that their arrays are memory-mapped from the cache.
+        """
+        cache = ScanCache(self.cache_dir)
+        for infile, dtype in ((self.files[0], 'TS5'), (self.files, 'TS5'),
+                              (self.itl_file, 'ITL')):
+            parsed = md_factory.create(infile, dtype=dtype, cache=cache)
+            cached = md_factory.create(infile, dtype=dtype, cache=cache)
+            self.assertEqual(type(cached), type(parsed))
+            self.assertEqual(cached.infile, parsed.infile)
+            np.testing.assert_array_equal(cached.sensor.xyz,
+                                          parsed.sensor.xyz)
+            self.assertTrue(isinstance(cached.sensor.xyz.base, np.memmap))
+            self.assertEqual(sorted(cached.__dict__.keys()),
+                             sorted(parsed.__dict__.keys()))
+            cached.set_ref_plane(cached.sensor.xyzPlane_fit())
+        self.assertEqual(len(cache.entries()), 3)
+
+        ts5Data = md_factory.create(self.files, dtype='TS5', cache=cache)
+        self.assertEqual(ts5Data.match_stats['matched'], 100)
+        self.assertEqual(sorted(ts5Data.housekeeping.keys()),
+                         sorted(self.files))
+
+        # The factory cache attribute is used by default.
+        md_factory.cache = cache
+        try:
+            md_factory.create(self.files[0], dtype='TS5', grid_tol=0.1)
+        finally:
+            md_factory.cache = None
+        self.assertEqual(len(cache.entries()), 4)
+
+    def test_keys(self):
+        "Test that modifying a file changes its key."
+        for key_type in ('content', 'stat'):
+            cache = ScanCache(self.cache_dir, key=key_type)
+            key = cache.key(self.files[0], 'TS5')
+            self.assertEqual(key, cache.key(self.files[0], 'TS5'))
+            self.assertNotEqual(key, cache.key(self.files[0], 'OGP'))
+            with open(self.files[0], 'a') as output:
+                output.write('0,0,0\n')
+            mtime = time.time() + 10
+            os.utime(self.files[0], (mtime, mtime))
+            self.assertNotEqual(key, cache.key(self.files[0], 'TS5'))
+        self.assertRaises(RuntimeError, ScanCache, self.cache_dir, key='foo')
+
+    def test_eviction(self):
+        "Test the LRU eviction and the invalidation of entries."
+        cache = ScanCache(self.cache_dir)
+        for infile in self.files:
+            md_factory.create(infile, dtype='TS5', cache=cache)
+        sizes = dict((key, size) for _, size, key in cache.entries())
+        key0, key1 = [cache.key(infile, 'TS5') for infile in self.files]
+
+        # Use the first entry, so that the second is least recently used.
+        mtime = time.time() + 10
+        os.utime(os.path.join(self.cache_dir, key0, 'state.json'),
+                 (mtime, mtime))
+        cache.max_bytes = sizes[key0] + sizes[key1] - 1
+        cache.evict()
+        self.assertEqual([key for _, _, key in cache.entries()], [key0])
+
+        cache.invalidate(self.files[1])
+        self.assertEqual(len(cache.entries()), 1)
+        cache.invalidate(self.files[0])
+        self.assertEqual(len(cache.entries()), 0)
+
+        for infile in self.files:
+            md_factory.create(infile, dtype='TS5', cache=cache)
+        cache.invalidate()
+        self.assertEqual(len(cache.entries()), 0)
+
+if __name__ == '__main__':
+    unittest.main()
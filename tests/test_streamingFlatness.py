@@ -0,0 +1,108 @@
+"""
+Unit tests for the constant-memory flatness analysis.
+"""
+from __future__ import print_function
+import os
+import shutil
+import unittest
+import tempfile
+import numpy as np
+from MetrologyData import md_factory
+from flatnessTask import flatnessTask
+from persistUtils import load_summary
+from streamingFlatness import iter_xyz, streaming_flatness
+from test_ts5Utils import write_ts5_scan
+
+class StreamingFlatnessTestCase(unittest.TestCase):
+    "TestCase class for streaming_flatness."
+    def setUp(self):
+        np.random.seed(2041)
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        xy = np.array([(xx, yy) for xx in np.arange(0, 60, 0.5)
+                       for yy in np.arange(0, 40, 0.5)])
+        x, y = xy.transpose()
+        z = (12.9 + 2e-4*x - 1e-4*y
+             + np.random.normal(scale=0.002, size=len(x)))
+        # Outliers, to be clipped.
+        z[::97] += 0.05
+        self.ts5_file = os.path.join(self.tmpdir, 'scan.csv')
+        write_ts5_scan(self.ts5_file, x, y, z)
+        self.itl_file = os.path.join(os.environ['METROLOGYDATAANALYSISDIR'],
+                                     'tests', 'ITL_vendor_metrology_data.txt')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_iter_xyz(self):
+        "Test the chunked readers against the MetrologyData readers."
+        for infile, dtype in ((self.ts5_file, 'TS5'), (self.itl_file, 'ITL')):
+            md = md_factory.create(infile, dtype=dtype)
+            chunks = list(iter_xyz(infile, dtype=dtype, chunk_size=1000))
+            self.assertGreater(len(chunks), 2)
+            for i, values in enumerate(zip(*chunks)):
+                np.testing.assert_array_equal(np.concatenate(values),
+                                              md.sensor.xyz[:, i])
+        self.assertRaises(RuntimeError, next,
+                          iter_xyz(self.itl_file, dtype='OGP'))
+
+    def test_streaming_flatness(self):
+        """
+        Test the streamed fit and quantiles against the in-memory
+        analysis, and the residuals and quantile table files.
+        """
+        md = md_factory.create(self.ts5_file, dtype='TS5')
+        md.set_ref_plane(md.sensor.xyzPlane_fit())
+        md.quantile_table(outfile=os.devnull)
+        residuals_file = os.path.join(self.tmpdir, 'resids.txt')
+        md.write_residuals(residuals_file)
+        expected = np.loadtxt(residuals_file, skiprows=1, usecols=(0, 1, 2))
+
+        bin_width = 0.01
+        summary = streaming_flatness(
+            self.ts5_file, max_iter=100, bin_width=bin_width,
+            chunk_size=2**12, residuals_file=residuals_file,
+            quantile_file=os.path.join(self.tmpdir, 'quantiles.txt'))
+        self.assertEqual(summary.npts, len(md.sensor.z))
+        self.assertEqual(summary.niter, md.sensor.niter)
+        np.testing.assert_allclose(summary.pars, md.plane_functor.pars,
+                                   rtol=1e-9, atol=1e-9)
+        self.assertAlmostEqual(summary.mean_filt, md.sensor.mean_filt,
+                               places=9)
+        self.assertAlmostEqual(summary.stdev_filt, md.sensor.stdev_filt,
+                               places=9)
+        for attr in ('quantiles', 'quantiles_filt'):
+            values = getattr(md, attr)
+            self.assertEqual(sorted(getattr(summary, attr)), sorted(values))
+            for key in values:
+                self.assertLessEqual(abs(getattr(summary, attr)[key]
+                                         - values[key]), bin_width/2.)
+        np.testing.assert_allclose(np.loadtxt(residuals_file, skiprows=1,
+                                              usecols=(0, 1, 2)),
+                                   expected, atol=2e-6)
+        with open(os.path.join(self.tmpdir, 'quantiles.txt')) as input_:
+            lines = input_.readlines()
+        self.assertEqual(lines[0], 'quantile     z (micron)\n')
+        self.assertEqual(len(lines), 12)
+
+        # A single clipping pass, by default.
+        summary = streaming_flatness(self.ts5_file, chunk_size=2**12)
+        self.assertEqual(summary.niter, 1)
+        self.assertLess(abs(summary.pars[0] - md.plane_functor.pars[0]),
+                        1e-3)
+
+    def test_flatnessTask(self):
+        "Test the streaming mode of flatnessTask."
+        os.chdir(self.tmpdir)
+        flatnessTask('sensor', self.itl_file, dtype='ITL', streaming=True,
+                     summary_file='flatness_summary.json')
+        for suffix in ('residuals.txt', 'quantile_table.txt'):
+            self.assertTrue(os.path.isfile('sensor_flatness_' + suffix))
+        summary = load_summary('flatness_summary.json')
+        md = md_factory.create(self.itl_file, dtype='ITL')
+        self.assertEqual(summary.npts, len(md.sensor.z))
+        self.assertEqual(len(summary.quantiles), 11)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,303 @@
+"""
+Unit tests for the TS5 scan reader and the Ts5Data class.
+"""
+from __future__ import print_function
+import os
+import unittest
+import tempfile
+import numpy as np
+from ts5Utils import read_ts5_scan, TS5_COLUMNS, match_grid_points, \
+    parse_ts5_header, GriddedScan, ScanCube
+from MetrologyData import md_factory
+from persistUtils import write_summary, load_summary
+
+def write_ts5_scan(outfile, x, y, z, t0=1.5e12):
+    "Write a TS5 scan csv file with the given grid points and z values."
+    output = open(outfile, 'w')
+    output.write('# start time = %.1f ms, end time = %.1f ms\n'
+                 % (t0, t0 + 1e6))
+    for i, sensor in enumerate('ABCD'):
+        output.write('# temperature %s start = %.1f C, end = %.1f C\n'
+                     % (sensor, 20.1 + i, 20.2 + i))
+    for i, (xx, yy, zz) in enumerate(zip(x, y, z)):
+        row = np.zeros(16)
+        row[:3] = xx, yy, zz
+        row[9:13] = 20 + 1e-3*i, 21, 22, 23
+        row[13] = 1e-6*i
+        row[14] = t0 + 1e3*i
+        output.write(','.join('%.6f' % value for value in row) + '\n')
+    output.close()
+
+class Ts5UtilsTestCase(unittest.TestCase):
+    "TestCase class for the TS5 reader functions."
+    def setUp(self):
+        np.random.seed(4401)
+        xy = np.array([(xx, yy) for xx in np.arange(0, 40, 2.)
+                       for yy in np.arange(0, 30, 1.5)])
+        self.x, self.y = xy.transpose()
+        self.z = np.random.normal(loc=12.9, scale=0.005, size=len(self.x))
+        self.files = []
+        for i in range(2):
+            fd, infile = tempfile.mkstemp(suffix='.csv')
+            os.close(fd)
+            self.files.append(infile)
+        write_ts5_scan(self.files[0], self.x, self.y, self.z)
+        # The second scan is missing every third grid point.
+        index = np.where(np.arange(len(self.x)) % 3 != 0)
+        self.z2 = self.z + 1e-3
+        write_ts5_scan(self.files[1], self.x[index], self.y[index],
+                       self.z2[index])
+        self.index = index
+
+    def tearDown(self):
+        for item in self.files:
+            os.remove(item)
+
+    def test_read_ts5_scan(self):
+        "Test reading selected columns."
+        scan = read_ts5_scan(self.files[0], columns='XZT')
+        self.assertEqual(sorted(scan.keys()), ['T', 'X', 'Z'])
+        np.testing.assert_allclose(scan['X'], self.x)
+        np.testing.assert_allclose(scan['Z'], self.z, atol=1e-6)
+        self.assertEqual(scan['T'][1] - scan['T'][0], 1e3)
+        self.assertEqual(len(TS5_COLUMNS), 9)
+        # Read in blocks that split lines.
+        for chunk_size in (50, 1000):
+            chunked = read_ts5_scan(self.files[0], columns='XZT',
+                                    chunk_size=chunk_size)
+            for key in scan:
+                np.testing.assert_array_equal(chunked[key], scan[key])
+
+    def test_irregular_rows(self):
+        """
+        Test that rows with extra and missing fields are read line by
+        line even if the total number of fields is that of uniform rows.
+        """
+        rows = [[100 + i for i in range(15)], [200 + i for i in range(16)],
+                [300 + i for i in range(14)]]
+        with open(self.files[0], 'w') as output:
+            for row in rows:
+                output.write(','.join('%i' % value for value in row) + '\n')
+        scan = read_ts5_scan(self.files[0], columns='XYZ')
+        np.testing.assert_array_equal(scan['X'], [100, 200, 300])
+        np.testing.assert_array_equal(scan['Z'], [102, 202, 302])
+
+    def test_unparsed_fields(self):
+        """
+        Test that files with trailing commas or with a text column are
+        read line by line.
+        """
+        rows = [[100*i + j for j in range(15)] for i in range(1, 4)]
+        for line_format in ('%s,\n', '%s,ok\n'):
+            with open(self.files[0], 'w') as output:
+                for row in rows:
+                    output.write(line_format
+                                 % ','.join('%i' % value for value in row))
+            scan = read_ts5_scan(self.files[0], columns='XZT')
+            np.testing.assert_array_equal(scan['X'], [100, 200, 300])
+            np.testing.assert_array_equal(scan['Z'], [102, 202, 302])
+            np.testing.assert_array_equal(scan['T'], [114, 214, 314])
+            md = md_factory.create(self.files[0], dtype='TS5')
+            np.testing.assert_array_equal(md.sensor.x, [100, 200, 300])
+
+    def test_header(self):
+        """
+        Test parsing the header lines, in the same pass as the data, and
+        persisting the scan metadata.
+        """
+        expected = dict(start_time=1.5e12, end_time=1.5e12 + 1e6,
+                        temp_start=[20.1, 21.1, 22.1, 23.1],
+                        temp_end=[20.2, 21.2, 22.2, 23.2])
+        for chunk_size in (50, 2**22):
+            scan, header = read_ts5_scan(self.files[0], chunk_size=chunk_size,
+                                         header=True)
+            self.assertEqual(header, expected)
+        self.assertEqual(len(scan['X']), len(self.x))
+        self.assertEqual(parse_ts5_header(['# temperature A start = x']),
+                         dict(start_time=None, end_time=None, temp_start=[],
+                              temp_end=[]))
+
+        raftData = md_factory.create(self.files[0], dtype='TS5')
+        self.assertEqual(raftData.scan_metadata, {self.files[0]: expected})
+        raftData.set_ref_plane(raftData.sensor.xyzPlane_fit())
+        raftData.quantile_table(outfile=os.devnull)
+        fd, outfile = tempfile.mkstemp(suffix='.npz')
+        os.close(fd)
+        try:
+            raftData.persist(outfile)
+            self.assertEqual(md_factory.load(outfile).scan_metadata,
+                             raftData.scan_metadata)
+            write_summary(raftData, outfile)
+            summary = load_summary(outfile)
+            self.assertEqual(summary.scan_metadata[summary.infile], expected)
+        finally:
+            os.remove(outfile)
+
+    def test_Ts5Data(self):
+        "Test the single scan and differential Ts5Data point clouds."
+        raftData = md_factory.create(self.files[0], dtype='TS5')
+        np.testing.assert_allclose(raftData.sensor.z, 1e3*self.z, atol=1e-3)
+        np.testing.assert_allclose(raftData.housekeeping[self.files[0]]['A'],
+                                   20 + 1e-3*np.arange(len(self.x)))
+
+        raftDataDelta = md_factory.create(self.files, dtype='TS5')
+        self.assertEqual(len(raftDataDelta.sensor.x), len(self.index[0]))
+        np.testing.assert_allclose(raftDataDelta.sensor.z, -1., atol=1e-3)
+        self.assertEqual(sorted(raftDataDelta.housekeeping.keys()),
+                         sorted(self.files))
+        self.assertEqual(raftDataDelta.match_stats,
+                         dict(matched=len(self.index[0]),
+                              only_in_A=len(self.x) - len(self.index[0]),
+                              only_in_B=0))
+
+    def test_GriddedScan(self):
+        "Test the gridded view against the point-wise operations."
+        raftData = md_factory.create(self.files[0], dtype='TS5')
+        grid = raftData.gridded()
+        np.testing.assert_allclose(grid.x, np.arange(0, 40, 2.))
+        np.testing.assert_allclose(grid.y, np.arange(0, 30, 1.5))
+        self.assertEqual(grid.image.count(), len(self.x))
+        x, y, z = grid.points()
+        order = np.lexsort((raftData.sensor.x, raftData.sensor.y))
+        np.testing.assert_array_equal(z, raftData.sensor.z[order])
+
+        # Differences, with a second scan missing grid points.
+        grid2 = md_factory.create(self.files[1], dtype='TS5').gridded()
+        self.assertEqual(grid2.image.count(), len(self.index[0]))
+        delta = grid - grid2
+        raftDataDelta = md_factory.create(self.files, dtype='TS5')
+        self.assertEqual(delta.image.count(), len(raftDataDelta.sensor.z))
+        np.testing.assert_allclose(np.sort(delta.points()[2]),
+                                   np.sort(raftDataDelta.sensor.z))
+        # Scans on different, but aligned, grid extents.
+        index = np.where(self.x > 9)
+        part = GriddedScan.from_points(self.x[index], self.y[index],
+                                       1e3*self.z[index] + 1, step=(2, 1.5))
+        delta = part - grid
+        self.assertEqual(delta.image.shape, part.image.shape)
+        np.testing.assert_allclose(delta.image.compressed(), 1, atol=1e-3)
+        shifted = GriddedScan.from_points(self.x + 0.5, self.y, self.z)
+        self.assertRaises(RuntimeError, grid.__sub__, shifted)
+        self.assertRaises(RuntimeError, GriddedScan.from_points,
+                          [0, 1, 1.5], [0, 0, 0], [1, 2, 3], step=1)
+
+        # Regions.
+        region = grid.region(10, 20, 3, 9)
+        selected = ((raftData.sensor.x >= 10) & (raftData.sensor.x <= 20)
+                    & (raftData.sensor.y >= 3) & (raftData.sensor.y <= 9))
+        self.assertEqual(region.image.count(), np.count_nonzero(selected))
+        self.assertAlmostEqual(region.image.mean(),
+                               np.mean(raftData.sensor.z[selected]))
+
+        win = raftData.gridded_plot()
+        self.assertEqual(win.axes[0].get_title(), self.files[0])
+
+    def test_ScanCube(self):
+        "Test the stacked scans against the two-scan Ts5Data deltas."
+        # A third, tilted scan covering part of the grid.
+        index = np.where(self.x > 9)
+        fd, infile = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.files.append(infile)
+        noise = np.random.normal(scale=5e-4, size=len(index[0]))
+        write_ts5_scan(self.files[2], self.x[index], self.y[index],
+                       self.z[index] + 1e-4*self.x[index] - 2e-3 + noise)
+        cube = ScanCube.from_files(self.files, labels=['warm', 'warm2',
+                                                       'cold'])
+        self.assertEqual(cube.z.shape, (3, 20, 20))
+        np.testing.assert_allclose(cube.x, np.arange(0, 40, 2.))
+        self.assertEqual(sorted(cube.housekeeping), sorted(self.files))
+        self.assertEqual(cube.scan_metadata[self.files[2]]['start_time'],
+                         1.5e12)
+        self.assertEqual([cube.z[k].count() for k in range(3)],
+                         [len(self.x), len(self.index[0]), len(index[0])])
+
+        results = cube.delta_flatness()
+        self.assertEqual(sorted(results), [('warm', 'cold'),
+                                           ('warm', 'warm2'),
+                                           ('warm2', 'cold')])
+        for first, second in (('warm', 'cold'), ('warm2', 'cold')):
+            files = [self.files[cube.index(first)],
+                     self.files[cube.index(second)]]
+            raftDataDelta = md_factory.create(files, dtype='TS5')
+            raftDataDelta.set_ref_plane(raftDataDelta.sensor.xyzPlane_fit())
+            raftDataDelta.quantile_table(outfile=os.devnull)
+            result = results[(first, second)]
+            self.assertEqual(result['npts'], len(raftDataDelta.sensor.z))
+            np.testing.assert_allclose(result['pars'],
+                                       raftDataDelta.plane_functor.pars,
+                                       atol=1e-6)
+            for attr in ('quantiles', 'quantiles_filt'):
+                expected = getattr(raftDataDelta, attr)
+                self.assertEqual(sorted(result[attr]), sorted(expected))
+                for key in expected:
+                    self.assertAlmostEqual(result[attr][key], expected[key],
+                                           places=6)
+            delta = cube.delta(first, second)
+            np.testing.assert_allclose(np.sort(delta.points()[2]),
+                                       np.sort(raftDataDelta.sensor.z),
+                                       atol=1e-6)
+
+        drift = cube.drift()
+        self.assertEqual(drift['nscans'].max(), 3)
+        self.assertEqual(drift['net'].count(), len(index[0]))
+        np.testing.assert_allclose(drift['net'].compressed(),
+                                   cube.delta(2, 0).image.compressed())
+        self.assertTrue(np.all(drift['range'] >= 0))
+
+        delta, flatness = cube.cold_warm(['cold'], ['warm', 'warm2'])
+        expected = (cube.z[2] - (cube.z[0] + cube.z[1])/2.).compressed()
+        np.testing.assert_allclose(delta.image.compressed(), expected)
+        self.assertEqual(flatness['npts'], len(expected))
+        np.testing.assert_allclose(flatness['pars'][:2], (0.1, 0),
+                                   atol=0.02)
+
+    def test_match_grid_points(self):
+        "Test the grid matching against a brute force search."
+        x2 = np.concatenate((self.x[::-1], [100., 2.]))
+        y2 = np.concatenate((self.y[::-1], [100., 3.]))
+        x1 = np.concatenate((self.x[::2], [-1.]))
+        y1 = np.concatenate((self.y[::2], [-1.]))
+        index1, index2 = match_grid_points(x1, y1, x2, y2)
+        expected1, expected2 = [], []
+        for i in range(len(x1)):
+            loc = np.where((x2 == x1[i]) & (y2 == y1[i]))[0]
+            if len(loc):
+                expected1.append(i)
+                expected2.append(loc[0])
+        np.testing.assert_array_equal(index1, expected1)
+        np.testing.assert_array_equal(index2, expected2)
+
+        # Offset the second scan's positions by less than the tolerance.
+        index1, index2 = match_grid_points(x1, y1, x2 + 1e-5, y2 - 1e-5,
+                                           tol=1e-3)
+        np.testing.assert_array_equal(index1, expected1)
+        np.testing.assert_array_equal(index2, expected2)
+
+        # Positions on either side of a half-way point between multiples
+        # of tol still match, and so do offsets of up to tol, but not
+        # larger ones.
+        index1, index2 = match_grid_points([0.0049, 1.0049, 3.0049],
+                                           [0, 0, 0],
+                                           [1.0051, 0.0051, 2.0051, 3.0151],
+                                           [0, 0, 0, 0], tol=0.01)
+        np.testing.assert_array_equal(index1, [0, 1])
+        np.testing.assert_array_equal(index2, [1, 0])
+        index1, index2 = match_grid_points([0.0049], [0], [0.0139], [0],
+                                           tol=0.01)
+        np.testing.assert_array_equal(index1, [0])
+
+        # Both scans jittered by up to tol/2 about the nominal grid, in
+        # a different order.
+        jitter = lambda: np.random.uniform(-5e-3, 5e-3, size=len(self.x))
+        order = np.random.permutation(len(self.x))
+        index1, index2 = match_grid_points(self.x + jitter(),
+                                           self.y + jitter(),
+                                           (self.x + jitter())[order],
+                                           (self.y + jitter())[order],
+                                           tol=0.01)
+        np.testing.assert_array_equal(index1, np.arange(len(self.x)))
+        np.testing.assert_array_equal(order[index2], index1)
+
+if __name__ == '__main__':
+    unittest.main()